@@ -1,285 +1,365 @@
 # advanced_library_system.py
 
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
-import mysql.connector
-from mysql.connector import errorcode
-from PIL import Image, ImageTk
-from datetime import date, timedelta
+from tkinter import ttk, messagebox, simpledialog, filedialog
+from datetime import date, datetime
+from concurrent.futures import ThreadPoolExecutor
 import hashlib
+import queue
+import sys
+import time
+from db_backends import get_backend
+from library_db import (
+    DatabaseManager, DB_BACKEND, DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, SQLITE_PATH,
+    SLOW_QUERY_LOG, FINE_REPORT_TOP, PAGE_SIZE
+)
+from search_cache import SearchCache
+import image_cache
+# PIL (by image_cache, only when the cache is rebuilt), NumPy (fine_report),
+# http.client (api_client) and the bulk import/export modules are imported
+# where they are first used: together they add about a
+# third of a second before the login window can appear.
 
 # --- Constants and Configuration ---
-DB_HOST = 'localhost'
-DB_USER = 'root'
-DB_PASSWORD = 'your_password' # <-- IMPORTANT: Change this!
-DB_NAME = 'advanced_library_db'
-
-# --- Database Manager Class ---
-# This class handles all direct interactions with the database.
-# It helps separate the database logic from the GUI logic.
-class DatabaseManager:
-    """Manages all database operations for the library system."""
-
-    def __init__(self, host, user, password, db_name):
-        self.host = host
-        self.user = user
-        self.password = password
-        self.db_name = db_name
-        self.connection = None
-
-    def connect(self):
-        """Establishes a persistent connection to the database."""
-        try:
-            self.connection = mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.db_name
-            )
-        except mysql.connector.Error as err:
-            messagebox.showerror("Database Error", f"Failed to connect to database: {err}")
-            self.connection = None
-            return False
-        return True
-
-    def disconnect(self):
-        """Closes the database connection if it's open."""
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
-
-    def execute_query(self, query, params=None, fetch=None):
+API_URL = None  # e.g. 'http://127.0.0.1:8765' to use a shared api_server.py instead of the database directly
+
+# --- Query Instrumentation Configuration ---
+DIAGNOSTICS_REFRESH_MS = 2000  # How often the admin Diagnostics tab updates
+
+# --- Search Configuration ---
+SEARCH_DEBOUNCE_MS = 250     # Pause in typing after which the book/member lists search
+
+# --- Dashboard Configuration ---
+OVERDUE_REFRESH_MS = 15 * 60 * 1000  # How often the GUI recomputes the overdue counter
+
+# --- Change Feed Configuration ---
+CHANGE_POLL_MS = 5000        # How often the GUI picks up changes made at other terminals
+
+# --- Background Worker Configuration ---
+WORKER_THREADS = 4           # Threads running database calls for the GUI
+RESULT_POLL_MS = 25          # How often the Tk loop picks up finished calls
+
+# --- Login Window Configuration ---
+LOGIN_BACKGROUND = 'background.jpg'
+LOGIN_WINDOW_SIZE = (800, 600)  # The background is scaled to this once and cached (see image_cache.py)
+
+# --- Startup Configuration ---
+STARTUP_TRACE = True         # Print the time taken by each startup step to stderr
+
+# --- List View Configuration ---
+MAX_LOADED_PAGES = 10        # Pages kept in a list before the farthest one is dropped
+
+
+# --- Background Task Runner ---
+# Tk widgets may only be touched from the main thread, so database calls run
+# on a small thread pool and their results are handed back through a queue
+# that the Tk event loop polls with after().
+class TaskRunner:
+    """Runs blocking calls on worker threads and delivers the results on the Tk thread."""
+
+    def __init__(self, root, workers=WORKER_THREADS):
+        self.root = root
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='db-worker')
+        self.busy_callback = None  # Called with True/False when work starts/finishes
+        self._results = queue.Queue()
+        self._latest = {}          # key -> future of the newest request with that key
+        self._pending = 0
+        self._poll()
+
+    def submit(self, func, *args, on_done=None, on_error=None, key=None, background=False, **kwargs):
         """
-        Executes a given SQL query.
-        :param query: The SQL query string.
-        :param params: A tuple of parameters to be used with the query.
-        :param fetch: Type of fetch ('one', 'all'). If None, it's a non-fetching query (INSERT, UPDATE, DELETE).
-        :return: Fetched data or row count.
+        Runs func(*args, **kwargs) on a worker thread.
+        :param on_done: Called on the Tk thread with the result.
+        :param on_error: Called on the Tk thread with the exception (default: an error dialog).
+        :param key: Requests sharing a key supersede each other: an older request that
+                    hasn't started yet is cancelled, and a late result from one is dropped.
+        :param background: Periodic work (e.g. polling) that doesn't show the busy indicator.
         """
-        if not self.connect():
-            return None if fetch else 0
-        
-        cursor = self.connection.cursor(dictionary=True)
-        result = None
+        future = self.executor.submit(func, *args, **kwargs)
+        if key is not None:
+            previous = self._latest.get(key)
+            if previous is not None:
+                previous.cancel()
+            self._latest[key] = future
+        if not background:
+            self._set_pending(self._pending + 1)
+        future.add_done_callback(lambda f: self._results.put(('result', f, key, on_done, on_error, background)))
+        return future
+
+    def post_error(self, title, message):
+        """Thread-safe stand-in for messagebox.showerror; the dialog is shown on the Tk thread."""
+        self._results.put(('error', title, message))
+
+    def call_soon(self, func, *args, **kwargs):
+        """Thread-safe: schedules func(*args, **kwargs) to run on the Tk thread (e.g. progress updates)."""
+        self._results.put(('call', func, args, kwargs))
+
+    def cancel(self, key):
+        """Drops the latest request with this key: cancelled if it hasn't started, its result ignored if it has."""
+        future = self._latest.pop(key, None)
+        if future is not None:
+            future.cancel()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _set_pending(self, count):
+        was_busy, self._pending = self._pending > 0, count
+        if self.busy_callback and was_busy != (count > 0):
+            self.busy_callback(count > 0)
+
+    def _poll(self):
+        try:
+            while True:
+                item = self._results.get_nowait()
+                if item[0] == 'error':
+                    messagebox.showerror(item[1], item[2])
+                elif item[0] == 'call':
+                    item[1](*item[2], **item[3])
+                else:
+                    self._deliver(*item[1:])
+        except queue.Empty:
+            pass
         try:
-            cursor.execute(query, params or ())
-            if fetch == 'one':
-                result = cursor.fetchone()
-            elif fetch == 'all':
-                result = cursor.fetchall()
+            self.root.after(RESULT_POLL_MS, self._poll)
+        except tk.TclError:
+            pass  # The application has been closed
+
+    def _deliver(self, future, key, on_done, on_error, background):
+        if not background:
+            self._set_pending(self._pending - 1)
+        if future.cancelled():
+            return
+        if key is not None:
+            if self._latest.get(key) is not future:
+                return  # Superseded by a newer request
+            del self._latest[key]
+        error = future.exception()
+        if error is not None:
+            if on_error:
+                on_error(error)
             else:
-                self.connection.commit()
-                result = cursor.rowcount
-        except mysql.connector.Error as err:
-            self.connection.rollback()
-            messagebox.showerror("Query Error", f"An error occurred: {err}")
-            result = None if fetch else 0
-        finally:
-            cursor.close()
-            self.disconnect()
-        return result
-
-    # --- User Management ---
-    def verify_user(self, username, password):
-        """Verifies user credentials against the database."""
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
-        query = "SELECT * FROM users WHERE username = %s AND password_hash = %s"
-        return self.execute_query(query, (username, password_hash), fetch='one')
-
-    # --- Book Management ---
-    def add_book(self, title, author, genre):
-        query = "INSERT INTO books (title, author, genre) VALUES (%s, %s, %s)"
-        return self.execute_query(query, (title, author, genre))
-
-    def update_book(self, book_id, title, author, genre):
-        query = "UPDATE books SET title = %s, author = %s, genre = %s WHERE book_id = %s"
-        return self.execute_query(query, (title, author, genre, book_id))
-
-    def delete_book(self, book_id):
-        query = "DELETE FROM books WHERE book_id = %s"
-        return self.execute_query(query, (book_id,))
-
-    def search_books(self, title="", author="", status=""):
-        query = "SELECT book_id, title, author, genre, status FROM books WHERE 1=1"
-        params = []
-        if title:
-            query += " AND title LIKE %s"
-            params.append(f"%{title}%")
-        if author:
-            query += " AND author LIKE %s"
-            params.append(f"%{author}%")
-        if status:
-            query += " AND status = %s"
-            params.append(status)
-        query += " ORDER BY title"
-        return self.execute_query(query, tuple(params), fetch='all')
-
-    # --- Member Management ---
-    def add_member(self, name, email, phone):
-        query = "INSERT INTO members (name, email, phone) VALUES (%s, %s, %s)"
-        return self.execute_query(query, (name, email, phone))
-
-    def update_member(self, member_id, name, email, phone):
-        query = "UPDATE members SET name = %s, email = %s, phone = %s WHERE member_id = %s"
-        return self.execute_query(query, (name, email, phone, member_id))
-
-    def delete_member(self, member_id):
-        # Check if member has issued books first
-        check_query = "SELECT COUNT(*) as count FROM issued_books WHERE member_id = %s AND return_date IS NULL"
-        result = self.execute_query(check_query, (member_id,), fetch='one')
-        if result and result['count'] > 0:
-            messagebox.showerror("Error", "Cannot delete member. They have outstanding books.")
-            return 0
-        
-        delete_query = "DELETE FROM members WHERE member_id = %s"
-        return self.execute_query(delete_query, (member_id,))
-
-    def search_members(self, name="", email=""):
-        query = "SELECT member_id, name, email, phone FROM members WHERE 1=1"
-        params = []
-        if name:
-            query += " AND name LIKE %s"
-            params.append(f"%{name}%")
-        if email:
-            query += " AND email LIKE %s"
-            params.append(f"%{email}%")
-        query += " ORDER BY name"
-        return self.execute_query(query, tuple(params), fetch='all')
-
-    # --- Issue/Return Management ---
-    def issue_book(self, book_id, member_id):
-        # Transactional operation
-        if not self.connect(): return 0
+                messagebox.showerror("Error", f"An unexpected error occurred: {error}")
+        elif on_done:
+            on_done(future.result())
+
+
+# --- Paged Treeview Helper ---
+# Feeds a Treeview one page at a time as it is scrolled. Only a window of
+# pages is kept loaded, so first paint time and memory use don't depend on
+# how many rows the underlying table has.
+class PagedTreeview:
+    """Loads keyset-paginated rows into a ttk.Treeview as the user scrolls."""
+
+    def __init__(self, tree, scrollbar, runner, row_values, row_key, page_size=PAGE_SIZE, max_pages=MAX_LOADED_PAGES):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.runner = runner          # Pages are fetched on worker threads
+        self.row_values = row_values  # row -> tuple of column values
+        self.row_key = row_key        # row -> (sort value, id), used as the page cursor
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.fetch_page = None
+        self.pages = []               # [first row key, last row key, item ids] per loaded page
+        self.rows = {}                # item id -> row record, for the loaded pages
+        self.at_start = True
+        self.at_end = True
+        self._loading = False
+        self._load_scheduled = False
+        tree.configure(yscrollcommand=self._on_scroll)
+
+    def reset(self, fetch_page, first_page=None):
+        """
+        Clears the list and loads the first page. Any page still loading for the
+        previous contents is superseded.
+        :param fetch_page: Callable taking after=, before= and limit= that returns a page of rows.
+        :param first_page: The first page if it is already known (e.g. cached); it is shown straight away.
+        """
+        self.fetch_page = fetch_page
+        self.tree.delete(*self.tree.get_children())
+        self.pages = []
+        self.rows = {}
+        self.at_start = True
+        self.at_end = False
+        if first_page is None:
+            self._request('next')
+        else:
+            self.runner.cancel(self)
+            self._page_loaded('next', first_page)
 
-        try:
-            cursor = self.connection.cursor()
-            # 1. Check book status
-            cursor.execute("SELECT status FROM books WHERE book_id = %s", (book_id,))
-            status_result = cursor.fetchone()
-            if not status_result or status_result[0] != 'Available':
-                messagebox.showerror("Error", "Book is not available for issue.")
-                return 0
-
-            # 2. Get loan duration
-            cursor.execute("SELECT setting_value FROM settings WHERE setting_key = 'loan_duration_days'")
-            loan_days = int(cursor.fetchone()[0])
-            
-            issue_date = date.today()
-            due_date = issue_date + timedelta(days=loan_days)
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self._loading or self._load_scheduled or self.fetch_page is None:
+            return
+        if (float(last) > 0.9 and not self.at_end) or (float(first) < 0.1 and not self.at_start):
+            # Don't modify the tree from inside its own scroll callback
+            self._load_scheduled = True
+            self.tree.after_idle(self._load_near_edge)
+
+    def _load_near_edge(self):
+        self._load_scheduled = False
+        if self._loading:
+            return
+        first, last = self.tree.yview()
+        if last > 0.9 and not self.at_end:
+            self._request('next')
+        elif first < 0.1 and not self.at_start:
+            self._request('previous')
+
+    def _request(self, direction):
+        self._loading = True
+        if direction == 'next':
+            cursor = {'after': self.pages[-1][1] if self.pages else None}
+        else:
+            cursor = {'before': self.pages[0][0]}
+        self.runner.submit(
+            self.fetch_page, limit=self.page_size, **cursor,
+            on_done=lambda rows: self._page_loaded(direction, rows or []),
+            on_error=self._page_failed, key=self
+        )
+
+    def _page_failed(self, error):
+        self._loading = False
+        messagebox.showerror("Error", f"Could not load the list: {error}")
+
+    def _page_loaded(self, direction, rows):
+        self._loading = False
+        if direction == 'next':
+            self._append_page(rows)
+        else:
+            self._prepend_page(rows)
+
+    def _insert(self, rows, index):
+        ids = []
+        for row in rows:
+            iid = str(self.row_key(row)[1])
+            if self.tree.exists(iid):  # Row moved between pages while we were scrolling
+                continue
+            self.tree.insert("", index, iid=iid, values=self.row_values(row))
+            self.rows[iid] = row
+            ids.append(iid)
+            if index != "end":
+                index += 1
+        return ids
+
+    def _append_page(self, rows):
+        if len(rows) < self.page_size:
+            self.at_end = True
+        if not rows:
+            return
+        first_page = not self.pages
+        self.pages.append([self.row_key(rows[0]), self.row_key(rows[-1]), self._insert(rows, "end")])
+        if first_page:
+            self.tree.yview_moveto(0)
+        if len(self.pages) > self.max_pages:
+            position = self._first_visible()
+            dropped = self.pages.pop(0)[2]
+            self._delete(dropped)
+            self._scroll_to(position - len(dropped))
+            self.at_start = False
+
+    def _prepend_page(self, rows):
+        if len(rows) < self.page_size:
+            self.at_start = True
+        if not rows:
+            return
+        position = self._first_visible()
+        ids = self._insert(rows, 0)
+        self.pages.insert(0, [self.row_key(rows[0]), self.row_key(rows[-1]), ids])
+        self._scroll_to(position + len(ids))
+        if len(self.pages) > self.max_pages:
+            self._delete(self.pages.pop()[2])
+            self.at_end = False
+
+    def _delete(self, ids):
+        self.tree.delete(*ids)
+        for iid in ids:
+            del self.rows[iid]
+
+    def row(self, iid):
+        """The record shown in a row (Treeview values come back from Tk as strings or numbers)."""
+        return self.rows.get(iid)
+
+    def update_row(self, row):
+        """Shows a changed record in place, if its row is loaded."""
+        iid = str(self.row_key(row)[1])
+        if iid in self.rows:
+            self.tree.item(iid, values=self.row_values(row))
+            self.rows[iid] = row
+
+    def remove_row(self, key):
+        """Removes the row with this id (e.g. book_id), if it is loaded."""
+        iid = str(key)
+        if iid not in self.rows:
+            return
+        self.tree.delete(iid)
+        del self.rows[iid]
+        for page in self.pages:  # At most max_pages pages of page_size ids
+            if iid in page[2]:
+                page[2].remove(iid)
+                break
+
+    def _first_visible(self):
+        return round(self.tree.yview()[0] * len(self.tree.get_children()))
+
+    def _scroll_to(self, index):
+        total = len(self.tree.get_children())
+        self.tree.yview_moveto(max(index, 0) / total if total else 0)
+
+
+# --- Startup Trace ---
+# Timestamps each startup step, measured from when the application started
+# running (module imports are best profiled with `python -X importtime`).
+# Tabs are built the first time they are shown, so their build times are
+# traced too, whenever that happens.
+class StartupTrace:
+    """Prints how long each startup step took when STARTUP_TRACE is set."""
+
+    def __init__(self, enabled=STARTUP_TRACE):
+        self.enabled = enabled
+        self.started = self.last = time.perf_counter()
+        self.interactive = False
+
+    def mark(self, step):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        print(f"[startup] {(now - self.started) * 1000:8.1f} ms  (+{(now - self.last) * 1000:6.1f} ms)  {step}",
+              file=sys.stderr, flush=True)
+        self.last = now
+
+    def mark_interactive(self):
+        """Marks the first time the main window shows data; later calls are ignored."""
+        if not self.interactive:
+            self.interactive = True
+            self.mark("interactive")
 
-            # 3. Update book status
-            cursor.execute("UPDATE books SET status = 'Issued' WHERE book_id = %s", (book_id,))
-            
-            # 4. Record the issue
-            cursor.execute(
-                "INSERT INTO issued_books (book_id, member_id, issue_date, due_date) VALUES (%s, %s, %s, %s)",
-                (book_id, member_id, issue_date, due_date)
-            )
-            self.connection.commit()
-            return 1
-        except (mysql.connector.Error, ValueError) as err:
-            self.connection.rollback()
-            messagebox.showerror("Transaction Error", f"Failed to issue book: {err}")
-            return 0
-        finally:
-            cursor.close()
-            self.disconnect()
-
-    def return_book(self, book_id):
-        # Another transactional operation
-        if not self.connect(): return None
-
-        fine = 0
-        try:
-            cursor = self.connection.cursor(dictionary=True)
-            # 1. Find the open issue record
-            cursor.execute(
-                "SELECT issue_id, due_date FROM issued_books WHERE book_id = %s AND return_date IS NULL",
-                (book_id,)
-            )
-            issue_record = cursor.fetchone()
-            if not issue_record:
-                messagebox.showerror("Error", "This book is not currently issued.")
-                return None
-
-            # 2. Update book status
-            cursor.execute("UPDATE books SET status = 'Available' WHERE book_id = %s", (book_id,))
-
-            # 3. Update issue record with return date
-            return_date = date.today()
-            cursor.execute(
-                "UPDATE issued_books SET return_date = %s WHERE issue_id = %s",
-                (return_date, issue_record['issue_id'])
-            )
-
-            # 4. Calculate fine
-            if return_date > issue_record['due_date']:
-                days_overdue = (return_date - issue_record['due_date']).days
-                cursor.execute("SELECT setting_value FROM settings WHERE setting_key = 'fine_per_day'")
-                fine_per_day = float(cursor.fetchone()['setting_value'])
-                fine = days_overdue * fine_per_day
-
-            self.connection.commit()
-            return fine
-        except (mysql.connector.Error, ValueError) as err:
-            self.connection.rollback()
-            messagebox.showerror("Transaction Error", f"Failed to return book: {err}")
-            return None
-        finally:
-            cursor.close()
-            self.disconnect()
-
-    # --- Statistics ---
-    def get_dashboard_stats(self):
-        stats = {
-            'total_books': 0, 'total_members': 0, 
-            'issued_books': 0, 'overdue_books': 0
-        }
-        query_books = "SELECT COUNT(*) as count FROM books"
-        query_members = "SELECT COUNT(*) as count FROM members"
-        query_issued = "SELECT COUNT(*) as count FROM books WHERE status = 'Issued'"
-        query_overdue = "SELECT COUNT(*) as count FROM issued_books WHERE return_date IS NULL AND due_date < CURDATE()"
-        
-        stats['total_books'] = self.execute_query(query_books, fetch='one')['count']
-        stats['total_members'] = self.execute_query(query_members, fetch='one')['count']
-        stats['issued_books'] = self.execute_query(query_issued, fetch='one')['count']
-        stats['overdue_books'] = self.execute_query(query_overdue, fetch='one')['count']
-        
-        return stats
-    
-    # --- Settings ---
-    def get_setting(self, key):
-        query = "SELECT setting_value FROM settings WHERE setting_key = %s"
-        result = self.execute_query(query, (key,), fetch='one')
-        return result['setting_value'] if result else None
-    
-    def update_setting(self, key, value):
-        query = "UPDATE settings SET setting_value = %s WHERE setting_key = %s"
-        return self.execute_query(query, (value, key))
+
+startup_trace = StartupTrace()
 
 
 # --- Login Window Class ---
 class LoginWindow(tk.Toplevel):
     """Login window for the application."""
 
-    def __init__(self, parent, db_manager):
+    def __init__(self, parent, db_manager, runner):
         super().__init__(parent)
         self.parent = parent
         self.db_manager = db_manager
+        self.runner = runner
         self.user_info = None
 
         self.title("LMS Login")
-        self.geometry("800x600")
+        self.geometry(f"{LOGIN_WINDOW_SIZE[0]}x{LOGIN_WINDOW_SIZE[1]}")
         self.resizable(False, False)
         self.protocol("WM_DELETE_WINDOW", self.parent.destroy) # Close main app if login is closed
 
         # --- Background Image ---
-        try:
-            self.bg_image = Image.open("background.jpg")
-            self.bg_photo = ImageTk.PhotoImage(self.bg_image.resize((800, 600)))
-            bg_label = tk.Label(self, image=self.bg_photo)
-            bg_label.place(x=0, y=0, relwidth=1, relheight=1)
-        except FileNotFoundError:
-            self.config(bg="#333")
+        # Scaled (or read from the image cache) on a worker thread; the form
+        # is usable straight away and the image fills in behind it.
+        self.config(bg="#333")
+        self.runner.submit(image_cache.load_scaled, LOGIN_BACKGROUND, LOGIN_WINDOW_SIZE,
+                           on_done=self.show_background, on_error=lambda err: None)  # Keep the plain background
 
         # --- Login Frame ---
         login_frame = tk.Frame(self, bg="rgba(0, 0, 0, 0.7)", bd=5)
@@ -299,13 +379,26 @@ class LoginWindow(tk.Toplevel):
         self.password_entry.grid(row=2, column=1, padx=10, pady=10)
 
         # --- Login Button ---
-        login_button = tk.Button(login_frame, text="Login", font=("Helvetica", 14, "bold"), command=self.attempt_login, bg="#4CAF50", fg="white", width=15)
-        login_button.grid(row=3, column=0, columnspan=2, pady=20)
+        self.login_button = tk.Button(login_frame, text="Login", font=("Helvetica", 14, "bold"), command=self.attempt_login, bg="#4CAF50", fg="white", width=15)
+        self.login_button.grid(row=3, column=0, columnspan=2, pady=20)
 
         self.transient(self.parent)
         self.grab_set()
+        startup_trace.mark("login window built")
         self.parent.wait_window(self)
 
+    def show_background(self, data):
+        if not self.winfo_exists():
+            return  # Signed in before the image was ready
+        try:
+            self.bg_photo = tk.PhotoImage(data=data)
+        except tk.TclError:
+            return
+        bg_label = tk.Label(self, image=self.bg_photo)
+        bg_label.place(x=0, y=0, relwidth=1, relheight=1)
+        bg_label.lower()  # Behind the login form, which is already placed
+        startup_trace.mark("login background shown")
+
     def attempt_login(self):
         username = self.username_entry.get()
         password = self.password_entry.get()
@@ -313,20 +406,31 @@ class LoginWindow(tk.Toplevel):
             messagebox.showwarning("Input Error", "Username and Password are required.")
             return
 
-        user = self.db_manager.verify_user(username, password)
+        # Verify on a worker thread so the window stays responsive
+        self.login_button.config(state='disabled', text="Signing in...")
+        self.runner.submit(self.db_manager.verify_user, username, password,
+                           on_done=self.login_finished, on_error=self.login_failed, key='login')
+
+    def login_finished(self, user):
         if user:
             self.user_info = user
             self.destroy() # Close the login window
         else:
+            self.login_button.config(state='normal', text="Login")
             messagebox.showerror("Login Failed", "Invalid username or password.")
 
+    def login_failed(self, error):
+        self.login_button.config(state='normal', text="Login")
+        messagebox.showerror("Login Failed", f"Could not verify credentials: {error}")
+
 # --- Main Application Class ---
 class MainApp:
     """The main application GUI."""
-    def __init__(self, root, db_manager, user_info):
+    def __init__(self, root, db_manager, user_info, runner):
         self.root = root
         self.db = db_manager
         self.user_info = user_info
+        self.runner = runner
         
         self.root.title(f"Library Management System - Welcome, {self.user_info['username']} ({self.user_info['role']})")
         self.root.geometry("1200x800")
@@ -338,63 +442,195 @@ class MainApp:
         style.configure("TButton", font=('Helvetica', 10), padding=5)
         style.configure("Treeview.Heading", font=('Helvetica', 11, 'bold'))
 
+        # --- Status Bar (shows when database calls are in progress) ---
+        status_bar = ttk.Frame(self.root)
+        status_bar.pack(side='bottom', fill='x', padx=10, pady=(0, 5))
+        self.status_label = ttk.Label(status_bar, text="Ready")
+        self.status_label.pack(side='left')
+        self.progress = ttk.Progressbar(status_bar, mode='indeterminate', length=150)
+        self.progress.pack(side='right')
+        self.runner.busy_callback = self.show_busy
+
         # --- Main Notebook (Tabs) ---
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(expand=True, fill='both', padx=10, pady=10)
 
-        # Create tabs
-        self.create_dashboard_tab()
-        self.create_books_tab()
-        self.create_members_tab()
+        # --- Search-as-you-type (see search_cache.py) ---
+        self.book_search = SearchCache(('title', 'author'), ('status',))
+        self.member_search = SearchCache(('name', 'email'))
+        self._search_vars = []  # Tk drops a variable's traces once Python forgets it
+        self.runner.submit(self.db.text_search_mode, on_done=self.set_search_mode)
+
+        # --- Change Feed (changes made at other terminals) ---
+        # The current version is read at startup; the lists only load once their
+        # tab is shown, so anything committed after they were read is in the feed.
+        self.book_pages = self.member_pages = None
+        self.change_version = None
+        self.runner.submit(self.db.get_changes, on_done=self.start_change_feed, background=True)
+
+        # Create tabs. Each tab is only an empty frame until it is first shown;
+        # building it then runs its queries, so startup only pays for the dashboard.
+        self._unbuilt_tabs = {}  # frame path -> (builder, frame)
+        self.add_tab('Dashboard', self.create_dashboard_tab)
+        self.add_tab('Book Management', self.create_books_tab)
+        self.add_tab('Member Management', self.create_members_tab)
+        self.add_tab('Fines Report', self.create_fines_tab)
         if self.user_info['role'] == 'admin':
-            self.create_settings_tab()
+            self.add_tab('Settings', self.create_settings_tab, padding="20")
+            if self.db.query_stats:
+                self.add_tab('Diagnostics', self.create_diagnostics_tab)
+        self.notebook.bind('<<NotebookTabChanged>>', self.build_selected_tab)
+        self.build_selected_tab()
         
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+        self.root.after(OVERDUE_REFRESH_MS, self.refresh_overdue_periodically)
+        startup_trace.mark("main window built")
+
+    def set_search_mode(self, mode):
+        self.book_search.mode = self.member_search.mode = mode
+
+    def refresh_overdue_periodically(self):
+        """Recomputes the overdue counter on a timer so the dashboard never drifts, and compacts the change log."""
+        self.runner.submit(self.db.refresh_overdue_count, background=True)
+        self.runner.submit(self.db.compact_change_log, background=True)
+        self.root.after(OVERDUE_REFRESH_MS, self.refresh_overdue_periodically)
+
+    # --- Change Feed ---
+    def start_change_feed(self, feed):
+        if feed is None:
+            return  # No change log in this database (or it couldn't be read): lists update on refresh only
+        self.change_version = feed['version']
+        self.root.after(CHANGE_POLL_MS, self.poll_changes)
+
+    def poll_changes(self):
+        """Asks for the changes made since the last poll; the next poll is scheduled once this one is applied."""
+        loaded = {'book': set(self.book_pages.rows) if self.book_pages else set(),
+                  'member': set(self.member_pages.rows) if self.member_pages else set()}
+        self.runner.submit(self.fetch_changes, self.change_version, loaded, on_done=self.apply_changes,
+                           on_error=lambda err: self.root.after(CHANGE_POLL_MS, self.poll_changes),
+                           key='changes', background=True)
+
+    def fetch_changes(self, since, loaded):
+        """
+        Runs on a worker thread: reads the change feed and the current values of the changed rows
+        that are loaded in this terminal's lists (row ids as strings, as in PagedTreeview.rows).
+        :return: (feed, {entity: {id: record or None if deleted}}, {entities to reload}).
+        """
+        feed = self.db.get_changes(since)
+        rows, reload = {'book': {}, 'member': {}}, set()
+        if feed is None or feed['reset']:
+            return feed, rows, reload
+        changed = {'book': set(), 'member': set()}
+        for entity, entity_id, action in feed['changes']:
+            if action == 'bulk':
+                reload.add(entity)
+            elif action != 'insert' and str(entity_id) in loaded[entity]:
+                # New rows are picked up by the next reload: their place in the list isn't loaded
+                changed[entity].add(entity_id)
+        for entity, fetch, id_field in (('book', self.db.get_books, 'book_id'),
+                                        ('member', self.db.get_members, 'member_id')):
+            if changed[entity] and entity not in reload:
+                current = fetch(sorted(changed[entity]))
+                if current is None:
+                    raise RuntimeError(f"Could not read the changed {entity}s")  # Retried by the next poll
+                rows[entity] = dict.fromkeys(changed[entity])  # Ids left at None were deleted
+                rows[entity].update((getattr(record, id_field), record) for record in current)
+        return feed, rows, reload
+
+    def apply_changes(self, result):
+        feed, rows, reload = result
+        self.root.after(CHANGE_POLL_MS, self.poll_changes)
+        if feed is None:
+            return
+        self.change_version = feed['version']
+        if not feed['changes'] and not feed['reset']:
+            return
+        if feed['reset']:
+            reload = {'book', 'member'}  # Too far behind: the log no longer reaches back to our version
+        changed = reload | {entity for entity, _, _ in feed['changes']}
+        for entity, search, pages, refresh, show in (
+                ('book', self.book_search, self.book_pages, self.refresh_book_list, self.show_changed_books),
+                ('member', self.member_search, self.member_pages, self.refresh_member_list, self.show_changed_members)):
+            if entity not in changed:
+                continue
+            search.clear()  # New rows too may match a cached search
+            if pages is None:
+                continue  # Tab not built yet: it loads current rows when it is
+            if entity in reload:
+                refresh()
+            elif rows[entity]:
+                show(rows[entity])
+        self.populate_dashboard()
+
+    def show_busy(self, busy):
+        if busy:
+            self.status_label.config(text="Loading...")
+            self.progress.start(10)
+            self.root.config(cursor='watch')
+        else:
+            self.status_label.config(text="Ready")
+            self.progress.stop()
+            self.root.config(cursor='')
 
     def on_closing(self):
         if messagebox.askokcancel("Quit", "Do you want to exit the application?"):
+            self.runner.shutdown()
             self.db.disconnect()
             self.root.destroy()
 
     # --- Tab Creation Methods ---
 
-    def create_dashboard_tab(self):
-        self.dashboard_frame = ttk.Frame(self.notebook, padding="10")
-        self.notebook.add(self.dashboard_frame, text='Dashboard')
-        self.populate_dashboard()
+    def add_tab(self, text, builder, padding="10"):
+        """Adds an empty tab; builder(frame) fills it in the first time the tab is selected."""
+        frame = ttk.Frame(self.notebook, padding=padding)
+        self.notebook.add(frame, text=text)
+        self._unbuilt_tabs[str(frame)] = (builder, frame)
 
-    def populate_dashboard(self):
-        # Clear existing widgets before repopulating
-        for widget in self.dashboard_frame.winfo_children():
-            widget.destroy()
-            
-        stats = self.db.get_dashboard_stats()
-        
-        ttk.Label(self.dashboard_frame, text="Library Overview", font=("Helvetica", 24, "bold")).pack(pady=20)
+    def build_selected_tab(self, event=None):
+        tab = self._unbuilt_tabs.pop(self.notebook.select(), None)
+        if tab is not None:
+            builder, frame = tab
+            builder(frame)
+            startup_trace.mark(f"built the '{self.notebook.tab(frame, 'text')}' tab")
+
+    def create_dashboard_tab(self, frame):
+        ttk.Label(frame, text="Library Overview", font=("Helvetica", 24, "bold")).pack(pady=20)
 
-        stats_frame = ttk.Frame(self.dashboard_frame)
+        stats_frame = ttk.Frame(frame)
         stats_frame.pack(pady=20)
 
         stat_items = [
-            ("Total Books", stats['total_books'], "#3498DB"),
-            ("Total Members", stats['total_members'], "#2ECC71"),
-            ("Books Issued", stats['issued_books'], "#F39C12"),
-            ("Books Overdue", stats['overdue_books'], "#E74C3C")
+            ("Total Books", 'total_books', "#3498DB"),
+            ("Total Members", 'total_members', "#2ECC71"),
+            ("Books Issued", 'issued_books', "#F39C12"),
+            ("Books Overdue", 'overdue_books', "#E74C3C")
         ]
 
-        for i, (text, value, color) in enumerate(stat_items):
-            frame = tk.Frame(stats_frame, bg=color, width=200, height=120, relief='raised', bd=3)
-            frame.grid(row=0, column=i, padx=20, pady=10)
-            frame.pack_propagate(False)
-            tk.Label(frame, text=text, font=("Helvetica", 14, "bold"), fg="white", bg=color).pack(pady=(15, 5))
-            tk.Label(frame, text=str(value), font=("Helvetica", 28, "bold"), fg="white", bg=color).pack(pady=(5, 15))
-
-        refresh_button = ttk.Button(self.dashboard_frame, text="Refresh Stats", command=self.populate_dashboard)
+        # The widgets are built once; refreshing only changes the value labels
+        self.dashboard_values = {}
+        for i, (text, key, color) in enumerate(stat_items):
+            box = tk.Frame(stats_frame, bg=color, width=200, height=120, relief='raised', bd=3)
+            box.grid(row=0, column=i, padx=20, pady=10)
+            box.pack_propagate(False)
+            tk.Label(box, text=text, font=("Helvetica", 14, "bold"), fg="white", bg=color).pack(pady=(15, 5))
+            self.dashboard_values[key] = tk.Label(box, text="...", font=("Helvetica", 28, "bold"), fg="white", bg=color)
+            self.dashboard_values[key].pack(pady=(5, 15))
+
+        refresh_button = ttk.Button(frame, text="Refresh Stats", command=self.populate_dashboard)
         refresh_button.pack(pady=30)
+        self.populate_dashboard()
+
+    def populate_dashboard(self):
+        self.runner.submit(self.db.get_dashboard_stats, on_done=self.show_dashboard, key='dashboard')
+
+    def show_dashboard(self, stats):
+        if stats is None:
+            return
+        for key, label in self.dashboard_values.items():
+            label.config(text=str(stats[key]))
+        startup_trace.mark_interactive()
         
-    def create_books_tab(self):
-        frame = ttk.Frame(self.notebook, padding="10")
-        self.notebook.add(frame, text='Book Management')
+    def create_books_tab(self, frame):
 
         # --- Search/Filter Frame ---
         search_frame = ttk.LabelFrame(frame, text="Search & Filter Books", padding="10")
@@ -413,26 +649,37 @@ class MainApp:
         self.book_search_status.grid(row=0, column=5, padx=5, pady=5)
 
         ttk.Button(search_frame, text="Search", command=self.refresh_book_list).grid(row=0, column=6, padx=10, pady=5)
+        self.watch_search([self.book_search_title, self.book_search_author], lambda: self.refresh_book_list(live=True))
+        self.book_search_status.bind('<<ComboboxSelected>>', lambda event: self.refresh_book_list(live=True))
         
         # --- Treeview for Books ---
         tree_frame = ttk.Frame(frame)
         tree_frame.pack(expand=True, fill='both', pady=10)
         
-        self.book_tree = ttk.Treeview(tree_frame, columns=("ID", "Title", "Author", "Genre", "Status"), show='headings')
+        self.book_tree = ttk.Treeview(tree_frame, columns=("ID", "Title", "Author", "Genre", "Status", "Copies"),
+                                      show='headings', selectmode='extended')
         self.book_tree.heading("ID", text="ID")
         self.book_tree.heading("Title", text="Title")
         self.book_tree.heading("Author", text="Author")
         self.book_tree.heading("Genre", text="Genre")
         self.book_tree.heading("Status", text="Status")
+        self.book_tree.heading("Copies", text="On Shelf")
         
         self.book_tree.column("ID", width=50, anchor='center')
         self.book_tree.column("Title", width=300)
         self.book_tree.column("Author", width=250)
         self.book_tree.column("Genre", width=150)
         self.book_tree.column("Status", width=100, anchor='center')
+        self.book_tree.column("Copies", width=80, anchor='center')
 
         scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.book_tree.yview)
-        self.book_tree.configure(yscrollcommand=scrollbar.set)
+        self.book_pages = PagedTreeview(
+            self.book_tree, scrollbar,
+            runner=self.runner,
+            row_values=lambda book: (book.book_id, book.title, book.author, book.genre, book.status,
+                                     f"{book.available_copies} / {book.total_copies}"),
+            row_key=lambda book: (book.title, book.book_id)
+        )
         self.book_tree.pack(side='left', fill='both', expand=True)
         scrollbar.pack(side='right', fill='y')
 
@@ -442,15 +689,18 @@ class MainApp:
         ttk.Button(button_frame, text="Add New Book", command=self.open_add_book_dialog).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Edit Selected", command=self.open_edit_book_dialog).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Delete Selected", command=self.delete_selected_book).pack(side='left', padx=5)
+        # Bulk imports are admin-only, as on the API server (bulk_insert_batch)
+        if self.user_info['role'] == 'admin':
+            ttk.Button(button_frame, text="Import Books...",
+                       command=lambda: self.import_records('books')).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Export Books...", command=lambda: self.export_records('books')).pack(side='left', padx=5)
         ttk.Separator(button_frame, orient='vertical').pack(side='left', padx=15, fill='y')
-        ttk.Button(button_frame, text="Issue Selected Book", command=self.open_issue_book_dialog).pack(side='left', padx=5)
-        ttk.Button(button_frame, text="Return Selected Book", command=self.return_selected_book).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Issue Selected Books", command=self.open_issue_book_dialog).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Return Selected Books", command=self.return_selected_book).pack(side='left', padx=5)
 
         self.refresh_book_list()
 
-    def create_members_tab(self):
-        frame = ttk.Frame(self.notebook, padding="10")
-        self.notebook.add(frame, text='Member Management')
+    def create_members_tab(self, frame):
 
         # --- Search/Filter Frame ---
         search_frame = ttk.LabelFrame(frame, text="Search & Filter Members", padding="10")
@@ -465,6 +715,8 @@ class MainApp:
         self.member_search_email.grid(row=0, column=3, padx=5, pady=5)
         
         ttk.Button(search_frame, text="Search", command=self.refresh_member_list).grid(row=0, column=4, padx=10, pady=5)
+        self.watch_search([self.member_search_name, self.member_search_email],
+                          lambda: self.refresh_member_list(live=True))
 
         # --- Treeview for Members ---
         tree_frame = ttk.Frame(frame)
@@ -482,7 +734,12 @@ class MainApp:
         self.member_tree.column("Phone", width=150)
         
         scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.member_tree.yview)
-        self.member_tree.configure(yscrollcommand=scrollbar.set)
+        self.member_pages = PagedTreeview(
+            self.member_tree, scrollbar,
+            runner=self.runner,
+            row_values=tuple,
+            row_key=lambda member: (member.name, member.member_id)
+        )
         self.member_tree.pack(side='left', fill='both', expand=True)
         scrollbar.pack(side='right', fill='y')
 
@@ -492,12 +749,110 @@ class MainApp:
         ttk.Button(button_frame, text="Add New Member", command=self.open_add_member_dialog).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Edit Selected", command=self.open_edit_member_dialog).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Delete Selected", command=self.delete_selected_member).pack(side='left', padx=5)
+        if self.user_info['role'] == 'admin':
+            ttk.Button(button_frame, text="Import Members...",
+                       command=lambda: self.import_records('members')).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Export Members...", command=lambda: self.export_records('members')).pack(side='left', padx=5)
         
         self.refresh_member_list()
-        
-    def create_settings_tab(self):
-        frame = ttk.Frame(self.notebook, padding="20")
-        self.notebook.add(frame, text='Settings')
+
+    def create_fines_tab(self, frame):
+
+        # --- Report Options ---
+        options_frame = ttk.LabelFrame(frame, text="Outstanding Fines on Overdue Loans", padding="10")
+        options_frame.pack(fill='x', pady=5)
+        ttk.Label(options_frame, text="As of (YYYY-MM-DD):").grid(row=0, column=0, padx=5, pady=5)
+        self.fines_as_of = ttk.Entry(options_frame, width=12)
+        self.fines_as_of.insert(0, date.today().isoformat())
+        self.fines_as_of.grid(row=0, column=1, padx=5, pady=5)
+        ttk.Button(options_frame, text="Run Report", command=self.run_fine_report).grid(row=0, column=2, padx=10, pady=5)
+        ttk.Button(options_frame, text="Export CSV...", command=self.export_fine_report).grid(row=0, column=3, padx=5, pady=5)
+        self.fines_summary = ttk.Label(frame, text="Run the report to see the fines owed across the library.",
+                                       justify='left', font=("Helvetica", 11))
+        self.fines_summary.pack(fill='x', pady=5)
+
+        # --- Ageing Buckets ---
+        self.fines_ageing = ttk.Treeview(frame, columns=("Overdue", "Loans", "Fines"), show='headings', height=5)
+        for column, width in (("Overdue", 200), ("Loans", 120), ("Fines", 150)):
+            self.fines_ageing.heading(column, text=column)
+            self.fines_ageing.column(column, width=width, anchor='w' if column == "Overdue" else 'e')
+        self.fines_ageing.pack(anchor='w', pady=5)
+
+        # --- Treeview for Members ---
+        tree_frame = ttk.Frame(frame)
+        tree_frame.pack(expand=True, fill='both', pady=10)
+        columns = ("ID", "Name", "Email", "Overdue Loans", "Days Overdue", "Fine")
+        self.fines_tree = ttk.Treeview(tree_frame, columns=columns, show='headings')
+        for column in columns:
+            self.fines_tree.heading(column, text=column)
+            self.fines_tree.column(column, width=110, anchor='e')
+        self.fines_tree.column("ID", width=60, anchor='center')
+        self.fines_tree.column("Name", width=220, anchor='w')
+        self.fines_tree.column("Email", width=240, anchor='w')
+        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.fines_tree.yview)
+        self.fines_tree.configure(yscrollcommand=scrollbar.set)
+        self.fines_tree.pack(side='left', fill='both', expand=True)
+        scrollbar.pack(side='right', fill='y')
+
+    def _fines_as_of(self):
+        try:
+            return date.fromisoformat(self.fines_as_of.get().strip())
+        except ValueError:
+            messagebox.showwarning("Input Error", "Enter the report date as YYYY-MM-DD.")
+            return None
+
+    def run_fine_report(self):
+        as_of = self._fines_as_of()
+        if as_of:
+            self.runner.submit(self.db.fine_report, as_of, FINE_REPORT_TOP, on_done=self.show_fine_report,
+                               key='fine_report')
+
+    def show_fine_report(self, report):
+        if report is None:
+            return
+        self.fines_summary.config(text=(
+            f"As of {report['as_of']} at {report['fine_per_day']:g} per day: {report['total_fines']:,.2f} outstanding "
+            f"on {report['overdue_loans']:,} overdue loans held by {report['members_with_fines']:,} members.\n"
+            f"Days overdue: mean {report['mean_days_overdue']}, max {report['max_days_overdue']}. "
+            f"Showing the {len(report['members'])} largest balances (computed in {report['seconds']}s)."
+        ))
+        self.fines_ageing.delete(*self.fines_ageing.get_children())
+        for bucket in report['ageing']:
+            self.fines_ageing.insert('', 'end', values=(bucket['label'], f"{bucket['loans']:,}", f"{bucket['fines']:,.2f}"))
+        self.fines_tree.delete(*self.fines_tree.get_children())
+        for member in report['members']:
+            self.fines_tree.insert('', 'end', values=(
+                member['member_id'], member['name'], member['email'], member['overdue_loans'],
+                member['days_overdue'], f"{member['fine']:,.2f}"
+            ))
+
+    def export_fine_report(self):
+        """Writes every member who owes a fine (not just the listed ones) to a CSV file."""
+        as_of = self._fines_as_of()
+        if not as_of:
+            return
+        path = filedialog.asksaveasfilename(
+            title="Export Fines Report", defaultextension=".csv", initialfile=f"fines_{as_of.isoformat()}.csv",
+            filetypes=[("CSV", "*.csv"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+
+        def export():
+            import fine_report
+            report = self.db.fine_report(as_of, None)
+            if report is not None:
+                fine_report.write_csv(report, path)
+            return report
+
+        def exported(report):
+            if report is not None:
+                self.show_fine_report(dict(report, members=report['members'][:FINE_REPORT_TOP]))
+                messagebox.showinfo("Report Exported", f"{len(report['members']):,} members written to {path}")
+        self.runner.submit(export, on_done=exported,
+                           on_error=lambda err: messagebox.showerror("Error", f"Could not write the report: {err}"))
+
+    def create_settings_tab(self, frame):
         
         ttk.Label(frame, text="Library Settings", font=("Helvetica", 18, "bold")).pack(pady=10)
         
@@ -505,183 +860,472 @@ class MainApp:
         settings_frame.pack(fill='x', pady=10)
         
         ttk.Label(settings_frame, text="Fine per Day (₹):").grid(row=0, column=0, padx=5, pady=10, sticky='w')
-        self.fine_rate_var = tk.StringVar(value=self.db.get_setting('fine_per_day'))
+        self.fine_rate_var = tk.StringVar()
         fine_entry = ttk.Entry(settings_frame, textvariable=self.fine_rate_var, width=10)
         fine_entry.grid(row=0, column=1, padx=5, pady=10)
         
         ttk.Label(settings_frame, text="Loan Duration (days):").grid(row=1, column=0, padx=5, pady=10, sticky='w')
-        self.loan_duration_var = tk.StringVar(value=self.db.get_setting('loan_duration_days'))
+        self.loan_duration_var = tk.StringVar()
         loan_entry = ttk.Entry(settings_frame, textvariable=self.loan_duration_var, width=10)
         loan_entry.grid(row=1, column=1, padx=5, pady=10)
         
         save_btn = ttk.Button(settings_frame, text="Save Settings", command=self.save_settings)
         save_btn.grid(row=2, column=0, columnspan=2, pady=20)
 
+        maintenance_frame = ttk.LabelFrame(frame, text="Maintenance", padding="15")
+        maintenance_frame.pack(fill='x', pady=10)
+        ttk.Button(maintenance_frame, text="Verify Dashboard Counters", command=self.verify_dashboard_counters).pack(side='left', padx=5)
+
+        self.runner.submit(self.db.get_settings, on_done=self.show_settings)
+
+    def show_settings(self, settings):
+        self.fine_rate_var.set(settings.get('fine_per_day', ''))
+        self.loan_duration_var.set(settings.get('loan_duration_days', ''))
+
+    def create_diagnostics_tab(self, frame):
+        self.diagnostics_frame = frame
+
+        header = ttk.Frame(self.diagnostics_frame)
+        header.pack(fill='x', pady=5)
+        self.diagnostics_summary = ttk.Label(header, text="", justify='left', font=("Helvetica", 10))
+        self.diagnostics_summary.pack(side='left')
+        ttk.Button(header, text="Dump Snapshot...", command=self.dump_diagnostics).pack(side='right', padx=5)
+        ttk.Button(header, text="Reset", command=self.reset_diagnostics).pack(side='right', padx=5)
+
+        # --- Treeview for Statements ---
+        tree_frame = ttk.Frame(self.diagnostics_frame)
+        tree_frame.pack(expand=True, fill='both', pady=10)
+        columns = ("Statement", "Calls", "Total (ms)", "Mean (ms)", "p95 (ms)", "Max (ms)", "Rows", "Slow", "Errors")
+        self.diagnostics_tree = ttk.Treeview(tree_frame, columns=columns, show='headings')
+        for column in columns:
+            self.diagnostics_tree.heading(column, text=column)
+            self.diagnostics_tree.column(column, width=80, anchor='e')
+        self.diagnostics_tree.column("Statement", width=520, anchor='w')
+        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.diagnostics_tree.yview)
+        self.diagnostics_tree.configure(yscrollcommand=scrollbar.set)
+        self.diagnostics_tree.pack(side='left', fill='both', expand=True)
+        scrollbar.pack(side='right', fill='y')
+
+        self.refresh_diagnostics()
+
+    def refresh_diagnostics(self):
+        """Updates the Diagnostics tab from the in-memory counters (no database call) while it is visible."""
+        if self.notebook.select() == str(self.diagnostics_frame):
+            self.show_diagnostics(self.db.get_query_stats(), self.db.get_pool_stats())
+        self.root.after(DIAGNOSTICS_REFRESH_MS, self.refresh_diagnostics)
+
+    def show_diagnostics(self, stats, pool):
+        acquire = stats['acquire']
+        calls = sum(entry['count'] for entry in stats['statements'])
+        self.diagnostics_summary.config(text=(
+            f"Since {stats['since']}: {calls} statements in {len(stats['statements'])} shapes, "
+            f"{sum(entry['slow'] for entry in stats['statements'])} slow (>= {stats['slow_query_ms']} ms, "
+            f"logged to {SLOW_QUERY_LOG})\n"
+            f"Connection acquire: mean {acquire['mean_ms']:.2f} ms, p95 {acquire['p95_ms']} ms, "
+            f"max {acquire['max_ms']:.1f} ms    Pool: {pool['in_use']} in use, {pool['idle']} idle of {pool['size']}, "
+            f"{pool['waits']} waits, {pool['timeouts']} timeouts, {pool['reconnects']} reconnects"
+        ))
+        # Update rows in place (keyed by statement) so the selection and scroll position survive
+        seen = set()
+        for index, entry in enumerate(stats['statements']):
+            iid = hashlib.md5(entry['statement'].encode()).hexdigest()
+            seen.add(iid)
+            values = (entry['statement'], entry['count'], f"{entry['total_ms']:.1f}", f"{entry['mean_ms']:.2f}",
+                      entry['p95_ms'], f"{entry['max_ms']:.1f}", entry['rows'], entry['slow'], entry['errors'])
+            if self.diagnostics_tree.exists(iid):
+                self.diagnostics_tree.item(iid, values=values)
+                self.diagnostics_tree.move(iid, '', index)
+            else:
+                self.diagnostics_tree.insert('', index, iid=iid, values=values)
+        for iid in self.diagnostics_tree.get_children():
+            if iid not in seen:
+                self.diagnostics_tree.delete(iid)
+
+    def reset_diagnostics(self):
+        self.db.query_stats.reset()
+        self.show_diagnostics(self.db.get_query_stats(), self.db.get_pool_stats())
+
+    def dump_diagnostics(self):
+        path = filedialog.asksaveasfilename(
+            title="Save Query Statistics", defaultextension=".json",
+            initialfile=f"query_stats_{datetime.now():%Y%m%d_%H%M%S}.json",
+            filetypes=[("JSON", "*.json"), ("All files", "*.*")]
+        )
+        if path:
+            try:
+                self.db.dump_query_stats(path)
+                messagebox.showinfo("Snapshot Saved", f"Query statistics written to {path}")
+            except OSError as err:
+                messagebox.showerror("Error", f"Could not write the snapshot: {err}")
+
     # --- Data Refresh Methods ---
-    def refresh_book_list(self):
-        for i in self.book_tree.get_children():
-            self.book_tree.delete(i)
-        
-        title = self.book_search_title.get()
-        author = self.book_search_author.get()
-        status = self.book_search_status.get()
-        
-        books = self.db.search_books(title, author, status)
-        if books:
-            for book in books:
-                self.book_tree.insert("", "end", values=(
-                    book['book_id'], book['title'], book['author'], book['genre'], book['status']
-                ))
-
-    def refresh_member_list(self):
-        for i in self.member_tree.get_children():
-            self.member_tree.delete(i)
-        
-        name = self.member_search_name.get()
-        email = self.member_search_email.get()
-            
-        members = self.db.search_members(name, email)
-        if members:
-            for member in members:
-                self.member_tree.insert("", "end", values=(
-                    member['member_id'], member['name'], member['email'], member['phone']
-                ))
+    def watch_search(self, entries, search):
+        """Calls search() once typing in any of the entries has paused for SEARCH_DEBOUNCE_MS."""
+        pending = None
+
+        def changed(*args):
+            nonlocal pending
+            if pending is not None:
+                self.root.after_cancel(pending)
+            pending = self.root.after(SEARCH_DEBOUNCE_MS, run)
+
+        def run():
+            nonlocal pending
+            pending = None
+            search()
+
+        for entry in entries:
+            variable = tk.StringVar(self.root)
+            entry.configure(textvariable=variable)
+            variable.trace_add('write', changed)
+            self._search_vars.append(variable)
+
+    def cached_pages(self, cache, page_query, filters):
+        """Page fetcher for a PagedTreeview that stores the first page of each search in cache."""
+        def fetch_page(**page):
+            rows = page_query(**filters, **page)
+            if rows is not None and page.get('after') is None and page.get('before') is None:
+                cache.store(filters, rows, complete=len(rows) < page['limit'])
+            return rows
+        return fetch_page
+
+    def refresh_book_list(self, live=False):
+        """
+        Reloads the book list.
+        :param live: True while the user types; the search may then be answered from the search cache.
+                     Otherwise (the Search button, or after the books changed) the cache is cleared.
+        """
+        filters = {'title': self.book_search_title.get(), 'author': self.book_search_author.get(),
+                   'status': self.book_search_status.get()}
+        if not live:
+            self.book_search.clear()
+        self.book_pages.reset(self.cached_pages(self.book_search, self.db.page_books, filters),
+                              first_page=self.book_search.lookup(filters) if live else None)
+
+    def refresh_member_list(self, live=False):
+        """Reloads the member list; see refresh_book_list."""
+        filters = {'name': self.member_search_name.get(), 'email': self.member_search_email.get()}
+        if not live:
+            self.member_search.clear()
+        self.member_pages.reset(self.cached_pages(self.member_search, self.db.page_members, filters),
+                                first_page=self.member_search.lookup(filters) if live else None)
+
+    # --- Row Updates ---
+    # After a change the affected rows are updated in place, keyed by book_id
+    # or member_id, instead of reloading the list: the work done doesn't
+    # depend on how many rows are loaded. An updated row keeps its place until
+    # the next refresh, even if the change moved it in the sort order.
+    def book_saved(self, book):
+        """BookDialog callback: book is the edited Book, or None after an add (the list is reloaded)."""
+        if book is None:
+            self.refresh_book_list()
+            self.populate_dashboard()
+            return
+        self.book_search.clear()
+        self.book_pages.update_row(book)
+
+    def member_saved(self, member):
+        """MemberDialog callback; see book_saved."""
+        if member is None:
+            self.refresh_member_list()
+            self.populate_dashboard()
+            return
+        self.member_search.clear()
+        self.member_pages.update_row(member)
+
+    def show_book_availability(self, results):
+        """
+        Shows the copies left on the shelf after books were issued or returned.
+        :param results: The issue_books/return_books results ('available' is None if the book no longer exists).
+        """
+        changed = {}
+        for result in results:
+            book = self.book_pages.row(str(result['book_id']))
+            if book is None:
+                continue
+            available = result['available']
+            changed[result['book_id']] = None if available is None else book.replace(
+                available_copies=available, status='Available' if available else 'Issued')
+        self.show_changed_books(changed)
+
+    def show_changed_books(self, books):
+        """
+        Shows changed books in place, dropping rows the status filter no longer matches.
+        :param books: {book_id: the current Book, or None (the book no longer exists)}.
+        """
+        self.book_search.clear()
+        status_filter = self.book_search_status.get()
+        for book_id, book in books.items():
+            if book is None or (status_filter and book.status != status_filter):
+                self.book_pages.remove_row(book_id)
+            else:
+                self.book_pages.update_row(book)
+
+    def show_changed_members(self, members):
+        """Shows changed members in place; see show_changed_books."""
+        self.member_search.clear()
+        for member_id, member in members.items():
+            if member is None:
+                self.member_pages.remove_row(member_id)
+            else:
+                self.member_pages.update_row(member)
 
     # --- Book Operations ---
     def open_add_book_dialog(self):
-        BookDialog(self.root, "Add New Book", self.db, self.refresh_book_list)
+        BookDialog(self.root, "Add New Book", self.db, self.runner, self.book_saved)
         
     def open_edit_book_dialog(self):
         selected_item = self.book_tree.focus()
         if not selected_item:
             messagebox.showwarning("Selection Error", "Please select a book to edit.")
             return
-        book_data = self.book_tree.item(selected_item)['values']
-        BookDialog(self.root, "Edit Book", self.db, self.refresh_book_list, book_data=book_data)
+        BookDialog(self.root, "Edit Book", self.db, self.runner, self.book_saved,
+                   book=self.book_pages.row(selected_item))
         
     def delete_selected_book(self):
         selected_item = self.book_tree.focus()
         if not selected_item:
             messagebox.showwarning("Selection Error", "Please select a book to delete.")
             return
-        book_id = self.book_tree.item(selected_item)['values'][0]
+        book_id = self.book_pages.row(selected_item).book_id
         if messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete Book ID {book_id}?"):
-            if self.db.delete_book(book_id) > 0:
-                messagebox.showinfo("Success", "Book deleted successfully.")
-                self.refresh_book_list()
-            else:
-                messagebox.showerror("Error", "Could not delete the book. It may be currently issued or does not exist.")
+            def deleted(count):
+                if count > 0:
+                    messagebox.showinfo("Success", "Book deleted successfully.")
+                    self.book_search.clear()
+                    self.book_pages.remove_row(book_id)
+                    self.populate_dashboard()
+                else:
+                    messagebox.showerror("Error", "Could not delete the book. It may be currently issued or does not exist.")
+            self.runner.submit(self.db.delete_book, book_id, on_done=deleted)
     
     # --- Member Operations ---
     def open_add_member_dialog(self):
-        MemberDialog(self.root, "Add New Member", self.db, self.refresh_member_list)
+        MemberDialog(self.root, "Add New Member", self.db, self.runner, self.member_saved)
 
     def open_edit_member_dialog(self):
         selected_item = self.member_tree.focus()
         if not selected_item:
             messagebox.showwarning("Selection Error", "Please select a member to edit.")
             return
-        member_data = self.member_tree.item(selected_item)['values']
-        MemberDialog(self.root, "Edit Member", self.db, self.refresh_member_list, member_data=member_data)
+        MemberDialog(self.root, "Edit Member", self.db, self.runner, self.member_saved,
+                     member=self.member_pages.row(selected_item))
 
     def delete_selected_member(self):
         selected_item = self.member_tree.focus()
         if not selected_item:
             messagebox.showwarning("Selection Error", "Please select a member to delete.")
             return
-        member_id = self.member_tree.item(selected_item)['values'][0]
+        member_id = self.member_pages.row(selected_item).member_id
         if messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete Member ID {member_id}?"):
-            if self.db.delete_member(member_id) > 0:
-                messagebox.showinfo("Success", "Member deleted successfully.")
+            def deleted(count):
+                if count > 0:
+                    messagebox.showinfo("Success", "Member deleted successfully.")
+                    self.member_search.clear()
+                    self.member_pages.remove_row(member_id)
+                    self.populate_dashboard()
+            self.runner.submit(self.db.delete_member, member_id, on_done=deleted)
+
+    # --- Bulk Import ---
+    def import_records(self, kind):
+        import bulk_import
+        path = filedialog.askopenfilename(
+            title=f"Import {kind.title()}",
+            filetypes=[("CSV or JSON Lines", "*.csv *.jsonl *.ndjson"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+
+        def progress(read, committed, rejected):
+            # Runs on the worker thread; hand the label update to the Tk thread
+            self.runner.call_soon(self.status_label.config, text=f"Importing {kind}: {committed} imported, {rejected} rejected...")
+
+        def finished(summary):
+            message = (f"Imported {summary['inserted']} of {summary['read']} {kind} "
+                       f"in {summary['seconds']}s ({summary['rows_per_second']} rows/s).")
+            if summary['rejects_file']:
+                message += f"\n\n{summary['rejected']} rows were rejected; see {summary['rejects_file']}"
+            messagebox.showinfo("Import Complete", message)
+            if kind == 'books':
+                self.refresh_book_list()
+            else:
                 self.refresh_member_list()
+            self.populate_dashboard()
+
+        self.runner.submit(bulk_import.import_file, self.db, kind, path, progress=progress, on_done=finished)
+
+    def export_records(self, kind):
+        """Exports the books or members matching the current search, however many there are."""
+        import bulk_export
+        if kind == 'books':
+            filters = {'title': self.book_search_title.get(), 'author': self.book_search_author.get(),
+                       'status': self.book_search_status.get()}
+        else:
+            filters = {'name': self.member_search_name.get(), 'email': self.member_search_email.get()}
+        path = filedialog.asksaveasfilename(
+            title=f"Export {kind.title()}", defaultextension=".csv", initialfile=f"{kind}.csv",
+            filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+
+        def progress(written):
+            self.runner.call_soon(self.status_label.config, text=f"Exporting {kind}: {written} written...")
+
+        def finished(summary):
+            messagebox.showinfo("Export Complete", f"Exported {summary['written']} {kind} to {summary['path']} "
+                                                   f"in {summary['seconds']}s ({summary['rows_per_second']} rows/s).")
+
+        self.runner.submit(bulk_export.export_file, self.db, kind, path, progress=progress, on_done=finished,
+                           on_error=lambda err: messagebox.showerror("Export Failed", f"Could not export {kind}: {err}"),
+                           **filters)
 
     # --- Issue/Return Operations ---
+    def _selected_books(self):
+        """Returns the Book records of the selected rows in the book list."""
+        return [self.book_pages.row(item) for item in self.book_tree.selection()]
+
     def open_issue_book_dialog(self):
-        selected_item = self.book_tree.focus()
-        if not selected_item:
-            messagebox.showwarning("Selection Error", "Please select a book to issue.")
+        selected = self._selected_books()
+        if not selected:
+            messagebox.showwarning("Selection Error", "Please select one or more books to issue.")
             return
-        book_values = self.book_tree.item(selected_item)['values']
-        book_id, book_title, status = book_values[0], book_values[1], book_values[4]
-        
-        if status == 'Issued':
-            messagebox.showerror("Error", f"'{book_title}' is already issued.")
+        books = [(book.book_id, book.title) for book in selected if book.available_copies]
+        if not books:
+            messagebox.showerror("Error", "No copies of the selected books are on the shelf.")
             return
 
-        member_id = simpledialog.askstring("Issue Book", f"Enter Member ID to issue '{book_title}':", parent=self.root)
+        if len(books) == 1:
+            prompt = f"Enter Member ID to issue '{books[0][1]}':"
+        else:
+            prompt = f"Enter Member ID to issue {len(books)} books:"
+        member_id = simpledialog.askstring("Issue Book", prompt, parent=self.root)
         if member_id:
             try:
                 member_id = int(member_id)
-                if self.db.issue_book(book_id, member_id):
-                    messagebox.showinfo("Success", f"Book issued successfully to Member ID {member_id}.")
-                    self.refresh_book_list()
-                    self.populate_dashboard() # Refresh stats
-                else:
-                    messagebox.showerror("Error", "Failed to issue book. Check if Member ID is valid.")
             except ValueError:
                 messagebox.showerror("Invalid Input", "Member ID must be a number.")
+                return
+
+            titles = dict(books)
+            def issued(results):
+                if results is None:
+                    messagebox.showerror("Error", "Failed to issue books. Check if Member ID is valid.")
+                    return
+                # 'unavailable' books were issued by another desk in the meantime
+                self.show_book_availability(results)
+                self.populate_dashboard() # Refresh stats
+                done = [r for r in results if r['result'] == 'issued']
+                failed = [titles[r['book_id']] for r in results if r['result'] != 'issued']
+                message = f"{len(done)} book(s) issued to Member ID {member_id}."
+                if done:
+                    message += f"\nDue back on {done[0]['due_date']:%Y-%m-%d}."
+                if failed:
+                    message += "\n\nNo longer available:\n" + "\n".join(failed)
+                    messagebox.showwarning("Partially Issued", message)
+                else:
+                    messagebox.showinfo("Success", message)
+            self.runner.submit(self.db.issue_books, list(titles), member_id, on_done=issued)
     
     def return_selected_book(self):
-        selected_item = self.book_tree.focus()
-        if not selected_item:
-            messagebox.showwarning("Selection Error", "Please select a book to return.")
+        selected = self._selected_books()
+        if not selected:
+            messagebox.showwarning("Selection Error", "Please select one or more books to return.")
             return
-        book_values = self.book_tree.item(selected_item)['values']
-        book_id, book_title, status = book_values[0], book_values[1], book_values[4]
-
-        if status == 'Available':
-            messagebox.showerror("Error", f"'{book_title}' is already available.")
+        on_loan = [book for book in selected if book.available_copies < book.total_copies]
+        if not on_loan:
+            messagebox.showerror("Error", "No copies of the selected books are on loan.")
             return
+        titles = {book.book_id: book.title for book in on_loan}
+        member_id = None
+        if any(book.total_copies - book.available_copies > 1 for book in on_loan):
+            # Several copies are out: whose copy is coming back?
+            member_id = simpledialog.askstring(
+                "Return Book", "Several copies are on loan. Enter the Member ID returning them\n"
+                "(leave empty to return the copies due back first):", parent=self.root)
+            if member_id is None:
+                return
+            try:
+                member_id = int(member_id) if member_id.strip() else None
+            except ValueError:
+                messagebox.showerror("Invalid Input", "Member ID must be a number.")
+                return
 
-        fine_amount = self.db.return_book(book_id)
-        if fine_amount is not None:
-            self.refresh_book_list()
+        def returned(results):
+            if results is None:
+                return
+            # 'not_issued' books had already been returned elsewhere
+            self.show_book_availability(results)
             self.populate_dashboard() # Refresh stats
-            if fine_amount > 0:
-                messagebox.showwarning("Fine Due", f"Book returned successfully.\nA fine of ₹{fine_amount:.2f} was due for being overdue.")
+            returned_books = [r for r in results if r['result'] == 'returned']
+            fines = [r for r in returned_books if r['fine'] > 0]
+            message = f"{len(returned_books)} book(s) returned successfully."
+            if fines:
+                lines = "\n".join(f"{titles[r['book_id']]}: {r['days_overdue']} day(s) late, ₹{r['fine']:.2f}" for r in fines)
+                total = sum(r['fine'] for r in fines)
+                messagebox.showwarning("Fine Due", f"{message}\n\nFines due for overdue books:\n{lines}\n\nTotal: ₹{total:.2f}")
             else:
-                messagebox.showinfo("Success", "Book returned successfully.")
+                messagebox.showinfo("Success", message)
+        self.runner.submit(self.db.return_books, list(titles), member_id, on_done=returned)
 
     # --- Settings Operations ---
     def save_settings(self):
         try:
             fine_rate = float(self.fine_rate_var.get())
             loan_duration = int(self.loan_duration_var.get())
-            
-            self.db.update_setting('fine_per_day', str(fine_rate))
-            self.db.update_setting('loan_duration_days', str(loan_duration))
-            
-            messagebox.showinfo("Success", "Settings have been updated.")
         except ValueError:
             messagebox.showerror("Input Error", "Please ensure fine rate is a number and loan duration is an integer.")
+            return
+
+        def save():
+            self.db.update_setting('fine_per_day', str(fine_rate))
+            self.db.update_setting('loan_duration_days', str(loan_duration))
+        self.runner.submit(save, on_done=lambda _: messagebox.showinfo("Success", "Settings have been updated."))
+
+    def verify_dashboard_counters(self):
+        def verified(mismatches):
+            if not mismatches:
+                messagebox.showinfo("Counters OK", "All dashboard counters match the actual counts.")
+                return
+            details = "\n".join(f"{key}: {stored} -> {actual}" for key, (stored, actual) in mismatches.items())
+            messagebox.showwarning("Counters Repaired", f"The following counters were out of sync and have been corrected:\n{details}")
+            self.populate_dashboard()
+        self.runner.submit(self.db.verify_stats, repair=True, on_done=verified)
             
             
 # --- Generic Dialog Classes for Add/Edit ---
 class BookDialog(simpledialog.Dialog):
     """A dialog for adding or editing books."""
-    def __init__(self, parent, title, db, callback, book_data=None):
+    def __init__(self, parent, title, db, runner, callback, book=None):
         self.db = db
-        self.callback = callback
-        self.book_data = book_data # None for "Add", contains data for "Edit"
+        self.runner = runner
+        self.callback = callback # Called with the edited Book, or None to reload the list
+        self.book = book # None for "Add", the Book record for "Edit"
         super().__init__(parent, title)
 
     def body(self, master):
         ttk.Label(master, text="Title:").grid(row=0, sticky='w')
         ttk.Label(master, text="Author:").grid(row=1, sticky='w')
         ttk.Label(master, text="Genre:").grid(row=2, sticky='w')
+        ttk.Label(master, text="Copies:").grid(row=3, sticky='w')
 
         self.title_entry = ttk.Entry(master, width=40)
         self.author_entry = ttk.Entry(master, width=40)
         self.genre_entry = ttk.Entry(master, width=40)
+        self.copies_entry = ttk.Spinbox(master, from_=1, to=999, width=6)
 
         self.title_entry.grid(row=0, column=1, pady=5)
         self.author_entry.grid(row=1, column=1, pady=5)
         self.genre_entry.grid(row=2, column=1, pady=5)
+        self.copies_entry.grid(row=3, column=1, pady=5, sticky='w')
         
-        if self.book_data: # If editing, populate fields
-            self.title_entry.insert(0, self.book_data[1])
-            self.author_entry.insert(0, self.book_data[2])
-            self.genre_entry.insert(0, self.book_data[3])
+        if self.book: # If editing, populate fields
+            self.title_entry.insert(0, self.book.title)
+            self.author_entry.insert(0, self.book.author)
+            self.genre_entry.insert(0, self.book.genre or '')
+            self.copies_entry.set(self.book.total_copies)
+        else:
+            self.copies_entry.set(1)
             
         return self.title_entry # initial focus
 
@@ -693,24 +1337,40 @@ class BookDialog(simpledialog.Dialog):
         if not title or not author:
             messagebox.showwarning("Input Error", "Title and Author are required.", parent=self)
             return
+        try:
+            copies = int(self.copies_entry.get())
+            if copies < 1:
+                raise ValueError
+        except ValueError:
+            messagebox.showwarning("Input Error", "Copies must be a whole number of at least 1.", parent=self)
+            return
 
-        if self.book_data: # Editing existing book
-            book_id = self.book_data[0]
-            if self.db.update_book(book_id, title, author, genre):
-                messagebox.showinfo("Success", "Book updated successfully.", parent=self)
+        # The dialog closes right away; the result is reported once the save finishes
+        if self.book: # Editing existing book
+            book_id = self.book.book_id
+            # Copies are added to, or withdrawn from, those on the shelf
+            available = self.book.available_copies + copies - self.book.total_copies
+            book = self.book.replace(title=title, author=author, genre=genre, total_copies=copies,
+                                     available_copies=available, status='Available' if available else 'Issued')
+            self.runner.submit(self.db.update_book, book_id, title, author, genre, copies,
+                               on_done=lambda count: self.saved(count, "Book updated successfully.", book))
         else: # Adding new book
-            if self.db.add_book(title, author, genre):
-                messagebox.showinfo("Success", "Book added successfully.", parent=self)
-        
-        self.callback() # Refresh the treeview in the main app
+            self.runner.submit(self.db.add_book, title, author, genre, copies,
+                               on_done=lambda count: self.saved(count, "Book added successfully."))
+
+    def saved(self, count, message, book=None):
+        if count:
+            messagebox.showinfo("Success", message)
+        self.callback(book if count else None) # Update the treeview in the main app
 
 
 class MemberDialog(simpledialog.Dialog):
     """A dialog for adding or editing members."""
-    def __init__(self, parent, title, db, callback, member_data=None):
+    def __init__(self, parent, title, db, runner, callback, member=None):
         self.db = db
+        self.runner = runner
         self.callback = callback
-        self.member_data = member_data
+        self.member = member
         super().__init__(parent, title)
 
     def body(self, master):
@@ -726,10 +1386,10 @@ class MemberDialog(simpledialog.Dialog):
         self.email_entry.grid(row=1, column=1, pady=5)
         self.phone_entry.grid(row=2, column=1, pady=5)
         
-        if self.member_data:
-            self.name_entry.insert(0, self.member_data[1])
-            self.email_entry.insert(0, self.member_data[2])
-            self.phone_entry.insert(0, self.member_data[3])
+        if self.member:
+            self.name_entry.insert(0, self.member.name)
+            self.email_entry.insert(0, self.member.email)
+            self.phone_entry.insert(0, self.member.phone or '')
             
         return self.name_entry
 
@@ -742,36 +1402,50 @@ class MemberDialog(simpledialog.Dialog):
             messagebox.showwarning("Input Error", "Name and Email are required.", parent=self)
             return
 
-        if self.member_data:
-            member_id = self.member_data[0]
-            if self.db.update_member(member_id, name, email, phone):
-                messagebox.showinfo("Success", "Member updated successfully.", parent=self)
+        if self.member:
+            member_id = self.member.member_id
+            member = self.member.replace(name=name, email=email, phone=phone)
+            self.runner.submit(self.db.update_member, member_id, name, email, phone,
+                               on_done=lambda count: self.saved(count, "Member updated successfully.", member))
         else:
-            if self.db.add_member(name, email, phone):
-                messagebox.showinfo("Success", "Member added successfully.", parent=self)
-        
-        self.callback()
+            self.runner.submit(self.db.add_member, name, email, phone,
+                               on_done=lambda count: self.saved(count, "Member added successfully."))
+
+    def saved(self, count, message, member=None):
+        if count:
+            messagebox.showinfo("Success", message)
+        self.callback(member if count else None)
 
 # --- Main Execution ---
 if __name__ == "__main__":
     root = tk.Tk()
     root.withdraw() # Hide the main window initially
+    startup_trace.mark("Tk started")
 
-    db_manager = DatabaseManager(DB_HOST, DB_USER, DB_PASSWORD, DB_NAME)
-    
-    # Check initial DB connection
-    if not db_manager.connect():
-        messagebox.showerror("Startup Error", "Cannot connect to the database. Please check your configuration and ensure the MySQL server is running.")
-        root.destroy()
+    if API_URL:
+        # Thin client: every call goes through the circulation server's shared pool
+        from api_client import RemoteDatabaseManager
+        db_manager = RemoteDatabaseManager(API_URL)
     else:
-        db_manager.disconnect() # Close the test connection
-        
-        login = LoginWindow(root, db_manager)
-        
-        if login.user_info:
-            root.deiconify() # Show the main window after successful login
-            app = MainApp(root, db_manager, login.user_info)
-            root.mainloop()
-        else:
-            # If login was cancelled or failed, destroy the root window
-            root.destroy()
+        backend = get_backend(DB_BACKEND, DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, SQLITE_PATH)
+        db_manager = DatabaseManager(backend)
+    runner = TaskRunner(root)
+
+    # Database calls run on worker threads from here on; route their error
+    # dialogs back to the Tk thread
+    db_manager.error_handler = runner.post_error
+    # Open the first pooled connection while the user types their password,
+    # rather than making them wait for it before the login window appears.
+    # If the database is unreachable, connect() reports it in an error dialog.
+    runner.submit(db_manager.connect, on_done=lambda ok: startup_trace.mark("database connected" if ok else
+                                                                           "database connection failed"))
+    login = LoginWindow(root, db_manager, runner)
+
+    if login.user_info:
+        root.deiconify() # Show the main window after successful login
+        app = MainApp(root, db_manager, login.user_info, runner)
+        root.mainloop()
+    else:
+        # If login was cancelled or failed, destroy the root window
+        runner.shutdown()
+        root.destroy()
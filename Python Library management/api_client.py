@@ -0,0 +1,277 @@
+# api_client.py
+
+import http.client
+import json
+import re
+import sys
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import islice
+from urllib.parse import urlsplit
+
+from models import Record, Book, Member, Loan
+
+# --- Circulation API Client ---
+# RemoteDatabaseManager offers the DatabaseManager interface used by the GUI,
+# but forwards every call to api_server.py over HTTP/JSON. Desks then need
+# neither database credentials nor database connections of their own.
+
+API_TIMEOUT = 30             # Seconds to wait for a server reply
+BULK_BATCH_SIZE = 1000       # Rows sent per request by bulk_insert()
+STREAM_PAGE_ROWS = 2000      # Rows fetched per request by stream_books()/stream_members()
+
+# Methods forwarded to the server, with the value returned when a call fails
+# (matching what DatabaseManager returns after reporting an error)
+REMOTE_METHODS = {
+    'search_books': None, 'page_books': None, 'search_members': None, 'page_members': None, 'text_search_mode': None,
+    'add_book': 0, 'update_book': 0, 'delete_book': 0,
+    'add_member': 0, 'update_member': 0, 'delete_member': 0,
+    'issue_book': 0, 'issue_books': None, 'return_book': None, 'return_books': None,
+    'get_dashboard_stats': None, 'refresh_overdue_count': 0, 'verify_stats': {}, 'fine_report': None,
+    'get_settings': {}, 'get_setting': None, 'update_setting': 0,
+    'get_pool_stats': None, 'get_query_stats': None, 'bulk_insert_batch': None,
+    'get_changes': None, 'get_books': None, 'get_members': None, 'compact_change_log': 0, 'member_loans': None,
+}
+# Methods whose rows travel as JSON objects and are turned back into records
+RECORD_RESULTS = {'search_books': Book, 'page_books': Book, 'search_members': Member, 'page_members': Member,
+                  'get_books': Book, 'get_members': Member, 'member_loans': Loan}
+# Polled methods: a failed call isn't reported, the next poll simply retries
+QUIET_METHODS = {'get_changes'}
+
+
+# --- JSON Encoding (shared with api_server.py) ---
+def _default(value):
+    if isinstance(value, Record):
+        return value.as_dict()
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Cannot encode {type(value).__name__} as JSON")
+
+def encode(payload):
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode('utf-8')
+
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+def _restore_dates(obj):
+    # Dates travel as ISO strings; turn *_date fields back into date objects
+    for key, value in obj.items():
+        if key.endswith('_date') and isinstance(value, str) and _ISO_DATE.match(value):
+            obj[key] = date.fromisoformat(value)
+    return obj
+
+def decode(data):
+    return json.loads(data, object_hook=_restore_dates)
+
+
+class ApiError(Exception):
+    """A request the server refused or could not handle."""
+
+    def __init__(self, status, message):
+        super().__init__(f"{message} (HTTP {status})")
+        self.status = status
+
+
+class RemoteDatabaseManager:
+    """Thin client with the DatabaseManager interface, backed by api_server.py."""
+
+    query_stats = None  # Query instrumentation lives on the server
+
+    def __init__(self, url, timeout=API_TIMEOUT):
+        parts = urlsplit(url)
+        self.url = url
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.token = None
+        self.user = None
+        self._local = threading.local()  # One keep-alive connection per thread
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self.error_handler = lambda title, message: print(f"{title}: {message}", file=sys.stderr)
+
+    def report_error(self, title, message):
+        self.error_handler(title, message)
+
+    def __str__(self):
+        return f"library server at {self.url}"
+
+    # --- Transport ---
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _request(self, method, path, payload=None):
+        """Sends one request over this thread's keep-alive connection and returns the decoded reply."""
+        body = encode(payload) if payload is not None else None
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        for attempt in (1, 2):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # The server closed an idle keep-alive connection; reconnect once
+                conn.close()
+                if attempt == 2:
+                    raise
+            except (OSError, http.client.HTTPException):
+                conn.close()  # Resets the connection so the next request starts cleanly
+                raise
+        if response.getheader('Connection', '').lower() == 'close':
+            conn.close()
+        reply = decode(data) if data else {}
+        if response.status != 200:
+            raise ApiError(response.status, reply.get('error', response.reason))
+        return reply
+
+    def _call(self, name, /, *args, **kwargs):
+        try:
+            reply = self._request('POST', f"/api/call/{name}", {'args': args, 'kwargs': kwargs})
+        except (OSError, http.client.HTTPException, ApiError, ValueError) as err:
+            if name not in QUIET_METHODS:
+                self.report_error("Server Error", f"Request '{name}' failed: {err}")
+            return REMOTE_METHODS[name]
+        # Errors the server-side DatabaseManager reported while handling the call
+        for title, message in reply.get('errors', []):
+            self.report_error(title, message)
+        return self._records(name, reply.get('result'))
+
+    @staticmethod
+    def _records(name, result):
+        model = RECORD_RESULTS.get(name)
+        if model is None or result is None:
+            return result
+        return [model.from_dict(row) for row in result]
+
+    def __getattr__(self, name):
+        if name in REMOTE_METHODS:
+            return lambda *args, **kwargs: self._call(name, *args, **kwargs)
+        raise AttributeError(name)
+
+    def batch(self, calls):
+        """
+        Runs several calls in one round trip; the server executes them concurrently.
+        :param calls: A list of (method, args) or (method, args, kwargs) tuples.
+        :return: A list with each call's result (its failure value if it failed).
+        """
+        requests = [{'method': call[0], 'args': list(call[1]), 'kwargs': call[2] if len(call) > 2 else {}}
+                    for call in calls]
+        try:
+            reply = self._request('POST', "/api/batch", {'calls': requests})
+        except (OSError, http.client.HTTPException, ApiError, ValueError) as err:
+            self.report_error("Server Error", f"Batch request failed: {err}")
+            return [REMOTE_METHODS.get(call[0]) for call in calls]
+        results = []
+        for call, outcome in zip(calls, reply['results']):
+            if 'error' in outcome:
+                self.report_error("Server Error", f"Request '{call[0]}' failed: {outcome['error']}")
+                results.append(REMOTE_METHODS.get(call[0]))
+                continue
+            for title, message in outcome.get('errors', []):
+                self.report_error(title, message)
+            results.append(self._records(call[0], outcome.get('result')))
+        return results
+
+    # --- Session ---
+    def connect(self):
+        """Checks that the server is reachable."""
+        try:
+            self._request('GET', "/health")
+            return True
+        except (OSError, http.client.HTTPException, ApiError, ValueError) as err:
+            self.report_error("Server Error", f"Cannot reach the library server at {self.url}: {err}")
+            return False
+
+    def verify_user(self, username, password):
+        """Signs in; later calls are made on behalf of this user. Returns the user or None."""
+        try:
+            reply = self._request('POST', "/api/login", {'username': username, 'password': password})
+        except ApiError as err:
+            if err.status != 401:
+                self.report_error("Server Error", f"Login failed: {err}")
+            return None
+        except (OSError, http.client.HTTPException, ValueError) as err:
+            self.report_error("Server Error", f"Login failed: {err}")
+            return None
+        self.token = reply['token']
+        self.user = reply['user']
+        return self.user
+
+    def disconnect(self):
+        """Signs out and closes the keep-alive connections."""
+        if self.token:
+            try:
+                self._request('POST', "/api/logout", {})
+            except (OSError, http.client.HTTPException, ApiError, ValueError):
+                pass
+            self.token = None
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    # --- Streaming ---
+    def _stream_pages(self, method, sort_field, key_field, filters, chunk_rows):
+        # Keyset pages stand in for a server-side cursor; like DatabaseManager.stream_query,
+        # failures are raised rather than reported
+        after = None
+        while True:
+            reply = self._request('POST', f"/api/call/{method}",
+                                  {'args': [], 'kwargs': dict(filters, after=after, limit=chunk_rows)})
+            rows = reply.get('result')
+            if rows is None:
+                raise ApiError(500, '; '.join(message for _, message in reply.get('errors', [])) or "Query failed")
+            if rows:
+                yield self._records(method, rows)
+            if len(rows) < chunk_rows:
+                return
+            after = (rows[-1][sort_field], rows[-1][key_field])
+
+    def stream_books(self, title="", author="", status="", chunk_rows=STREAM_PAGE_ROWS):
+        """Same contract as DatabaseManager.stream_books()."""
+        return self._stream_pages('page_books', 'title', 'book_id',
+                                  {'title': title, 'author': author, 'status': status},
+                                  min(chunk_rows, STREAM_PAGE_ROWS))
+
+    def stream_members(self, name="", email="", chunk_rows=STREAM_PAGE_ROWS):
+        """Same contract as DatabaseManager.stream_members()."""
+        return self._stream_pages('page_members', 'name', 'member_id',
+                                  {'name': name, 'email': email}, min(chunk_rows, STREAM_PAGE_ROWS))
+
+    # --- Bulk Loading ---
+    def bulk_insert(self, table, columns, rows, batch_size=BULK_BATCH_SIZE, commit_every=None,
+                    on_rejected=None, on_progress=None):
+        """Same contract as DatabaseManager.bulk_insert(); rows are sent in batches of batch_size."""
+        batch_size = min(batch_size, BULK_BATCH_SIZE)
+        committed = 0
+        rows = iter(rows)
+        while True:
+            batch = [[line_no, list(values)] for line_no, values in islice(rows, batch_size)]
+            if not batch:
+                return committed
+            result = self._call('bulk_insert_batch', table, list(columns), batch)
+            if result is None:
+                return committed
+            committed += result['inserted']
+            if on_rejected:
+                for line_no, values, error in result['rejected']:
+                    on_rejected(line_no, values, error)
+            if on_progress:
+                on_progress(committed)
@@ -0,0 +1,217 @@
+# api_loadtest.py
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from library_db import DatabaseManager
+from api_client import RemoteDatabaseManager
+from api_server import API_HOST, API_PORT
+from benchmark import percentile
+from db_backends import get_backend
+from generate_dataset import WORDS, FIRST_NAMES, LAST_NAMES
+import db_setup_advanced
+import generate_dataset
+
+# --- Load Test Configuration ---
+# Simulates many circulation desks working against one api_server.py. Each
+# client thread holds its own keep-alive connection and runs a weighted mix of
+# the calls a desk makes; latencies are reported per operation.
+DEFAULT_CLIENTS = 20
+DEFAULT_DURATION = 30        # Seconds
+THINK_TIME = 0.0             # Seconds a client pauses between calls
+SERVER_START_TIMEOUT = 30
+SEED_BOOKS = 5000            # Dataset created by --start-server
+SEED_MEMBERS = 1000
+SEED_LOANS = 50000
+RANDOM_SEED = 42
+
+# Operation -> relative weight in the mix
+OPERATION_MIX = {
+    'search_books': 30,
+    'page_books': 20,
+    'search_members': 10,
+    'get_dashboard_stats': 15,
+    'batch_lookup': 10,      # Dashboard, settings and a search in one round trip
+    'issue_return_3': 15,    # Issue three books, then return them
+}
+
+
+# --- Test Server ---
+def start_server(port):
+    """Seeds a temporary SQLite database and starts api_server.py on it. Returns (process, url, directory)."""
+    directory = tempfile.mkdtemp(prefix='library_api_')
+    path = os.path.join(directory, 'loadtest.db')
+    config = ('sqlite', None, None, None, None, path)
+    backend = get_backend(*config)
+    with contextlib.redirect_stdout(io.StringIO()):
+        db_setup_advanced.create_database(backend)
+    print(f"Seeding {SEED_BOOKS} books, {SEED_MEMBERS} members and {SEED_LOANS} loans...", flush=True)
+    generate_dataset.generate(backend, config, books=SEED_BOOKS, members=SEED_MEMBERS, loans=SEED_LOANS,
+                              seed=RANDOM_SEED, progress=lambda message: None)
+    db = DatabaseManager(backend)
+    db.verify_stats(repair=True)  # Seeding bypasses the dashboard counters
+    db.disconnect()
+
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api_server.py'),
+         '--backend', 'sqlite', '--sqlite-path', path, '--port', str(port)],
+        stdout=subprocess.DEVNULL
+    )
+    url = f"http://{API_HOST}:{port}"
+    probe = RemoteDatabaseManager(url, timeout=2)
+    probe.error_handler = lambda title, message: None
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while not probe.connect():
+        if server.poll() is not None or time.monotonic() > deadline:
+            server.kill()
+            sys.exit("The API server did not start.")
+        time.sleep(0.2)
+    probe.disconnect()
+    return server, url, directory
+
+
+# --- Clients ---
+class Client(threading.Thread):
+    """One simulated desk."""
+
+    def __init__(self, url, username, password, stop_at, seed):
+        super().__init__(daemon=True)
+        self.db = RemoteDatabaseManager(url)
+        self.errors = []
+        self.db.error_handler = lambda title, message: self.errors.append(message)
+        self.username = username
+        self.password = password
+        self.stop_at = stop_at
+        self.rng = random.Random(seed)
+        self.latencies = {name: [] for name in OPERATION_MIX}
+        self.failed_login = False
+
+    def run(self):
+        if not self.db.verify_user(self.username, self.password):
+            self.failed_login = True
+            return
+        names, weights = list(OPERATION_MIX), list(OPERATION_MIX.values())
+        while time.monotonic() < self.stop_at:
+            name = self.rng.choices(names, weights)[0]
+            began = time.perf_counter()
+            getattr(self, name)()
+            self.latencies[name].append(time.perf_counter() - began)
+            if THINK_TIME:
+                time.sleep(THINK_TIME)
+        self.db.disconnect()
+
+    def _term(self, words):
+        return self.rng.choice(words)[:self.rng.randint(3, 6)]
+
+    def search_books(self):
+        self.db.search_books(title=self._term(WORDS))
+
+    def page_books(self):
+        self.db.page_books(status=self.rng.choice(['', 'Available']))
+
+    def search_members(self):
+        self.db.search_members(name=self._term(FIRST_NAMES + LAST_NAMES))
+
+    def get_dashboard_stats(self):
+        self.db.get_dashboard_stats()
+
+    def batch_lookup(self):
+        self.db.batch([('get_dashboard_stats', ()), ('get_settings', ()),
+                       ('search_books', (), {'title': self._term(WORDS)})])
+
+    def issue_return_3(self):
+        page = self.db.page_books(status='Available', after=(self._term(WORDS), 0), limit=3) or []
+        book_ids = [book.book_id for book in page]
+        if not book_ids:
+            return
+        member = (self.db.page_members(limit=1) or [None])[0]
+        if member is None:
+            return
+        # Another desk may take the same books first; those come back as 'unavailable'
+        issued = self.db.issue_books(book_ids, member.member_id) or []
+        mine = [result['book_id'] for result in issued if result['result'] == 'issued']
+        if mine:
+            self.db.return_books(mine)
+
+
+# --- Report ---
+def summarize(clients, elapsed):
+    results = {}
+    for name in OPERATION_MIX:
+        latencies = sorted(latency for client in clients for latency in client.latencies[name])
+        if not latencies:
+            continue
+        results[name] = {
+            'calls': len(latencies),
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'max_ms': round(latencies[-1] * 1000, 3),
+            'per_sec': round(len(latencies) / elapsed, 1),
+        }
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load-test api_server.py with simulated circulation desks.")
+    parser.add_argument('--url', default=None, help=f"server to test (default: http://{API_HOST}:{API_PORT})")
+    parser.add_argument('--start-server', action='store_true', help="seed a temporary SQLite database and serve it")
+    parser.add_argument('--port', type=int, default=API_PORT, help="port for --start-server")
+    parser.add_argument('--clients', type=int, default=DEFAULT_CLIENTS)
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION, help="seconds")
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin')
+    parser.add_argument('--output', default=None, help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    server = directory = None
+    url = args.url or f"http://{API_HOST}:{args.port}"
+    if args.start_server:
+        server, url, directory = start_server(args.port)
+    try:
+        stop_at = time.monotonic() + args.duration
+        clients = [Client(url, args.username, args.password, stop_at, RANDOM_SEED + i) for i in range(args.clients)]
+        print(f"Running {args.clients} clients against {url} for {args.duration:g}s...", flush=True)
+        start = time.perf_counter()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        elapsed = time.perf_counter() - start
+
+        if any(client.failed_login for client in clients):
+            sys.exit(f"Could not sign in as '{args.username}'.")
+        results = summarize(clients, elapsed)
+        total = sum(result['calls'] for result in results.values())
+        errors = sum(len(client.errors) for client in clients)
+        for name, result in results.items():
+            print(f"  {name:<22} p50 {result['p50_ms']:>9.3f} ms   p95 {result['p95_ms']:>9.3f} ms   "
+                  f"{result['per_sec']:>8} /s")
+        print(f"{total} operations in {elapsed:.1f}s ({total / elapsed:.1f}/s), {errors} errors.")
+        for message in sorted({message for client in clients for message in client.errors})[:10]:
+            print(f"  error: {message}")
+
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({'meta': {'url': url, 'clients': args.clients, 'duration': args.duration,
+                                    'timestamp': datetime.now().isoformat(timespec='seconds')},
+                           'total_per_sec': round(total / elapsed, 1), 'errors': errors,
+                           'results': results}, f, indent=2)
+            print(f"Results written to {args.output}.")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+            shutil.rmtree(directory, ignore_errors=True)
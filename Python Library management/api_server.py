@@ -0,0 +1,315 @@
+# api_server.py
+
+import argparse
+import asyncio
+import inspect
+import json
+import secrets
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from library_db import (
+    DatabaseManager, POOL_SIZE, DB_BACKEND, DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, SQLITE_PATH
+)
+from api_client import encode, decode
+from db_backends import get_backend
+import bulk_import
+
+# --- Circulation API Server ---
+# A headless HTTP/JSON front end for DatabaseManager, so that every desk talks
+# to one service (see api_client.RemoteDatabaseManager) instead of holding its
+# own database credentials and connections. One DatabaseManager, and so one
+# connection pool, is shared by all desks. The blocking database calls run on
+# a thread pool sized to the connection pool, while the asyncio loop handles the
+# HTTP side: keep-alive connections, batched requests, and sharing a single
+# database call between identical read requests that arrive together.
+#
+#   POST /api/login              {"username", "password"} -> {"token", "user"}
+#   POST /api/logout
+#   POST /api/call/<method>      {"args": [...], "kwargs": {...}} -> {"result", "errors"}
+#   POST /api/batch              {"calls": [{"method", "args", "kwargs"}, ...]} -> {"results": [...]}
+#   GET  /health
+#
+# All /api calls except login need an "Authorization: Bearer <token>" header.
+
+# --- Server Configuration ---
+API_HOST = '127.0.0.1'
+API_PORT = 8765
+KEEPALIVE_TIMEOUT = 30       # Seconds an idle client connection is kept open
+MAX_BODY_BYTES = 8 * 1024 * 1024
+MAX_BATCH_CALLS = 100
+SESSION_IDLE_TIMEOUT = 8 * 60 * 60  # Seconds of inactivity after which a desk must sign in again
+
+# Roles allowed to make a call (None: any signed-in user). Desk staff get what
+# the GUI offers every user; bulk imports and settings are admin-only.
+STAFF = ('admin', 'librarian')
+ADMIN = ('admin',)
+
+# Exposed DatabaseManager methods: method -> (roles allowed, shareable).
+# Shareable (read-only) calls with identical arguments that are in flight at the
+# same time are answered by a single database call.
+METHODS = {
+    'search_books': (None, True), 'page_books': (None, True),
+    'search_members': (None, True), 'page_members': (None, True), 'text_search_mode': (None, True),
+    'get_settings': (None, True), 'get_setting': (None, True),
+    'fine_report': (None, True),
+    'get_changes': (None, True), 'get_books': (None, True), 'get_members': (None, True), 'member_loans': (None, True),
+    # Not shareable: recomputes and stores the overdue counter once it is out of date
+    'get_dashboard_stats': (None, False),
+    'add_book': (STAFF, False), 'update_book': (STAFF, False), 'delete_book': (STAFF, False),
+    'add_member': (STAFF, False), 'update_member': (STAFF, False), 'delete_member': (STAFF, False),
+    'issue_book': (STAFF, False), 'issue_books': (STAFF, False),
+    'return_book': (STAFF, False), 'return_books': (STAFF, False),
+    'refresh_overdue_count': (STAFF, False), 'compact_change_log': (STAFF, False),
+    'bulk_insert_batch': (ADMIN, False), 'update_setting': (ADMIN, False), 'verify_stats': (ADMIN, False),
+    'get_pool_stats': (ADMIN, True), 'get_query_stats': (ADMIN, True),
+}
+
+REASONS = {200: 'OK', 400: 'Bad Request', 401: 'Unauthorized', 403: 'Forbidden', 404: 'Not Found',
+           405: 'Method Not Allowed', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class CirculationServer:
+    """Serves DatabaseManager calls to many desks over HTTP/JSON."""
+
+    def __init__(self, db, workers=POOL_SIZE):
+        self.db = db
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api')
+        self.sessions = {}    # token -> {'user': ..., 'last_seen': ...}
+        self._inflight = {}   # (method, arguments) -> future of a shareable call in progress
+        self._call_errors = threading.local()
+        self.stats = {'connections': 0, 'requests': 0, 'calls': 0, 'shared_calls': 0}
+        db.error_handler = self._collect_error
+
+    # --- Database Calls (worker threads) ---
+    def _collect_error(self, title, message):
+        # Errors reported by DatabaseManager go back to the desk with the call's reply
+        errors = getattr(self._call_errors, 'errors', None)
+        if errors is None:
+            print(f"{title}: {message}", file=sys.stderr)
+        else:
+            errors.append([title, message])
+
+    def _method(self, method):
+        return getattr(self, method) if method == 'bulk_insert_batch' else getattr(self.db, method)
+
+    def _run(self, method, args, kwargs):
+        self._call_errors.errors = []
+        try:
+            result = self._method(method)(*args, **kwargs)
+            return result, self._call_errors.errors
+        finally:
+            self._call_errors.errors = None
+
+    def bulk_insert_batch(self, table, columns, rows):
+        """One batch of a desk's bulk import; rows are [line_no, values] pairs."""
+        allowed = {spec[0]: spec[1] for spec in bulk_import.IMPORTERS.values()}
+        if table not in allowed or tuple(columns) != allowed[table]:
+            raise RequestError(400, f"Bulk import into {table} ({', '.join(columns)}) is not allowed")
+        rejected = []
+        inserted = self.db.bulk_insert(
+            table, columns, ((line_no, tuple(values)) for line_no, values in rows),
+            on_rejected=lambda line_no, values, error: rejected.append([line_no, list(values), error])
+        )
+        return {'inserted': inserted, 'rejected': rejected}
+
+    # --- Dispatch ---
+    async def call(self, session, method, args, kwargs):
+        if not isinstance(method, str) or method not in METHODS:
+            raise RequestError(404, f"Unknown method '{method}'")
+        roles, shareable = METHODS[method]
+        if roles and session['user']['role'] not in roles:
+            raise RequestError(403, f"'{method}' requires the {' or '.join(roles)} role")
+        if not isinstance(args, list) or not isinstance(kwargs, dict):
+            raise RequestError(400, "'args' must be a list and 'kwargs' an object")
+        # Checked here, so that a TypeError raised inside the method is a server error
+        try:
+            inspect.signature(self._method(method)).bind(*args, **kwargs)
+        except TypeError as err:
+            raise RequestError(400, f"Wrong arguments for '{method}': {err}")
+        self.stats['calls'] += 1
+        loop = asyncio.get_running_loop()
+        if not shareable:
+            future = loop.run_in_executor(self.executor, self._run, method, args, kwargs)
+        else:
+            key = (method, json.dumps([args, kwargs], sort_keys=True))
+            future = self._inflight.get(key)
+            if future is None:
+                future = loop.run_in_executor(self.executor, self._run, method, args, kwargs)
+                self._inflight[key] = future
+                future.add_done_callback(lambda _: self._inflight.pop(key, None))
+            else:
+                self.stats['shared_calls'] += 1
+            future = asyncio.shield(future)
+        result, errors = await future
+        return {'result': result, 'errors': errors}
+
+    def _session(self, headers):
+        token = headers.get('authorization', '').removeprefix('Bearer ').strip()
+        session = self.sessions.get(token)
+        now = time.monotonic()
+        if session is None or now - session['last_seen'] > SESSION_IDLE_TIMEOUT:
+            self.sessions.pop(token, None)
+            raise RequestError(401, "Not signed in")
+        session['last_seen'] = now
+        return session
+
+    async def dispatch(self, method, path, headers, body):
+        """Handles one request. Returns (status, payload)."""
+        self.stats['requests'] += 1
+        try:
+            if path == '/health':
+                return 200, {'status': 'ok', 'database': str(self.db.backend), 'sessions': len(self.sessions),
+                             **self.stats}
+            if method != 'POST':
+                raise RequestError(405, "Use POST for /api requests")
+            try:
+                request = decode(body) if body else {}
+            except ValueError:
+                raise RequestError(400, "Request body is not valid JSON")
+            if not isinstance(request, dict):
+                raise RequestError(400, "Request body must be a JSON object")
+
+            if path == '/api/login':
+                return 200, await self.login(request.get('username', ''), request.get('password', ''))
+            session = self._session(headers)
+            if path == '/api/logout':
+                self.sessions.pop(headers['authorization'].removeprefix('Bearer ').strip(), None)
+                return 200, {}
+            if path.startswith('/api/call/'):
+                return 200, await self.call(session, path[len('/api/call/'):],
+                                            request.get('args', []), request.get('kwargs', {}))
+            if path == '/api/batch':
+                calls = request.get('calls')
+                if not isinstance(calls, list) or len(calls) > MAX_BATCH_CALLS:
+                    raise RequestError(400, f"'calls' must be a list of at most {MAX_BATCH_CALLS} calls")
+                outcomes = await asyncio.gather(*(
+                    self.call(session, call.get('method'), call.get('args', []), call.get('kwargs', {}))
+                    for call in calls
+                ), return_exceptions=True)
+                return 200, {'results': [self._batch_outcome(method, path, outcome) for outcome in outcomes]}
+            raise RequestError(404, f"No such endpoint: {path}")
+        except RequestError as err:
+            return err.status, {'error': str(err)}
+        except Exception as err:
+            print(f"Unhandled error for {method} {path}: {err!r}", file=sys.stderr)
+            return 500, {'error': "Internal server error"}
+
+    @staticmethod
+    def _batch_outcome(method, path, outcome):
+        # Like a single call: only request errors are described to the desk
+        if isinstance(outcome, RequestError):
+            return {'error': str(outcome)}
+        if isinstance(outcome, Exception):
+            print(f"Unhandled error for {method} {path}: {outcome!r}", file=sys.stderr)
+            return {'error': "Internal server error"}
+        return outcome
+
+    async def login(self, username, password):
+        loop = asyncio.get_running_loop()
+        user, _ = await loop.run_in_executor(self.executor, self._run, 'verify_user', [username, password], {})
+        if not user:
+            raise RequestError(401, "Invalid username or password")
+        user = {key: value for key, value in user.items() if key != 'password_hash'}
+        token = secrets.token_urlsafe(32)
+        now = time.monotonic()
+        # Desks that never sign out leave their sessions behind; drop the expired ones
+        for stale in [key for key, session in self.sessions.items()
+                      if now - session['last_seen'] > SESSION_IDLE_TIMEOUT]:
+            del self.sessions[stale]
+        self.sessions[token] = {'user': user, 'last_seen': now}
+        return {'token': token, 'user': user}
+
+    # --- HTTP ---
+    async def handle_connection(self, reader, writer):
+        """Serves HTTP/1.1 requests on one client connection until it closes or idles out."""
+        self.stats['connections'] += 1
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line.strip():
+                    break
+                try:
+                    method, path, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._respond(writer, 400, {'error': "Malformed request line"}, keep_alive=False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length') or 0)
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {'error': "Request body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+                status, payload = await self.dispatch(method, path.split('?', 1)[0], headers, body)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive):
+        data = encode(payload)
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + data)
+        await writer.drain()
+
+    async def serve(self, host=API_HOST, port=API_PORT, ready=None):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Serving the library API on http://{host}:{port} ({self.db.backend})", flush=True)
+        if ready:
+            ready()
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.db.disconnect()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve the library database to GUI desks over HTTP/JSON.")
+    parser.add_argument('--host', default=API_HOST)
+    parser.add_argument('--port', type=int, default=API_PORT)
+    parser.add_argument('--backend', choices=['mysql', 'sqlite'], default=DB_BACKEND)
+    parser.add_argument('--sqlite-path', default=SQLITE_PATH)
+    parser.add_argument('--pool-size', type=int, default=POOL_SIZE, help="database connections shared by all desks")
+    args = parser.parse_args()
+
+    db = DatabaseManager(get_backend(args.backend, DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, args.sqlite_path),
+                         pool_size=args.pool_size)
+    db.error_handler = lambda title, message: print(f"{title}: {message}", file=sys.stderr)
+    if not db.connect():
+        sys.exit("Cannot connect to the database.")
+    server = CirculationServer(db, workers=db.pool.size)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("Shutting down.")
+    finally:
+        server.close()
@@ -0,0 +1,262 @@
+# benchmark.py
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from library_db import DatabaseManager, DB_HOST, DB_USER, DB_PASSWORD, DB_NAME
+from db_backends import get_backend
+from generate_dataset import WORDS, FIRST_NAMES, LAST_NAMES
+from models import Book, Member, Loan
+import db_setup_advanced
+import generate_dataset
+
+# --- Benchmark Configuration ---
+# Data scales, named by the number of loan records (issued_books rows)
+SCALES = {'10k': 10_000, '1m': 1_000_000, '10m': 10_000_000}
+BOOKS_PER_LOAN = 0.1         # Catalog size relative to the loan history
+MEMBERS_PER_LOAN = 0.05
+DEFAULT_ITERATIONS = 200
+DEFAULT_THRESHOLD = 0.20     # A p95 more than 20% above the baseline is a regression
+RANDOM_SEED = 42
+MEMORY_ROWS = 100_000        # Rows per table loaded by the --memory comparison
+
+# table -> (query, row model) for the --memory comparison
+MEMORY_QUERIES = {
+    'books': ("SELECT book_id, title, author, genre, status, total_copies, available_copies FROM books "
+              "ORDER BY book_id LIMIT %s", Book),
+    'members': ("SELECT member_id, name, email, phone FROM members ORDER BY member_id LIMIT %s", Member),
+    'issued_books': ("SELECT issue_id, book_id, copy_id, member_id, issue_date, due_date, return_date FROM issued_books "
+                     "ORDER BY issue_id LIMIT %s", Loan),
+}
+
+
+# --- Seeding ---
+def catalog_size(loans):
+    return max(int(loans * BOOKS_PER_LOAN), 1000), max(int(loans * MEMBERS_PER_LOAN), 500)
+
+def seed(backend, backend_config, loans, processes=1):
+    """Creates the schema and fills it with a synthetic catalog and loan history (see generate_dataset)."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        db_setup_advanced.create_database(backend)
+    books, members = catalog_size(loans)
+    print(f"Seeding {books} books, {members} members and {loans} loans...", flush=True)
+    generate_dataset.generate(backend, backend_config, books=books, members=members, loans=loans,
+                              seed=RANDOM_SEED, processes=processes, progress=lambda message: None)
+
+def book_count(backend):
+    """Catalog size of an existing benchmark database, or None if there is none.
+    (The loan count is not used: every benchmark run adds loan records.)"""
+    try:
+        conn = backend.connect()
+    except backend.Error:
+        return None
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT COUNT(*) FROM books")
+        return cursor.fetchone()[0]
+    except backend.Error:
+        return None
+    finally:
+        cursor.close()
+        conn.close()
+
+
+# --- Measurement ---
+def percentile(sorted_values, fraction):
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+def measure(operation, iterations, errors):
+    """Calls operation(i) iterations times; returns latency percentiles (ms) and throughput."""
+    errors.clear()
+    latencies = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        began = time.perf_counter()
+        operation(i)
+        latencies.append(time.perf_counter() - began)
+    total = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'iterations': iterations,
+        'mean_ms': round(sum(latencies) / iterations * 1000, 3),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3),
+        'ops_per_sec': round(iterations / total, 1) if total else None,
+        'errors': len(errors),
+    }
+
+def run_benchmarks(db, iterations, rng):
+    """Times the DatabaseManager operations the GUI relies on."""
+    errors = []
+    db.error_handler = lambda title, message: errors.append(message)
+    available = [row['book_id'] for row in db.execute_query(
+        "SELECT book_id FROM books WHERE status = 'Available' LIMIT %s", (iterations * 10,), fetch='all')]
+    member_id = db.execute_query("SELECT MIN(member_id) AS member_id FROM members", fetch='one')['member_id']
+    terms = [rng.choice(WORDS)[:rng.randint(3, 6)] for _ in range(iterations)]
+    names = [rng.choice(FIRST_NAMES + LAST_NAMES)[:rng.randint(3, 6)] for _ in range(iterations)]
+    batches = [available[i * 10:(i + 1) * 10] for i in range(len(available) // 10)]
+
+    operations = {
+        'search_books_title': lambda i: db.search_books(title=terms[i]),
+        'search_books_author': lambda i: db.search_books(author=names[i]),
+        'search_members': lambda i: db.search_members(name=names[i]),
+        'page_books': lambda i: db.page_books(),
+        'page_books_filtered': lambda i: db.page_books(title=terms[i], status='Available'),
+        'get_dashboard_stats': lambda i: db.get_dashboard_stats(),
+        'get_settings': lambda i: db.get_settings(),
+        'issue_book': lambda i: db.issue_book(available[i], member_id),
+        'return_book': lambda i: db.return_book(available[i]),
+        'issue_books_10': lambda i: db.issue_books(batches[i], member_id),
+        'return_books_10': lambda i: db.return_books(batches[i]),
+        'refresh_overdue_count': lambda i: db.refresh_overdue_count(),
+    }
+    # Each issue is undone by the matching return, so the data stays the same between runs
+    limits = {'issue_book': len(available), 'return_book': len(available),
+              'issue_books_10': len(batches), 'return_books_10': len(batches)}
+    results = {}
+    for name, operation in operations.items():
+        runs = min(iterations, limits.get(name, iterations))
+        if runs == 0:
+            continue
+        results[name] = measure(operation, runs, errors)
+        print(f"  {name:<24} p50 {results[name]['p50_ms']:>9.3f} ms   p95 {results[name]['p95_ms']:>9.3f} ms   "
+              f"{results[name]['ops_per_sec']:>9} ops/s", flush=True)
+    return results
+
+
+def allocated(load):
+    """Returns (result of load(), bytes it still holds) as measured by tracemalloc."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = load()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, held
+
+def compare_row_memory(db, limit=MEMORY_ROWS):
+    """Memory held by the same rows loaded as dicts (dictionary cursor), row models and plain tuples."""
+    results = {}
+    for table, (query, model) in MEMORY_QUERIES.items():
+        loaders = {
+            'dict': lambda: db.execute_query(query, (limit,), fetch='all'),
+            'record': lambda: db.execute_query(query, (limit,), fetch='all', model=model),
+            'tuple': lambda: [row for chunk in db.stream_query(query, (limit,)) for row in chunk],
+        }
+        sizes = {}
+        for name, load in loaders.items():
+            load()  # Warm-up, so statement caches and the like aren't counted
+            rows, held = allocated(load)
+            sizes[name] = held
+            count = len(rows)
+            del rows
+        if not count:
+            continue
+        results[table] = {
+            'rows': count,
+            **{f"{name}_bytes_per_row": round(held / count, 1) for name, held in sizes.items()},
+            'dict_to_record_ratio': round(sizes['dict'] / sizes['record'], 2),
+        }
+        print(f"  {table:<14} {count:>8} rows   dict {results[table]['dict_bytes_per_row']:>7} B/row   "
+              f"{model.__name__} {results[table]['record_bytes_per_row']:>7} B/row   "
+              f"tuple {results[table]['tuple_bytes_per_row']:>7} B/row   "
+              f"({results[table]['dict_to_record_ratio']}x smaller as records)", flush=True)
+    return results
+
+
+# --- Baseline Comparison ---
+def compare(results, baseline, threshold):
+    """Returns a list of (operation, baseline p95, current p95) for operations that slowed down."""
+    regressions = []
+    for name, current in results['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if previous and current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+            regressions.append((name, previous['p95_ms'], current['p95_ms']))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark DatabaseManager operations (no GUI needed).")
+    parser.add_argument('--scale', choices=list(SCALES), default='10k', help="loan records to seed")
+    parser.add_argument('--backend', choices=['sqlite', 'mysql'], default='sqlite')
+    parser.add_argument('--sqlite-path', default=None, help="benchmark database file (default: bench_<scale>.db)")
+    parser.add_argument('--mysql-db', default=DB_NAME + '_bench', help="MySQL database for the benchmark data")
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument('--output', default=None, help="results file (default: bench_<backend>_<scale>.json)")
+    parser.add_argument('--baseline', default=None, help="compare against this results file")
+    parser.add_argument('--save-baseline', action='store_true', help="write the results to --baseline instead")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help="allowed p95 slowdown (0.2 = 20%%)")
+    parser.add_argument('--reseed', action='store_true', help="rebuild the SQLite benchmark database")
+    parser.add_argument('--processes', type=int, default=1, help="worker processes used to generate the data")
+    parser.add_argument('--memory', action='store_true',
+                        help="also compare the memory held by rows as dicts, row models and tuples")
+    args = parser.parse_args()
+
+    if args.backend == 'mysql' and args.mysql_db == DB_NAME:
+        sys.exit("Refusing to seed benchmark data into the live library database.")
+    loans = SCALES[args.scale]
+    sqlite_path = args.sqlite_path or f"bench_{args.scale}.db"
+    if args.backend == 'sqlite' and args.reseed:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(sqlite_path + suffix):
+                os.remove(sqlite_path + suffix)
+    config = (args.backend, DB_HOST, DB_USER, DB_PASSWORD, args.mysql_db, sqlite_path)
+    backend = get_backend(*config)
+    rng = random.Random(RANDOM_SEED)
+
+    existing = book_count(backend)
+    if not existing:
+        start = time.perf_counter()
+        seed(backend, config, loans, args.processes)
+        print(f"Seeded in {time.perf_counter() - start:.1f}s.")
+    elif existing != catalog_size(loans)[0]:
+        sys.exit(f"Benchmark database was not seeded at the {args.scale} scale; "
+                 f"use --reseed (SQLite) or drop '{args.mysql_db}' (MySQL).")
+
+    db = DatabaseManager(backend)
+    db.verify_stats(repair=True)  # Seeding bypasses the counters
+    print(f"Benchmarking {backend} at {args.scale} loans ({args.iterations} iterations per operation):")
+    results = {
+        'meta': {
+            'backend': args.backend,
+            'scale': args.scale,
+            'loans': loans,
+            'iterations': args.iterations,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+        },
+        'results': run_benchmarks(db, args.iterations, rng),
+    }
+    if args.memory:
+        print(f"Memory held by {MEMORY_ROWS} rows per table:")
+        results['memory'] = compare_row_memory(db)
+    db.disconnect()
+
+    output = args.output or f"bench_{args.backend}_{args.scale}.json"
+    if args.save_baseline and args.baseline:
+        output = args.baseline
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}.")
+
+    if args.baseline and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: p95 {before:.3f} ms -> {after:.3f} ms")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} of the baseline.")
@@ -0,0 +1,106 @@
+# bulk_export.py
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import date
+
+# --- Bulk Export ---
+# Writes books, members or loan records to a CSV file (with a header row) or a
+# JSON Lines file. Rows are streamed from the database in chunks (see
+# DatabaseManager.stream_query), so memory use stays flat for tables of any
+# size. The file is written under a temporary name and only renamed into place
+# once the export has finished.
+
+# kind -> (columns, DatabaseManager streaming method)
+EXPORTERS = {
+    'books': (('book_id', 'title', 'author', 'genre', 'status', 'total_copies', 'available_copies'), 'stream_books'),
+    'members': (('member_id', 'name', 'email', 'phone'), 'stream_members'),
+    'loans': (('issue_id', 'book_id', 'copy_id', 'member_id', 'issue_date', 'due_date', 'return_date'),
+              'stream_loans'),
+}
+
+
+def _jsonl_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__} as JSON")
+
+
+def export_file(db, kind, path, progress=None, **filters):
+    """
+    Exports books, members or loans to a CSV or JSON Lines (.jsonl) file.
+    :param filters: Passed to the streaming method, e.g. title/author/status for books.
+    :param progress: Optional callable(rows_written), called after each chunk.
+    :return: A summary dict (written, seconds, rows_per_second, path).
+    :raises: The database error if the query fails part way; no file is left behind.
+    """
+    columns, method = EXPORTERS[kind]
+    jsonl = path.lower().endswith(('.jsonl', '.ndjson'))
+    partial_path = path + '.part'
+    written = 0
+    start = time.perf_counter()
+    try:
+        with open(partial_path, 'w', newline='', encoding='utf-8') as f:
+            if not jsonl:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+            for rows in getattr(db, method)(**filters):
+                if jsonl:
+                    f.writelines(json.dumps(dict(zip(columns, row)), default=_jsonl_default, ensure_ascii=False) + '\n'
+                                 for row in rows)
+                else:
+                    writer.writerows(rows)
+                written += len(rows)
+                if progress:
+                    progress(written)
+        os.replace(partial_path, path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    seconds = time.perf_counter() - start
+    return {
+        'written': written,
+        'seconds': round(seconds, 2),
+        'rows_per_second': round(written / seconds) if seconds else written,
+        'path': path,
+    }
+
+
+if __name__ == '__main__':
+    from library_db import DatabaseManager, DB_BACKEND, DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, SQLITE_PATH
+    from db_backends import get_backend
+
+    parser = argparse.ArgumentParser(description="Export books, members or loan records to CSV or JSON Lines.")
+    parser.add_argument('kind', choices=sorted(EXPORTERS))
+    parser.add_argument('path', help="output file; a .jsonl name writes JSON Lines, anything else CSV")
+    parser.add_argument('--title', default="", help="books: title words")
+    parser.add_argument('--author', default="", help="books: author words")
+    parser.add_argument('--status', default="", choices=["", "Available", "Issued"], help="books: status")
+    parser.add_argument('--name', default="", help="members: name words")
+    parser.add_argument('--email', default="", help="members: email words")
+    parser.add_argument('--open-only', action='store_true', help="loans: only books still on loan")
+    parser.add_argument('--backend', choices=['mysql', 'sqlite'], default=DB_BACKEND)
+    parser.add_argument('--sqlite-path', default=SQLITE_PATH)
+    args = parser.parse_args()
+
+    filters = {
+        'books': {'title': args.title, 'author': args.author, 'status': args.status},
+        'members': {'name': args.name, 'email': args.email},
+        'loans': {'open_only': args.open_only},
+    }[args.kind]
+    db = DatabaseManager(get_backend(args.backend, DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, args.sqlite_path))
+    db.error_handler = lambda title, message: print(f"{title}: {message}", file=sys.stderr)
+    try:
+        summary = export_file(db, args.kind, args.path, **filters)
+    except Exception as err:
+        sys.exit(f"Export failed: {err}")
+    finally:
+        db.disconnect()
+    print(f"Exported {summary['written']} {args.kind} to {summary['path']} in {summary['seconds']}s "
+          f"({summary['rows_per_second']} rows/s).")
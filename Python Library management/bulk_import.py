@@ -0,0 +1,157 @@
+# bulk_import.py
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+# --- Bulk Catalog Import ---
+# Streams books or members from a CSV file (with a header row) or a JSON Lines
+# file into the database. Records are read, validated and inserted in batches
+# through a generator pipeline, so memory use stays flat for files of any size.
+# Rows that fail validation or are refused by the database are written to
+# "<file>.rejected.csv" together with the reason.
+
+def read_records(path):
+    """Yields (line_no, record, error) for each record; record is a dict, error a message or None."""
+    if path.lower().endswith(('.jsonl', '.ndjson')):
+        with open(path, encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as err:
+                    yield line_no, {'raw': line.rstrip('\n')}, f"Invalid JSON: {err}"
+                    continue
+                if isinstance(record, dict):
+                    yield line_no, record, None
+                else:
+                    yield line_no, {'raw': line.rstrip('\n')}, "Expected a JSON object"
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            for record in reader:
+                yield reader.line_num, record, None
+
+
+def _field(record, name, max_length, required=False):
+    value = record.get(name)
+    value = str(value).strip() if value is not None else ''
+    if required and not value:
+        raise ValueError(f"'{name}' is required")
+    if len(value) > max_length:
+        raise ValueError(f"'{name}' is longer than {max_length} characters")
+    return value or None
+
+def validate_book(record):
+    return (
+        _field(record, 'title', 255, required=True),
+        _field(record, 'author', 255, required=True),
+        _field(record, 'genre', 100),
+    )
+
+def validate_member(record):
+    email = _field(record, 'email', 255, required=True)
+    if '@' not in email:
+        raise ValueError(f"'{email}' is not a valid email address")
+    return (
+        _field(record, 'name', 255, required=True),
+        email,
+        _field(record, 'phone', 20),
+    )
+
+
+# kind -> (table, columns, validator)
+IMPORTERS = {
+    'books': ('books', ('title', 'author', 'genre'), validate_book),
+    'members': ('members', ('name', 'email', 'phone'), validate_member),
+}
+
+
+def import_file(db, kind, path, batch_size=None, commit_every=None, progress=None):
+    """
+    Imports a CSV/JSON Lines file of books or members through db.bulk_insert().
+    :param kind: 'books' or 'members'.
+    :param progress: Optional callable(rows_read, rows_committed, rows_rejected), called after each commit.
+    :return: A summary dict (read, inserted, rejected, seconds, rows_per_second, rejects_file).
+    """
+    table, columns, validate = IMPORTERS[kind]
+    options = {}
+    if batch_size:
+        options['batch_size'] = batch_size
+    if commit_every:
+        options['commit_every'] = commit_every
+
+    counts = {'read': 0, 'rejected': 0}
+    rejects_path = path + '.rejected.csv'
+    start = time.perf_counter()
+    with open(rejects_path, 'w', newline='', encoding='utf-8') as rejects_file:
+        rejects = csv.writer(rejects_file)
+        rejects.writerow(['line', 'error', 'record'])
+
+        def reject(line_no, record, error):
+            counts['rejected'] += 1
+            rejects.writerow([line_no, error, json.dumps(record, ensure_ascii=False)])
+
+        def valid_rows():
+            for line_no, record, error in read_records(path):
+                counts['read'] += 1
+                if error is None:
+                    try:
+                        yield line_no, validate(record)
+                        continue
+                    except ValueError as err:
+                        error = str(err)
+                reject(line_no, record, error)
+
+        inserted = db.bulk_insert(
+            table, columns, valid_rows(),
+            on_rejected=lambda line_no, values, error: reject(line_no, dict(zip(columns, values)), error),
+            on_progress=lambda committed: progress and progress(counts['read'], committed, counts['rejected']),
+            **options
+        )
+    if counts['rejected'] == 0:
+        os.remove(rejects_path)
+        rejects_path = None
+
+    seconds = time.perf_counter() - start
+    return {
+        'read': counts['read'],
+        'inserted': inserted,
+        'rejected': counts['rejected'],
+        'seconds': round(seconds, 2),
+        'rows_per_second': round(inserted / seconds) if seconds else inserted,
+        'rejects_file': rejects_path,
+    }
+
+
+if __name__ == '__main__':
+    from library_db import (
+        DatabaseManager, DB_BACKEND, DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, SQLITE_PATH,
+        IMPORT_BATCH_SIZE, IMPORT_COMMIT_EVERY
+    )
+    from db_backends import get_backend
+
+    parser = argparse.ArgumentParser(description="Bulk import books or members from CSV or JSON Lines.")
+    parser.add_argument('kind', choices=sorted(IMPORTERS))
+    parser.add_argument('path', help="CSV file with a header row, or a .jsonl file")
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help="rows per executemany batch")
+    parser.add_argument('--commit-every', type=int, default=IMPORT_COMMIT_EVERY, help="rows per transaction")
+    parser.add_argument('--backend', choices=['mysql', 'sqlite'], default=DB_BACKEND)
+    parser.add_argument('--sqlite-path', default=SQLITE_PATH)
+    args = parser.parse_args()
+
+    db = DatabaseManager(get_backend(args.backend, DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, args.sqlite_path))
+    db.error_handler = lambda title, message: print(f"{title}: {message}", file=sys.stderr)
+    summary = import_file(
+        db, args.kind, args.path, args.batch_size, args.commit_every,
+        progress=lambda read, committed, rejected: print(f"  {read} read, {committed} committed, {rejected} rejected")
+    )
+    print(f"Imported {summary['inserted']} of {summary['read']} {args.kind} in {summary['seconds']}s "
+          f"({summary['rows_per_second']} rows/s).")
+    if summary['rejects_file']:
+        print(f"{summary['rejected']} rejected rows were written to {summary['rejects_file']}")
+    db.disconnect()
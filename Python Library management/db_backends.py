@@ -0,0 +1,241 @@
+# db_backends.py
+
+import re
+import sqlite3
+import uuid
+from datetime import date
+
+# --- Storage Backends ---
+# The library code is written against the MySQL dialect and the
+# mysql.connector connection API. Each backend opens connections that behave
+# like mysql.connector ones, so DatabaseManager and create_database() work the
+# same on a MySQL server or on an embedded SQLite file.
+
+# SQLite stores DATE columns as ISO strings; convert them to/from date objects
+# so fine calculations see the same types as with MySQL.
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+
+
+class MySQLBackend:
+    """Connects to a MySQL server through mysql.connector."""
+
+    name = 'mysql'
+    max_connections = None  # No backend-imposed limit on the pool size
+    lock_clause = " FOR UPDATE"  # Locking read: waits for, then locks, the latest committed rows
+    explain_prefix = "EXPLAIN "
+    streams_must_be_drained = True  # Unread rows of an unbuffered cursor block its connection
+
+    def __init__(self, host, user, password, db_name, lock_wait_timeout=5):
+        # Imported here so SQLite-only installs don't need the MySQL driver
+        import mysql.connector
+        self.driver = mysql.connector
+        self.Error = mysql.connector.Error
+        self.host = host
+        self.user = user
+        self.password = password
+        self.db_name = db_name
+        self.lock_wait_timeout = lock_wait_timeout
+
+    def __str__(self):
+        return f"MySQL server at {self.host}"
+
+    def connect(self, use_database=True):
+        """Opens an autocommit connection (to the server only if use_database is False)."""
+        params = dict(host=self.host, user=self.user, password=self.password, autocommit=True)
+        if use_database:
+            params['database'] = self.db_name
+        conn = self.driver.connect(**params)
+        # Bound how long a statement waits for a row lock (the server default is 50s)
+        cursor = conn.cursor()
+        cursor.execute("SET SESSION innodb_lock_wait_timeout = %s", (self.lock_wait_timeout,))
+        cursor.close()
+        return conn
+
+    def create_database(self, cursor):
+        """Creates and selects the library database. Returns False on failure."""
+        from mysql.connector import errorcode
+        try:
+            cursor.execute(f"CREATE DATABASE {self.db_name} DEFAULT CHARACTER SET 'utf8'")
+            print(f"Database '{self.db_name}' created successfully.")
+        except self.Error as err:
+            if err.errno == errorcode.ER_DB_CREATE_EXISTS:
+                print(f"Database '{self.db_name}' already exists.")
+            else:
+                print(err)
+                return False
+
+        cursor.execute(f"USE {self.db_name}")
+        print(f"Using database '{self.db_name}'.")
+        return True
+
+    def translate_ddl(self, ddl):
+        return ddl
+
+    def is_table_exists_error(self, err):
+        from mysql.connector import errorcode
+        return err.errno == errorcode.ER_TABLE_EXISTS_ERROR
+
+    def is_retryable(self, err):
+        """True for errors after which the whole transaction can simply be run again."""
+        from mysql.connector import errorcode
+        return getattr(err, 'errno', None) in (errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT)
+
+
+class SQLiteBackend:
+    """Embedded SQLite database stored in a file, or in memory for ':memory:'."""
+
+    name = 'sqlite'
+    Error = sqlite3.Error
+    # Transactions start with BEGIN IMMEDIATE, which already holds the database
+    # write lock, so reads inside them need no row locks
+    lock_clause = ""
+    explain_prefix = "EXPLAIN QUERY PLAN "
+    streams_must_be_drained = False  # A cursor can be closed part way through its rows
+
+    def __init__(self, path=':memory:', timeout=10):
+        self.path = path
+        self.timeout = timeout
+        self.in_memory = path == ':memory:'
+        self._keeper = None
+        if self.in_memory:
+            # A named shared-cache database lives as long as one connection to
+            # it is open, so keep one around for the lifetime of the backend.
+            # Shared-cache locks don't honour the busy timeout, hence the pool
+            # is limited to a single connection.
+            self._uri = f"file:lms-{uuid.uuid4().hex}?mode=memory&cache=shared"
+            self.max_connections = 1
+            self._keeper = self._raw_connect()
+        else:
+            self._uri = None
+            self.max_connections = None
+
+    def __str__(self):
+        return "in-memory SQLite database" if self.in_memory else f"SQLite database '{self.path}'"
+
+    def _raw_connect(self):
+        if self.in_memory:
+            conn = sqlite3.connect(self._uri, uri=True, timeout=self.timeout,
+                                   detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.path, timeout=self.timeout,
+                                   detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+        # Autocommit mode; transactions are started explicitly (see start_transaction)
+        conn.isolation_level = None
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def connect(self, use_database=True):
+        return SQLiteConnection(self._raw_connect())
+
+    def create_database(self, cursor):
+        print(f"Using {self}.")
+        return True
+
+    def translate_ddl(self, ddl):
+        ddl = re.sub(r"INT AUTO_INCREMENT PRIMARY KEY", "INTEGER PRIMARY KEY AUTOINCREMENT", ddl)
+        return re.sub(r"\)\s*ENGINE=\w+\s*$", ")", ddl)
+
+    def is_table_exists_error(self, err):
+        return isinstance(err, sqlite3.OperationalError) and 'already exists' in str(err)
+
+    def is_retryable(self, err):
+        # "database is locked" once the busy timeout has run out
+        return isinstance(err, sqlite3.OperationalError) and 'locked' in str(err)
+
+
+def get_backend(kind, host=None, user=None, password=None, db_name=None, sqlite_path=':memory:'):
+    """Builds the backend named by kind ('mysql' or 'sqlite') from configuration values."""
+    if kind == 'sqlite':
+        return SQLiteBackend(sqlite_path)
+    if kind == 'mysql':
+        return MySQLBackend(host, user, password, db_name)
+    raise ValueError(f"Unknown database backend: {kind}")
+
+
+# --- SQLite Adapters ---
+# Thin wrappers giving sqlite3 objects the parts of the mysql.connector API the
+# application uses: '%s' placeholders, dictionary cursors, start_transaction()
+# and is_connected().
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class SQLiteCursor:
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        if dictionary:
+            self._cursor.row_factory = _dict_row
+
+    @staticmethod
+    def _sql(query):
+        return query.replace('%s', '?')
+
+    def execute(self, query, params=()):
+        self._cursor.execute(self._sql(query), params)
+
+    def executemany(self, query, seq_of_params):
+        self._cursor.executemany(self._sql(query), seq_of_params)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=None):
+        return self._cursor.fetchmany(size or self._cursor.arraysize)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+
+class SQLiteConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, dictionary=False, **kwargs):
+        return SQLiteCursor(self._conn.cursor(), dictionary=dictionary)
+
+    def start_transaction(self):
+        # IMMEDIATE takes the write lock up front, so concurrent writers wait
+        # on the busy timeout instead of failing with a lock-upgrade deadlock.
+        self._conn.execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        if self._conn.in_transaction:
+            self._conn.commit()
+
+    def rollback(self):
+        if self._conn.in_transaction:
+            self._conn.rollback()
+
+    def is_connected(self):
+        try:
+            self._conn.execute("SELECT 1")
+            return True
+        except sqlite3.ProgrammingError:
+            return False
+
+    def close(self):
+        # Lets SQLite refresh the planner statistics of tables whose size has
+        # changed a lot; without them it can pick a status index over the
+        # primary key for "book_id IN (...) AND status = ..." lookups
+        try:
+            self._conn.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass
+        self._conn.close()
@@ -1,8 +1,12 @@
 # db_setup_advanced.py
 
-import mysql.connector
-from mysql.connector import errorcode
 import hashlib
+from db_backends import get_backend
+from migrations import migrate
+
+# --- Storage Backend ---
+DB_BACKEND = 'mysql'  # 'mysql' or 'sqlite'
+SQLITE_PATH = 'library.db'
 
 # --- Your MySQL Connection Details ---
 DB_HOST = 'localhost'
@@ -14,98 +18,99 @@ def hash_password(password):
     """Hashes the password using SHA-256."""
     return hashlib.sha256(password.encode()).hexdigest()
 
-def create_database():
+# --- Table Definitions ---
+# Written in MySQL syntax; other backends translate them via translate_ddl().
+# These are the tables as first released. Every later schema change (indexes,
+# counters, the change log, the loan archive, the split of books into titles
+# and copies) is a step in migrations.py, which create_database() applies to a
+# new database as well, so new and upgraded databases end up the same.
+TABLES = {}
+
+TABLES['users'] = (
+    "CREATE TABLE `users` ("
+    "  `user_id` INT AUTO_INCREMENT PRIMARY KEY,"
+    "  `username` VARCHAR(50) NOT NULL UNIQUE,"
+    "  `password_hash` VARCHAR(256) NOT NULL,"
+    "  `role` VARCHAR(20) NOT NULL DEFAULT 'librarian'"
+    ") ENGINE=InnoDB"
+)
+
+TABLES['members'] = (
+    "CREATE TABLE `members` ("
+    "  `member_id` INT AUTO_INCREMENT PRIMARY KEY,"
+    "  `name` VARCHAR(255) NOT NULL,"
+    "  `email` VARCHAR(255) UNIQUE,"
+    "  `phone` VARCHAR(20)"
+    ") ENGINE=InnoDB"
+)
+
+TABLES['books'] = (
+    "CREATE TABLE `books` ("
+    "  `book_id` INT AUTO_INCREMENT PRIMARY KEY,"
+    "  `title` VARCHAR(255) NOT NULL,"
+    "  `author` VARCHAR(255) NOT NULL,"
+    "  `genre` VARCHAR(100),"
+    "  `status` VARCHAR(20) NOT NULL DEFAULT 'Available'"
+    ") ENGINE=InnoDB"
+)
+
+TABLES['issued_books'] = (
+    "CREATE TABLE `issued_books` ("
+    "  `issue_id` INT AUTO_INCREMENT PRIMARY KEY,"
+    "  `book_id` INT NOT NULL,"
+    "  `member_id` INT NOT NULL,"
+    "  `issue_date` DATE NOT NULL,"
+    "  `due_date` DATE NOT NULL,"
+    "  `return_date` DATE,"
+    "  FOREIGN KEY (`book_id`) REFERENCES `books`(`book_id`) ON DELETE CASCADE,"
+    "  FOREIGN KEY (`member_id`) REFERENCES `members`(`member_id`) ON DELETE CASCADE"
+    ") ENGINE=InnoDB"
+)
+
+TABLES['settings'] = (
+    "CREATE TABLE `settings` ("
+    "  `setting_key` VARCHAR(50) PRIMARY KEY,"
+    "  `setting_value` VARCHAR(255) NOT NULL"
+    ") ENGINE=InnoDB"
+)
+
+def create_tables(cursor, backend):
+    """Creates any missing tables on the given backend."""
+    for table_name, table_description in TABLES.items():
+        try:
+            print(f"Creating table '{table_name}': ", end='')
+            cursor.execute(backend.translate_ddl(table_description))
+            print("OK")
+        except backend.Error as err:
+            if backend.is_table_exists_error(err):
+                print("already exists.")
+            else:
+                print(err)
+
+def create_database(backend=None):
     """Creates the database and all necessary tables for the advanced system."""
+    if backend is None:
+        backend = get_backend(DB_BACKEND, DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, SQLITE_PATH)
     try:
-        # Connect to MySQL Server
-        db = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
+        # Connect to the database server (or open the SQLite file)
+        db = backend.connect(use_database=False)
         cursor = db.cursor()
-        print("Successfully connected to MySQL server.")
+        print(f"Successfully connected to {backend}.")
 
         # Create the database
-        try:
-            cursor.execute(f"CREATE DATABASE {DB_NAME} DEFAULT CHARACTER SET 'utf8'")
-            print(f"Database '{DB_NAME}' created successfully.")
-        except mysql.connector.Error as err:
-            if err.errno == errorcode.ER_DB_CREATE_EXISTS:
-                print(f"Database '{DB_NAME}' already exists.")
-            else:
-                print(err)
-                return
-
-        cursor.execute(f"USE {DB_NAME}")
-        print(f"Using database '{DB_NAME}'.")
-
-        # --- Table Definitions ---
-        TABLES = {}
-
-        TABLES['users'] = (
-            "CREATE TABLE `users` ("
-            "  `user_id` INT AUTO_INCREMENT PRIMARY KEY,"
-            "  `username` VARCHAR(50) NOT NULL UNIQUE,"
-            "  `password_hash` VARCHAR(256) NOT NULL,"
-            "  `role` VARCHAR(20) NOT NULL DEFAULT 'librarian'"
-            ") ENGINE=InnoDB"
-        )
-
-        TABLES['members'] = (
-            "CREATE TABLE `members` ("
-            "  `member_id` INT AUTO_INCREMENT PRIMARY KEY,"
-            "  `name` VARCHAR(255) NOT NULL,"
-            "  `email` VARCHAR(255) UNIQUE,"
-            "  `phone` VARCHAR(20)"
-            ") ENGINE=InnoDB"
-        )
-
-        TABLES['books'] = (
-            "CREATE TABLE `books` ("
-            "  `book_id` INT AUTO_INCREMENT PRIMARY KEY,"
-            "  `title` VARCHAR(255) NOT NULL,"
-            "  `author` VARCHAR(255) NOT NULL,"
-            "  `genre` VARCHAR(100),"
-            "  `status` VARCHAR(20) NOT NULL DEFAULT 'Available'"
-            ") ENGINE=InnoDB"
-        )
-
-        TABLES['issued_books'] = (
-            "CREATE TABLE `issued_books` ("
-            "  `issue_id` INT AUTO_INCREMENT PRIMARY KEY,"
-            "  `book_id` INT NOT NULL,"
-            "  `member_id` INT NOT NULL,"
-            "  `issue_date` DATE NOT NULL,"
-            "  `due_date` DATE NOT NULL,"
-            "  `return_date` DATE,"
-            "  FOREIGN KEY (`book_id`) REFERENCES `books`(`book_id`) ON DELETE CASCADE,"
-            "  FOREIGN KEY (`member_id`) REFERENCES `members`(`member_id`) ON DELETE CASCADE"
-            ") ENGINE=InnoDB"
-        )
-        
-        TABLES['settings'] = (
-            "CREATE TABLE `settings` ("
-            "  `setting_key` VARCHAR(50) PRIMARY KEY,"
-            "  `setting_value` VARCHAR(255) NOT NULL"
-            ") ENGINE=InnoDB"
-        )
+        if not backend.create_database(cursor):
+            return
 
         # --- Create Tables ---
-        for table_name, table_description in TABLES.items():
-            try:
-                print(f"Creating table '{table_name}': ", end='')
-                cursor.execute(table_description)
-                print("OK")
-            except mysql.connector.Error as err:
-                if err.errno == errorcode.ER_TABLE_EXISTS_ERROR:
-                    print("already exists.")
-                else:
-                    print(err.msg)
+        create_tables(cursor, backend)
+
+        # --- Apply Schema Migrations (indexes etc.) ---
+        migrate(cursor, backend)
         
         # --- Insert Default Data ---
         print("Inserting default data...")
         try:
+            db.start_transaction()
             # Add a default admin user (password: admin)
             admin_pass = hash_password('admin')
             cursor.execute(
@@ -125,7 +130,7 @@ def create_database():
             
             db.commit()
             print("Default admin/librarian users and settings added.")
-        except mysql.connector.Error as err:
+        except backend.Error as err:
             print(f"Error inserting default data: {err}")
             db.rollback()
 
@@ -134,13 +139,13 @@ def create_database():
         print("  - Username: admin, Password: admin")
         print("  - Username: librarian, Password: librarian")
 
-    except mysql.connector.Error as err:
+    except backend.Error as err:
         print(f"Database connection error: {err}")
     finally:
         if 'db' in locals() and db.is_connected():
             cursor.close()
             db.close()
-            print("MySQL connection closed.")
+            print("Database connection closed.")
 
 if __name__ == '__main__':
     create_database()
@@ -0,0 +1,217 @@
+# fine_report.py
+
+import argparse
+import csv
+import sys
+import time
+from datetime import date
+
+import numpy as np
+
+# --- Outstanding Fines Report ---
+# Fines are normally only worked out one loan at a time, when a book is
+# returned. This report works out what every overdue loan that is still open
+# would owe if returned on a given day (the same rule as return_books: days
+# overdue x fine_per_day). Loans are streamed in chunks (DatabaseManager.
+# scan_overdue_loans) and each chunk is handled with NumPy array arithmetic.
+# The per-member totals live in arrays indexed by member_id, so memory use
+# depends on the number of members and the chunk size, not on the number of
+# loans.
+
+# Upper bounds (days overdue) of the ageing buckets; a final bucket holds the rest
+AGEING_BUCKETS = (7, 30, 90, 365)
+MEMBER_LOOKUP_BATCH = 1000   # Member ids per name lookup query
+
+
+class FineLedger:
+    """Running per-member totals of overdue loans, days overdue and accrued fines."""
+
+    def __init__(self, as_of, fine_per_day):
+        self.as_of = as_of
+        self.fine_per_day = fine_per_day
+        self._as_of_ordinal = as_of.toordinal()
+        self.loans = np.zeros(0, dtype=np.int64)   # Indexed by member_id
+        self.days = np.zeros(0, dtype=np.int64)
+        self.fines = np.zeros(0, dtype=np.float64)
+        self.ageing_loans = np.zeros(len(AGEING_BUCKETS) + 1, dtype=np.int64)
+        self.ageing_fines = np.zeros(len(AGEING_BUCKETS) + 1, dtype=np.float64)
+        self.max_days = 0
+
+    def add_chunk(self, rows):
+        """Accrues one chunk of (issue_id, member_id, due_date) rows."""
+        count = len(rows)
+        if not count:
+            return
+        member_ids = np.fromiter((row[1] for row in rows), dtype=np.int64, count=count)
+        due = np.fromiter((row[2].toordinal() for row in rows), dtype=np.int64, count=count)
+
+        days = np.maximum(self._as_of_ordinal - due, 0)
+        fines = days * self.fine_per_day
+
+        size = int(member_ids.max()) + 1
+        if size > len(self.loans):
+            self._grow(size)
+        self.loans[:size] += np.bincount(member_ids, minlength=size)
+        self.days[:size] += np.bincount(member_ids, weights=days, minlength=size).astype(np.int64)
+        self.fines[:size] += np.bincount(member_ids, weights=fines, minlength=size)
+
+        bucket = np.searchsorted(AGEING_BUCKETS, days)  # days <= bound goes to that bucket
+        self.ageing_loans += np.bincount(bucket, minlength=len(self.ageing_loans))
+        self.ageing_fines += np.bincount(bucket, weights=fines, minlength=len(self.ageing_fines))
+        self.max_days = max(self.max_days, int(days.max()))
+
+    def _grow(self, size):
+        size = max(size, 2 * len(self.loans))  # Amortized growth, like a list
+        for name in ('loans', 'days', 'fines'):
+            array = getattr(self, name)
+            grown = np.zeros(size, dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def member_totals(self, top=None):
+        """Returns [(member_id, loans, days_overdue, fine)] for members with overdue loans, largest fine first."""
+        member_ids = np.flatnonzero(self.loans)
+        order = np.argsort(-self.fines[member_ids], kind='stable')
+        if top is not None:
+            order = order[:top]
+        member_ids = member_ids[order]
+        return list(zip(member_ids.tolist(), self.loans[member_ids].tolist(),
+                        self.days[member_ids].tolist(), self.fines[member_ids].tolist()))
+
+    def ageing(self):
+        labels, low = [], 1
+        for bound in AGEING_BUCKETS:
+            labels.append(f"{low}-{bound} days")
+            low = bound + 1
+        labels.append(f"over {AGEING_BUCKETS[-1]} days")
+        return [{'label': label, 'loans': int(loans), 'fines': round(float(fines), 2)}
+                for label, loans, fines in zip(labels, self.ageing_loans, self.ageing_fines)]
+
+
+def compute_fines(db, as_of=None, chunk_rows=None, progress=None):
+    """
+    Accrues fines for every overdue open loan.
+    :param as_of: The day fines are worked out for (a date or ISO string; default today).
+    :param progress: Optional callable(loans_read), called after each chunk.
+    :return: A FineLedger, or None if the settings or a query failed (the error is reported).
+    """
+    if isinstance(as_of, str):
+        as_of = date.fromisoformat(as_of)
+    as_of = as_of or date.today()
+    try:
+        fine_per_day = float(db.get_setting('fine_per_day'))
+    except (TypeError, ValueError) as err:
+        db.report_error("Settings Error", f"Invalid fine setting: {err}")
+        return None
+
+    ledger = FineLedger(as_of, fine_per_day)
+    read = [0]
+
+    def on_chunk(rows):
+        ledger.add_chunk(rows)
+        read[0] += len(rows)
+        if progress:
+            progress(read[0])
+
+    options = {'chunk_rows': chunk_rows} if chunk_rows else {}
+    if db.scan_overdue_loans(as_of, on_chunk, **options) is None:
+        return None
+    return ledger
+
+
+def member_details(db, member_ids):
+    """Returns {member_id: (name, email)}, looked up MEMBER_LOOKUP_BATCH ids at a time."""
+    details = {}
+    for start in range(0, len(member_ids), MEMBER_LOOKUP_BATCH):
+        batch = member_ids[start:start + MEMBER_LOOKUP_BATCH]
+        rows = db.execute_query(
+            f"SELECT member_id, name, email FROM members WHERE member_id IN ({', '.join(['%s'] * len(batch))})",
+            tuple(batch), fetch='all'
+        ) or []
+        details.update((row['member_id'], (row['name'], row['email'])) for row in rows)
+    return details
+
+
+def build_report(db, as_of=None, top=None, chunk_rows=None, progress=None):
+    """
+    Runs the fine report.
+    :param top: Number of members to list, largest fine first (None lists every member who owes a fine).
+    :return: A JSON-friendly dict with library-wide totals, ageing buckets and per-member totals,
+             or None if the report failed.
+    """
+    start = time.perf_counter()
+    ledger = compute_fines(db, as_of, chunk_rows, progress)
+    if ledger is None:
+        return None
+    totals = ledger.member_totals(top)
+    details = member_details(db, [member_id for member_id, _, _, _ in totals])
+    overdue_loans = int(ledger.loans.sum())
+    total_days = int(ledger.days.sum())
+    seconds = time.perf_counter() - start
+    return {
+        'as_of': ledger.as_of.isoformat(),
+        'fine_per_day': ledger.fine_per_day,
+        'overdue_loans': overdue_loans,
+        'members_with_fines': int(np.count_nonzero(ledger.loans)),
+        'total_fines': round(float(ledger.fines.sum()), 2),
+        'total_days_overdue': total_days,
+        'mean_days_overdue': round(total_days / overdue_loans, 1) if overdue_loans else 0.0,
+        'max_days_overdue': ledger.max_days,
+        'ageing': ledger.ageing(),
+        'members': [
+            {'member_id': member_id, 'name': details.get(member_id, ('', ''))[0],
+             'email': details.get(member_id, ('', ''))[1], 'overdue_loans': loans,
+             'days_overdue': days, 'fine': round(fine, 2)}
+            for member_id, loans, days, fine in totals
+        ],
+        'seconds': round(seconds, 2),
+        'loans_per_second': round(overdue_loans / seconds) if seconds else overdue_loans,
+    }
+
+
+def write_csv(report, path):
+    """Writes the per-member lines of a report to a CSV file."""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['member_id', 'name', 'email', 'overdue_loans', 'days_overdue', 'fine'])
+        for member in report['members']:
+            writer.writerow([member['member_id'], member['name'], member['email'], member['overdue_loans'],
+                             member['days_overdue'], f"{member['fine']:.2f}"])
+
+
+if __name__ == '__main__':
+    from library_db import (
+        DatabaseManager, DB_BACKEND, DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, SQLITE_PATH, FINE_CHUNK_ROWS
+    )
+    from db_backends import get_backend
+
+    parser = argparse.ArgumentParser(description="Report the fines accrued on all overdue loans.")
+    parser.add_argument('--as-of', default=None, help="day to work fines out for (YYYY-MM-DD, default today)")
+    parser.add_argument('--top', type=int, default=20, help="members to print, largest fine first")
+    parser.add_argument('--csv', default=None, help="write every member who owes a fine to this CSV file")
+    parser.add_argument('--chunk-rows', type=int, default=FINE_CHUNK_ROWS, help="loans accrued per chunk")
+    parser.add_argument('--backend', choices=['mysql', 'sqlite'], default=DB_BACKEND)
+    parser.add_argument('--sqlite-path', default=SQLITE_PATH)
+    args = parser.parse_args()
+
+    db = DatabaseManager(get_backend(args.backend, DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, args.sqlite_path))
+    db.error_handler = lambda title, message: print(f"{title}: {message}", file=sys.stderr)
+    report = build_report(db, args.as_of, top=None if args.csv else args.top, chunk_rows=args.chunk_rows)
+    db.disconnect()
+    if report is None:
+        sys.exit(1)
+
+    print(f"Fines as of {report['as_of']} at {report['fine_per_day']:g} per day:")
+    print(f"  {report['overdue_loans']} overdue loans held by {report['members_with_fines']} members, "
+          f"{report['total_fines']:.2f} outstanding")
+    print(f"  days overdue: mean {report['mean_days_overdue']}, max {report['max_days_overdue']}")
+    for bucket in report['ageing']:
+        print(f"  {bucket['label']:<16} {bucket['loans']:>10} loans {bucket['fines']:>16.2f}")
+    print(f"Top {min(args.top, len(report['members']))} members:")
+    for member in report['members'][:args.top]:
+        print(f"  {member['member_id']:>8}  {member['name'][:30]:<30} {member['overdue_loans']:>5} loans "
+              f"{member['fine']:>12.2f}")
+    print(f"Computed in {report['seconds']}s ({report['loans_per_second']} loans/s).")
+    if args.csv:
+        write_csv(report, args.csv)
+        print(f"Per-member totals written to {args.csv}.")
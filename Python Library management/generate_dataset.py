@@ -0,0 +1,334 @@
+# generate_dataset.py
+
+import argparse
+import contextlib
+import io
+import math
+import random
+import sys
+import time
+from datetime import date, timedelta
+from itertools import accumulate
+from multiprocessing import Pool
+
+from db_backends import get_backend
+import db_setup_advanced
+import migrations
+
+# --- Synthetic Library Dataset ---
+# Fills books, members and issued_books with production-like data for scale
+# and load testing:
+#   - loans follow a Zipf distribution over titles (a few bestsellers, a long
+#     tail) and a flatter one over members (some very active readers);
+#   - genres and authors are skewed the same way;
+#   - the loan history spans several years, growing towards the present, with a
+#     mix of on-time, late and very late returns;
+#   - a share of the catalog is currently on loan, part of it overdue.
+# Rows are generated in fixed-size chunks, each from its own seed derived from
+# the main seed, so the output is the same whatever the number of processes.
+
+# --- Generator Configuration ---
+CHUNK_ROWS = 100_000         # Rows generated per job (the unit of work for a process)
+INSERT_BATCH_SIZE = 10_000   # Rows per executemany() call
+BOOK_POPULARITY_SKEW = 1.1   # Zipf exponent of loans over titles
+MEMBER_ACTIVITY_SKEW = 0.7   # Zipf exponent of loans over members
+AUTHOR_SKEW = 1.0            # Zipf exponent of titles over authors
+BOOKS_PER_AUTHOR = 8
+HISTORY_GROWTH = 1.5         # > 1 puts more of the history in recent years
+# (share, min days past due, max days past due) of returned loans
+RETURN_MIX = ((0.75, None, 0), (0.20, 1, 14), (0.05, 15, 90))
+
+GENRES = {
+    'Fiction': 30, 'Mystery': 14, 'Romance': 12, 'Science Fiction': 9, 'Fantasy': 9, 'Biography': 6,
+    'History': 5, 'Children': 5, 'Science': 4, 'Self-Help': 3, 'Poetry': 2, 'Travel': 1,
+}
+WORDS = (
+    "river stone night garden shadow light winter silver empire ocean forest fire glass secret "
+    "history python data music island storm journey kingdom machine dream city road mountain "
+    "star letter moon summer house war peace queen world code science brief silent golden "
+    "hidden lost last first broken wild quiet burning distant crimson iron paper winding"
+).split()
+FIRST_NAMES = (
+    "Aarav Aditi Alex Amelia Ananya Ben Chloe Daniel Divya Emma Farhan Grace Hana Ishaan Jack Kavya "
+    "Leo Maya Meera Noah Olivia Priya Rahul Riya Rohan Sara Sofia Tara Vikram Zara"
+).split()
+LAST_NAMES = (
+    "Sharma Patel Smith Iyer Khan Brown Reddy Nair Garcia Wilson Gupta Rao Taylor Das Menon Singh "
+    "Kumar Clarke Joshi Bose Evans Pillai Mehta Walker Kapoor"
+).split()
+
+
+# --- Distributions ---
+_cum_weights = {}
+
+def zipf_cum_weights(n, skew):
+    """Cumulative Zipf weights for ranks 1..n (cached per process)."""
+    key = (n, skew)
+    if key not in _cum_weights:
+        _cum_weights[key] = list(accumulate(1.0 / rank ** skew for rank in range(1, n + 1)))
+    return _cum_weights[key]
+
+def _coprime_step(n):
+    step = int(n * 0.618) | 1
+    while math.gcd(step, n) != 1:
+        step += 2
+    return step
+
+def rank_to_id(ranks, n):
+    """Spreads popularity ranks over ids 1..n, so popular rows aren't simply the lowest ids."""
+    step = _coprime_step(n)
+    return [(rank * step) % n + 1 for rank in ranks]
+
+def zipf_ids(rng, n, skew, k):
+    ranks = rng.choices(range(n), cum_weights=zipf_cum_weights(n, skew), k=k)
+    return rank_to_id(ranks, n)
+
+
+# --- Row Generators ---
+# Each returns the rows with ids start+1 .. start+count.
+def book_rows(rng, start, count, spec):
+    authors = max(spec['books'] // BOOKS_PER_AUTHOR, 1)
+    author_ids = zipf_ids(rng, authors, AUTHOR_SKEW, count)
+    genres = rng.choices(list(GENRES), weights=list(GENRES.values()), k=count)
+    rows = []
+    for offset in range(count):
+        words = rng.sample(WORDS, rng.randint(2, 4))
+        author_rng = random.Random(author_ids[offset])  # Same name for every book of an author
+        author = f"{author_rng.choice(FIRST_NAMES)} {author_rng.choice(LAST_NAMES)}"
+        rows.append((start + offset + 1, ' '.join(words).title(), author, genres[offset]))
+    return rows
+
+def member_rows(rng, start, count, spec):
+    rows = []
+    for member_id in range(start + 1, start + count + 1):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        rows.append((member_id, f"{first} {last}", f"{first}.{last}.{member_id}@example.org".lower(),
+                     f"9{rng.randrange(10 ** 9):09d}"))
+    return rows
+
+def _return_delay(rng, loan_days):
+    pick = rng.random()
+    for share, low, high in RETURN_MIX:
+        if pick < share:
+            return rng.randint(1, loan_days) if low is None else loan_days + rng.randint(low, high)
+        pick -= share
+    return loan_days
+
+def _days_before(end, days):
+    """ISO dates of end, end-1, ... end-days, indexed by days before end. Formatting each
+    date once instead of per row roughly doubles the insert rate."""
+    return [(end - timedelta(days=d)).isoformat() for d in range(days + 1)]
+
+def loan_rows(rng, start, count, spec):
+    """Returned loans spread over the history period."""
+    loan_days = spec['loan_days']
+    history_days = spec['years'] * 365
+    dates = _days_before(spec['end_date'], history_days + loan_days)
+    book_ids = zipf_ids(rng, spec['books'], BOOK_POPULARITY_SKEW, count)
+    member_ids = zipf_ids(rng, spec['members'], MEMBER_ACTIVITY_SKEW, count)
+    rows = []
+    for offset in range(count):
+        issued = loan_days + int(history_days * rng.random() ** HISTORY_GROWTH)  # Days before the end date
+        returned = max(issued - _return_delay(rng, loan_days), 0)
+        rows.append((start + offset + 1, book_ids[offset], member_ids[offset],
+                     dates[issued], dates[issued - loan_days], dates[returned]))
+    return rows
+
+def open_loan_rows(rng, start, spec):
+    """Current loans: one per book on loan, overdue_share of them past their due date."""
+    end, loan_days = spec['end_date'], spec['loan_days']
+    books = rng.sample(range(1, spec['books'] + 1), int(spec['books'] * spec['open_share']))
+    member_ids = zipf_ids(rng, spec['members'], MEMBER_ACTIVITY_SKEW, len(books))
+    rows = []
+    for offset, book_id in enumerate(books):
+        if rng.random() < spec['overdue_share']:
+            age = loan_days + rng.randint(1, 60)
+        else:
+            age = rng.randint(0, loan_days)
+        issue_date = end - timedelta(days=age)
+        rows.append((start + offset + 1, book_id, member_ids[offset], issue_date,
+                     issue_date + timedelta(days=loan_days), None))
+    return rows
+
+TABLES = {
+    'books': ("INSERT INTO books (book_id, title, author, genre) VALUES (%s, %s, %s, %s)", book_rows),
+    'members': ("INSERT INTO members (member_id, name, email, phone) VALUES (%s, %s, %s, %s)", member_rows),
+    'issued_books': ("INSERT INTO issued_books (issue_id, book_id, member_id, issue_date, due_date, return_date) "
+                     "VALUES (%s, %s, %s, %s, %s, %s)", loan_rows),
+}
+
+
+# --- Generation ---
+def insert_rows(conn, cursor, query, rows, batch_size=INSERT_BATCH_SIZE):
+    for i in range(0, len(rows), batch_size):
+        conn.start_transaction()
+        cursor.executemany(query, rows[i:i + batch_size])
+        conn.commit()
+
+@contextlib.contextmanager
+def deferred_indexes(cursor, backend, table):
+    """
+    On SQLite, drops the secondary indexes of a table for the duration of a bulk
+    load and rebuilds them afterwards, which is several times faster than
+    maintaining them row by row. (InnoDB has no equivalent; MySQL loads with
+    parallel writers instead.)
+    """
+    indexes = []
+    if backend.name == 'sqlite':
+        cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND sql IS NOT NULL", (table,)
+        )
+        indexes = cursor.fetchall()
+        for name, _ in indexes:
+            cursor.execute(f"DROP INDEX `{name}`")
+    try:
+        yield
+    finally:
+        for _, sql in indexes:
+            cursor.execute(sql)
+
+def _chunk_seed(seed, table, index):
+    return f"{seed}:{table}:{index}"
+
+def generate_chunk(job):
+    """
+    Generates one chunk of rows. Runs in worker processes.
+    :return: The rows, or their number if the job carries backend settings (the worker inserts them itself).
+    """
+    table, index, start, count, spec, backend_config = job
+    rows = TABLES[table][1](random.Random(_chunk_seed(spec['seed'], table, index)), start, count, spec)
+    if backend_config is None:
+        return rows
+    backend = get_backend(*backend_config)
+    conn = backend.connect()
+    cursor = conn.cursor()
+    try:
+        insert_rows(conn, cursor, TABLES[table][0], rows)
+    finally:
+        cursor.close()
+        conn.close()
+    return len(rows)
+
+def generate(backend, backend_config=None, books=10_000, members=2_000, loans=100_000, years=5, seed=42,
+             loan_days=14, open_share=0.1, overdue_share=0.3, end_date=None, processes=1, progress=print):
+    """
+    Fills an empty library database with synthetic data.
+    :param backend_config: get_backend() arguments, needed for processes > 1 on MySQL, where
+                           every worker process inserts its own chunks over its own connection.
+    :param processes: Worker processes generating rows (1 = generate in this process).
+    :return: A dict of {table: rows inserted}.
+    """
+    spec = {
+        'seed': seed, 'books': books, 'members': members, 'years': years, 'loan_days': loan_days,
+        'open_share': open_share, 'overdue_share': overdue_share, 'end_date': end_date or date.today(),
+    }
+    conn = backend.connect()
+    cursor = conn.cursor()
+    pool = Pool(processes) if processes > 1 else None
+    # SQLite allows one writer at a time, so workers only generate and this process inserts
+    parallel_writes = pool is not None and backend.name == 'mysql'
+    if parallel_writes and backend_config is None:
+        raise ValueError("backend_config is required for parallel writes")
+    counts = {}
+    try:
+        cursor.execute("SELECT COUNT(*) FROM books")
+        if cursor.fetchone()[0]:
+            raise ValueError("the database already holds books; generate into an empty database")
+
+        history = max(loans - int(books * open_share), 0)
+        for table, total in (('books', books), ('members', members), ('issued_books', history)):
+            jobs = [
+                (table, index, start, min(CHUNK_ROWS, total - start), spec,
+                 backend_config if parallel_writes else None)
+                for index, start in enumerate(range(0, total, CHUNK_ROWS))
+            ]
+            started = time.perf_counter()
+            results = pool.imap(generate_chunk, jobs) if pool else map(generate_chunk, jobs)
+            done = 0
+            with deferred_indexes(cursor, backend, table):
+                for result in results:
+                    if parallel_writes:
+                        done += result
+                    else:
+                        insert_rows(conn, cursor, TABLES[table][0], result)
+                        done += len(result)
+                    progress(f"  {table}: {done}/{total} rows")
+            elapsed = time.perf_counter() - started
+            progress(f"{table}: {done} rows in {elapsed:.1f}s ({done / elapsed if elapsed else done:.0f} rows/s)")
+            counts[table] = done
+
+        # Current loans, and the matching book status
+        rows = open_loan_rows(random.Random(_chunk_seed(seed, 'open_loans', 0)), history, spec)
+        insert_rows(conn, cursor, TABLES['issued_books'][0], rows)
+        book_ids = [row[1] for row in rows]
+        for i in range(0, len(book_ids), 500):
+            batch = book_ids[i:i + 500]
+            cursor.execute(
+                f"UPDATE books SET status = 'Issued' WHERE book_id IN ({', '.join(['%s'] * len(batch))})", tuple(batch)
+            )
+        counts['issued_books'] += len(rows)
+        progress(f"open loans: {len(rows)} rows")
+
+        # Each generated book is one physical copy
+        if migrations.column_type(cursor, backend, 'issued_books', 'copy_id') is not None:
+            migrations.create_missing_copies(cursor)
+            conn.commit()
+            progress("copies: one per book")
+
+        # Give the query planner statistics for the new data
+        if backend.name == 'mysql':
+            cursor.execute("ANALYZE TABLE books, copies, members, issued_books")
+            cursor.fetchall()
+        else:
+            cursor.execute("ANALYZE")
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        cursor.close()
+        conn.close()
+    return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fill an empty library database with synthetic data.")
+    parser.add_argument('--books', type=int, default=10_000)
+    parser.add_argument('--members', type=int, default=2_000)
+    parser.add_argument('--loans', type=int, default=100_000, help="loan records, current loans included")
+    parser.add_argument('--years', type=int, default=5, help="length of the loan history")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--processes', type=int, default=1, help="worker processes generating rows")
+    parser.add_argument('--open-share', type=float, default=0.1, help="share of books currently on loan")
+    parser.add_argument('--overdue-share', type=float, default=0.3, help="share of current loans that are overdue")
+    parser.add_argument('--backend', choices=['mysql', 'sqlite'], default=db_setup_advanced.DB_BACKEND)
+    parser.add_argument('--sqlite-path', default=db_setup_advanced.SQLITE_PATH)
+    parser.add_argument('--quiet', action='store_true', help="only print the summary")
+    args = parser.parse_args()
+
+    config = (args.backend, db_setup_advanced.DB_HOST, db_setup_advanced.DB_USER, db_setup_advanced.DB_PASSWORD,
+              db_setup_advanced.DB_NAME, args.sqlite_path)
+    backend = get_backend(*config)
+    with contextlib.redirect_stdout(io.StringIO()):
+        db_setup_advanced.create_database(backend)
+
+    started = time.perf_counter()
+    try:
+        counts = generate(
+            backend, config, books=args.books, members=args.members, loans=args.loans, years=args.years,
+            seed=args.seed, open_share=args.open_share, overdue_share=args.overdue_share,
+            processes=args.processes, progress=(lambda message: None) if args.quiet else print
+        )
+    except (ValueError, backend.Error) as err:
+        sys.exit(f"Generation failed: {err}")
+
+    # Seeding bypasses DatabaseManager, so recount the dashboard counters
+    from library_db import DatabaseManager
+    db = DatabaseManager(backend)
+    db.error_handler = lambda title, message: print(f"{title}: {message}", file=sys.stderr)
+    db.verify_stats(repair=True)
+    db.disconnect()
+
+    total = sum(counts.values())
+    elapsed = time.perf_counter() - started
+    print(f"Generated {total} rows ({', '.join(f'{table}: {n}' for table, n in counts.items())}) "
+          f"in {elapsed:.1f}s ({total / elapsed:.0f} rows/s).")
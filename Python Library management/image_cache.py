@@ -0,0 +1,75 @@
+# image_cache.py
+
+import hashlib
+import io
+import os
+
+# --- Scaled Image Cache ---
+# Decoding and resizing a full-size photo takes about 100 ms, and
+# the result is the same every time the image is shown at the same size. The
+# scaled image is cached on disk as a PPM file: Tk reads PPM data directly,
+# so a cache hit needs neither PIL nor any decoding work. The cache key
+# includes the source file's modification time and size and the target size,
+# so replacing the image or changing the window size rebuilds the entry.
+# Nothing here touches Tk, so loading can run on a worker thread.
+
+IMAGE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.image_cache')
+
+
+def cache_path(source, size, cache_dir=IMAGE_CACHE_DIR):
+    """Returns the cache file for source scaled to size (width, height)."""
+    stat = os.stat(source)
+    key = f"{os.path.abspath(source)}|{stat.st_mtime_ns}|{stat.st_size}"
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(cache_dir, f"{stem}-{size[0]}x{size[1]}-{hashlib.sha1(key.encode()).hexdigest()[:16]}.ppm")
+
+
+def scale_image(source, size):
+    """Decodes source and resizes it to size; returns the image as binary PPM bytes."""
+    from PIL import Image  # Only needed when the cache has to be (re)built
+
+    with Image.open(source) as image:
+        # For JPEGs, decode straight to 1/2, 1/4 or 1/8 scale when that is still
+        # at least the target size (a no-op for other formats)
+        image.draft('RGB', size)
+        scaled = image.convert('RGB').resize(size, reducing_gap=2.0)
+    buffer = io.BytesIO()
+    scaled.save(buffer, 'PPM')
+    return buffer.getvalue()
+
+
+def load_scaled(source, size, cache_dir=IMAGE_CACHE_DIR):
+    """
+    Returns source scaled to size as PPM bytes (for tk.PhotoImage(data=...)), from the cache when current.
+    :raises: OSError if the source can't be read, ImportError if it must be scaled and PIL is missing.
+    """
+    path = cache_path(source, size, cache_dir)
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+
+    data = scale_image(source, size)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        partial_path = f"{path}.{os.getpid()}.part"
+        with open(partial_path, 'wb') as f:
+            f.write(data)
+        os.replace(partial_path, path)  # Readers never see a half-written entry
+        _remove_stale(path)
+    except OSError:
+        pass  # A read-only install still works, just without the cache
+    return data
+
+
+def _remove_stale(path):
+    # Drops older entries for the same image and size (the source has changed since)
+    directory, name = os.path.split(path)
+    prefix = name.rsplit('-', 1)[0] + '-'
+    for other in os.listdir(directory):
+        if other != name and other.startswith(prefix) and other.endswith('.ppm'):
+            try:
+                os.remove(os.path.join(directory, other))
+            except OSError:
+                pass
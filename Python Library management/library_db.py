@@ -0,0 +1,1436 @@
+# library_db.py
+
+from datetime import date, timedelta
+from contextlib import contextmanager
+from itertools import islice
+import hashlib
+import os
+import random
+import re
+import sys
+import threading
+import time
+from query_stats import QueryStats, InstrumentedConnection
+from models import Book, Member, Loan
+
+# --- Database Layer ---
+# Configuration, the connection pool and DatabaseManager, free of any GUI
+# code: the Tk front end (advanced_library_system.py), api_server.py and the
+# command-line tools all build on this module, so none of them but the GUI
+# needs Tk.
+
+# --- Constants and Configuration ---
+DB_BACKEND = 'mysql'  # 'mysql' or 'sqlite'
+SQLITE_PATH = 'library.db'
+DB_HOST = 'localhost'
+DB_USER = 'root'
+DB_PASSWORD = 'your_password' # <-- IMPORTANT: Change this!
+DB_NAME = 'advanced_library_db'
+
+# --- Connection Pool Configuration ---
+POOL_SIZE = 5               # Maximum number of open connections
+POOL_TIMEOUT = 10           # Seconds to wait for a free connection
+POOL_PING_INTERVAL = 30     # Idle seconds after which a connection is health-checked
+
+# --- Transaction Configuration ---
+TXN_RETRIES = 4              # Attempts for a transaction that hits a deadlock or lock-wait timeout
+TXN_RETRY_BACKOFF = 0.05     # Seconds before the first retry; doubles on each further retry
+
+# --- Query Instrumentation Configuration ---
+INSTRUMENT_QUERIES = True    # Time every statement (see query_stats.py)
+SLOW_QUERY_MS = 200          # Statements slower than this go to the slow-query log; None disables it
+SLOW_QUERY_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'slow_queries.log')
+
+# --- Search Configuration ---
+FULLTEXT_SCHEMA_VERSION = 7  # Migration that adds the full-text indexes
+MYSQL_FT_MIN_TOKEN = 3       # innodb_ft_min_token_size; shorter words aren't indexed
+
+# --- Dashboard Configuration ---
+STATS_SCHEMA_VERSION = 8     # Migration that adds the library_stats counters
+
+# --- Change Feed Configuration ---
+CHANGE_LOG_SCHEMA_VERSION = 11  # Migration that adds the change log
+CHANGE_POLL_LIMIT = 500      # More changed rows than this since the last poll reload the lists instead
+CHANGE_LOG_KEEP = 100000     # Versions kept when the log is compacted; terminals further behind reload
+
+# --- Loan Archive Configuration ---
+LOAN_ARCHIVE_SCHEMA_VERSION = 12  # Migration that adds the loan_archive table
+ARCHIVE_AFTER_DAYS = 365     # Returned loans older than this are moved out of issued_books
+ARCHIVE_BATCH_SIZE = 1000    # Loans moved per transaction
+ARCHIVE_BATCH_PAUSE = 0.2    # Seconds between batches, so desks aren't held up by the archiving job
+
+# --- Inventory Configuration ---
+COPIES_SCHEMA_VERSION = 13   # Migration that splits titles (books) from their copies
+
+# --- Settings Cache Configuration ---
+SETTINGS_CHECK_INTERVAL = 5  # Seconds between checks for settings changed by other terminals
+
+# --- Bulk Import Configuration ---
+IMPORT_BATCH_SIZE = 5000     # Rows sent per executemany() call
+IMPORT_COMMIT_EVERY = 50000  # Rows inserted per transaction
+
+# --- Streaming Configuration ---
+STREAM_CHUNK_ROWS = 5000     # Rows per fetchmany() call when streaming large results
+
+# --- Fine Report Configuration ---
+FINE_CHUNK_ROWS = 100000     # Overdue loans accrued per chunk by the fine report
+FINE_REPORT_TOP = 500        # Members listed in the Fines tab
+
+# --- List View Configuration ---
+PAGE_SIZE = 200              # Rows fetched per page in the book/member lists
+
+
+def print_error(title, message):
+    """The default DatabaseManager.error_handler."""
+    print(f"{title}: {message}", file=sys.stderr)
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes free within the timeout."""
+
+
+class ConflictError(Exception):
+    """Raised inside a transaction when rows it relies on changed under it; _transact runs it again."""
+
+
+# --- Connection Pool Class ---
+# Keeps a small set of long-lived connections open so that queries don't
+# pay for a new TCP connection and login handshake every time.
+class ConnectionPool:
+    """A thread-safe pool of reusable database connections."""
+
+    def __init__(self, factory, size=POOL_SIZE, timeout=POOL_TIMEOUT, ping_interval=POOL_PING_INTERVAL,
+                 on_acquire=None):
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self.on_acquire = on_acquire  # Called with the seconds each acquire() took
+        self._idle = []  # Stack of (connection, last_used) pairs
+        self._in_use = 0
+        self._closed = False
+        self._lock = threading.Condition()
+        self._stats = {
+            'created': 0, 'acquired': 0, 'reconnects': 0,
+            'discarded': 0, 'waits': 0, 'timeouts': 0
+        }
+
+    def acquire(self):
+        """
+        Borrows a connection, opening a new one if the pool isn't full yet.
+        Connections that sat idle longer than ping_interval are health-checked
+        and transparently replaced if the server has dropped them.
+        """
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self._lock:
+            self._closed = False
+            while not self._idle and self._in_use >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(f"No free database connection after {self.timeout}s.")
+                self._stats['waits'] += 1
+                self._lock.wait(remaining)
+            conn, last_used = self._idle.pop() if self._idle else (None, None)
+            self._in_use += 1
+            self._stats['acquired'] += 1
+
+        try:
+            if conn is None:
+                conn = self._open()
+            elif time.monotonic() - last_used > self.ping_interval and not self._is_alive(conn):
+                self._close(conn)
+                conn = self._open()
+                with self._lock:
+                    self._stats['reconnects'] += 1
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+        if self.on_acquire:
+            self.on_acquire(time.monotonic() - started)
+        return conn
+
+    def release(self, conn, discard=False):
+        """Returns a connection to the pool, or closes it if it is broken."""
+        with self._lock:
+            self._in_use -= 1
+            if discard or self._closed:
+                if discard:
+                    self._stats['discarded'] += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+                conn = None
+            self._lock.notify()
+        if conn is not None:
+            self._close(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager that borrows a connection for the duration of a block."""
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            self.release(conn, discard=not self._is_alive(conn))
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        """Closes all idle connections; busy ones are closed when released."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        """Returns a snapshot of the pool's counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(size=self.size, in_use=self._in_use, idle=len(self._idle))
+        return stats
+
+    def _open(self):
+        conn = self.factory()
+        with self._lock:
+            self._stats['created'] += 1
+        return conn
+
+    @staticmethod
+    def _is_alive(conn):
+        try:
+            return conn.is_connected()
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+STAT_ADJUST = "UPDATE library_stats SET stat_value = stat_value + %s WHERE stat_key = %s"
+# Numbering changes with a counter row (rather than the log's AUTO_INCREMENT)
+# makes versions follow commit order: the row stays locked until the change
+# commits, so a reader that sees version N has seen every version below it.
+CHANGE_BUMP = "UPDATE library_stats SET stat_value = stat_value + 1 WHERE stat_key = 'change_version'"
+CHANGE_INSERT = ("INSERT INTO change_log (version, entity, entity_id, action) "
+                 "SELECT stat_value, %s, %s, %s FROM library_stats WHERE stat_key = 'change_version'")
+
+# --- Database Manager Class ---
+# This class handles all direct interactions with the database.
+# It helps separate the database logic from the GUI logic.
+class DatabaseManager:
+    """Manages all database operations for the library system."""
+
+    def __init__(self, backend, pool_size=POOL_SIZE):
+        self.backend = backend
+        if backend.max_connections:
+            pool_size = min(pool_size, backend.max_connections)
+        # Backend connections run in autocommit mode, which keeps pooled
+        # connections from holding stale read snapshots; multi-statement
+        # operations start an explicit transaction instead.
+        self.query_stats = None
+        if INSTRUMENT_QUERIES:
+            self.query_stats = QueryStats(slow_ms=SLOW_QUERY_MS, slow_log=SLOW_QUERY_LOG)
+            self.pool = ConnectionPool(
+                lambda: InstrumentedConnection(backend.connect(), self.query_stats, backend.explain_prefix),
+                size=pool_size, on_acquire=self.query_stats.record_acquire
+            )
+        else:
+            self.pool = ConnectionPool(backend.connect, size=pool_size)
+        self._schema_version = None
+        self._settings = None          # Cached {setting_key: setting_value}
+        self._settings_version = None  # settings_version stamp the cache was loaded at
+        self._settings_checked = 0.0
+        self._settings_lock = threading.Lock()
+        # Called with (title, message) for every error. Prints to stderr unless a
+        # front end installs its own (the GUI shows a dialog on the Tk thread)
+        self.error_handler = print_error
+
+    def report_error(self, title, message):
+        self.error_handler(title, message)
+
+    def connect(self):
+        """Warms up the connection pool and checks that the database is reachable."""
+        try:
+            conn = self.pool.acquire()
+        except (self.backend.Error, PoolTimeoutError) as err:
+            self.report_error("Database Error", f"Failed to connect to database: {err}")
+            return False
+        self.pool.release(conn)
+        return True
+
+    def disconnect(self):
+        """Closes all pooled connections."""
+        self.pool.close()
+
+    def get_pool_stats(self):
+        """Returns connection pool statistics (size, in use, idle, reconnects...)."""
+        return self.pool.stats()
+
+    def get_query_stats(self):
+        """Returns per-statement timings and pool acquire times (see QueryStats.snapshot), or None."""
+        return self.query_stats.snapshot() if self.query_stats else None
+
+    def dump_query_stats(self, path):
+        """Writes the query statistics and pool counters to a JSON file."""
+        if self.query_stats:
+            self.query_stats.dump(path, extra={'backend': str(self.backend), 'pool': self.get_pool_stats()})
+
+    def _rollback(self, conn):
+        """Rolls back the open transaction. Returns False if the connection is dead."""
+        try:
+            conn.rollback()
+            return True
+        except self.backend.Error:
+            return False
+
+    def execute_query(self, query, params=None, fetch=None, model=None):
+        """
+        Executes a given SQL query on a pooled connection.
+        :param query: The SQL query string.
+        :param params: A tuple of parameters to be used with the query.
+        :param fetch: Type of fetch ('one', 'all'). If None, it's a non-fetching query (INSERT, UPDATE, DELETE).
+        :param model: Row model (see models.py) built from each fetched row, whose columns must be
+                      selected in the model's field order; rows are dicts if None.
+        :return: Fetched data or row count.
+        """
+        try:
+            conn = self.pool.acquire()
+        except (self.backend.Error, PoolTimeoutError) as err:
+            self.report_error("Database Error", f"Failed to connect to database: {err}")
+            return None if fetch else 0
+
+        cursor = None
+        healthy = True
+        try:
+            cursor = conn.cursor(dictionary=model is None)
+            cursor.execute(query, params or ())
+            if fetch == 'one':
+                result = cursor.fetchone()
+                if model is not None and result is not None:
+                    result = model(*result)
+            elif fetch == 'all':
+                result = cursor.fetchall()
+                if model is not None:
+                    result = [model(*row) for row in result]
+            else:
+                conn.commit()
+                result = cursor.rowcount
+        except self.backend.Error as err:
+            healthy = self._rollback(conn)
+            self.report_error("Query Error", f"An error occurred: {err}")
+            result = None if fetch else 0
+        finally:
+            if cursor is not None:
+                cursor.close()
+            self.pool.release(conn, discard=not healthy)
+        return result
+
+    def _transact(self, work, error_message="An error occurred"):
+        """
+        Runs work(cursor) in a transaction on one pooled connection and commits.
+        Deadlocks and lock-wait timeouts roll the transaction back and run it again
+        (up to TXN_RETRIES attempts, with jittered exponential backoff), so work must
+        only touch the database through the cursor it is given.
+        Work raises ConflictError when a conditional write finds the rows changed; that is
+        retried the same way.
+        :return: Whatever work returns, or None if the transaction failed.
+        """
+        try:
+            conn = self.pool.acquire()
+        except (self.backend.Error, PoolTimeoutError) as err:
+            self.report_error("Database Error", f"Failed to connect to database: {err}")
+            return None
+
+        cursor = None
+        healthy = True
+        try:
+            cursor = conn.cursor()
+            for attempt in range(1, TXN_RETRIES + 1):
+                try:
+                    conn.start_transaction()
+                    result = work(cursor)
+                    conn.commit()
+                    return result
+                except (self.backend.Error, ConflictError) as err:
+                    retryable = isinstance(err, ConflictError) or self.backend.is_retryable(err)
+                    if attempt == TXN_RETRIES or not retryable or not self._rollback(conn):
+                        raise
+                time.sleep(TXN_RETRY_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+        except (self.backend.Error, ConflictError, ValueError) as err:
+            healthy = self._rollback(conn)
+            self.report_error("Transaction Error", f"{error_message}: {err}")
+            return None
+        finally:
+            if cursor is not None:
+                cursor.close()
+            self.pool.release(conn, discard=not healthy)
+
+    def execute_transaction(self, statements):
+        """
+        Executes several (query, params) statements atomically on one pooled connection.
+        :return: A list with each statement's row count, or None if the transaction failed.
+        """
+        def run(cursor):
+            counts = []
+            for query, params in statements:
+                cursor.execute(query, params)
+                counts.append(cursor.rowcount)
+            return counts
+        return self._transact(run)
+
+    def stream_query(self, query, params=None, chunk_rows=STREAM_CHUNK_ROWS, model=None):
+        """
+        Runs a query on an unbuffered cursor and yields its rows as lists of up to
+        chunk_rows tuples (or model records, as in execute_query), so results of
+        any size are read with flat memory use.
+        The connection stays borrowed until the generator is exhausted or closed;
+        don't make other DatabaseManager calls from inside the loop when the pool
+        has a single connection (in-memory SQLite).
+        Unlike execute_query, errors are raised (backend.Error or PoolTimeoutError)
+        rather than reported, since rows may already have been consumed.
+        """
+        conn = self.pool.acquire()
+        cursor = None
+        healthy = False
+        try:
+            cursor = conn.cursor(buffered=False)
+            cursor.execute(query, params or ())
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield [model(*row) for row in rows] if model is not None else rows
+            healthy = True
+        except GeneratorExit:
+            # Abandoned part way; on MySQL the unread rows would block the connection
+            healthy = not self.backend.streams_must_be_drained
+            raise
+        finally:
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except self.backend.Error:
+                    healthy = False
+            self.pool.release(conn, discard=not healthy)
+
+    def get_schema_version(self):
+        """Returns the applied migration version (0 for a database that was never migrated)."""
+        if self._schema_version is None:
+            try:
+                with self.pool.connection() as conn:
+                    cursor = conn.cursor()
+                    try:
+                        cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+                        self._schema_version = cursor.fetchone()[0]
+                    except self.backend.Error:
+                        self._schema_version = 0  # No schema_version table yet
+                    finally:
+                        cursor.close()
+            except (self.backend.Error, PoolTimeoutError):
+                return 0
+        return self._schema_version
+
+    def text_search_mode(self):
+        """
+        How _text_search matches search text: 'sqlite-fts5' or 'mysql-fulltext' (word prefixes
+        through the full-text index), or 'sqlite-like' or 'mysql-like' (substring scans).
+        """
+        if self.get_schema_version() < FULLTEXT_SCHEMA_VERSION:
+            return f"{self.backend.name}-like"
+        return 'sqlite-fts5' if self.backend.name == 'sqlite' else 'mysql-fulltext'
+
+    def _text_search(self, table, key, fields):
+        """
+        Builds the SQL pieces that match each {column: text} in fields as word prefixes.
+        Uses the backend's full-text index (MySQL FULLTEXT or SQLite FTS5) when the
+        schema has one, otherwise falls back to LIKE scans.
+        :return: (join, conditions, params, rank, rank_params); rank sorts best matches first.
+        """
+        join, conditions, params, rank, rank_params = "", [], [], None, []
+        fields = {column: text for column, text in fields.items() if text}
+        if not fields:
+            return join, conditions, params, rank, rank_params
+        mode = self.text_search_mode()
+
+        if mode == 'sqlite-fts5':
+            match_terms = []
+            for column, text in fields.items():
+                terms = re.findall(r'\w+', text)
+                if terms:
+                    match_terms += [f'{column}:"{term}"*' for term in terms]
+                else:
+                    conditions.append(f"{table}.{column} LIKE %s")
+                    params.append(f"%{text}%")
+            if match_terms:
+                join = f" JOIN {table}_fts ON {table}_fts.rowid = {table}.{key}"
+                conditions.append(f"{table}_fts MATCH %s")
+                params.append(" AND ".join(match_terms))
+                rank = f"bm25({table}_fts)"
+            return join, conditions, params, rank, rank_params
+
+        scores = []
+        for column, text in fields.items():
+            terms = re.findall(r'\w+', text)
+            indexed = [term for term in terms if len(term) >= MYSQL_FT_MIN_TOKEN]
+            if mode != 'mysql-fulltext' or not terms:
+                conditions.append(f"{column} LIKE %s")
+                params.append(f"%{text}%")
+            elif not indexed:
+                # Too short for the full-text index: match the start of the column instead
+                conditions.append(f"{column} LIKE %s")
+                params.append(f"{text}%")
+            else:
+                boolean_query = " ".join(f"+{term}*" for term in indexed)
+                conditions.append(f"MATCH({column}) AGAINST (%s IN BOOLEAN MODE)")
+                params.append(boolean_query)
+                scores.append(f"MATCH({column}) AGAINST (%s IN BOOLEAN MODE)")
+                rank_params.append(boolean_query)
+                for term in terms:
+                    if len(term) < MYSQL_FT_MIN_TOKEN:
+                        conditions.append(f"{column} LIKE %s")
+                        params.append(f"%{term}%")
+        if scores:
+            rank = "-(" + " + ".join(scores) + ")"
+        return join, conditions, params, rank, rank_params
+
+    def _keyset_page(self, select, conditions, params, sort_column, key_column, after, before, limit, model=None):
+        """
+        Fetches one page ordered by (sort_column, key_column) using keyset pagination,
+        so each page costs an index range scan no matter how deep into the list it is.
+        :param after: (sort value, key) of the last row already shown; fetches the next page.
+        :param before: (sort value, key) of the first row already shown; fetches the previous page.
+        """
+        conditions, params = list(conditions), list(params)
+        direction = "ASC"
+        if after:
+            conditions.append(f"({sort_column} > %s OR ({sort_column} = %s AND {key_column} > %s))")
+            params += [after[0], after[0], after[1]]
+        elif before:
+            conditions.append(f"({sort_column} < %s OR ({sort_column} = %s AND {key_column} < %s))")
+            params += [before[0], before[0], before[1]]
+            direction = "DESC"
+        query = select + " WHERE " + (" AND ".join(conditions) or "1=1")
+        query += f" ORDER BY {sort_column} {direction}, {key_column} {direction} LIMIT %s"
+        rows = self.execute_query(query, tuple(params + [limit]), fetch='all', model=model)
+        if rows and direction == "DESC":
+            rows.reverse()
+        return rows
+
+    def _has_stats(self):
+        return self.get_schema_version() >= STATS_SCHEMA_VERSION
+
+    def _stat_changes(self, **deltas):
+        """Statements that adjust the dashboard counters, e.g. _stat_changes(total_books=1)."""
+        if not self._has_stats():
+            return []
+        return [(STAT_ADJUST, (delta, key)) for key, delta in deltas.items() if delta]
+
+    def _has_change_log(self):
+        return self.get_schema_version() >= CHANGE_LOG_SCHEMA_VERSION
+
+    def _has_loan_archive(self):
+        return self.get_schema_version() >= LOAN_ARCHIVE_SCHEMA_VERSION
+
+    def _has_copies(self):
+        return self.get_schema_version() >= COPIES_SCHEMA_VERSION
+
+    def _book_columns(self):
+        # The Book fields; before the title/copy split every row is a single copy
+        if self._has_copies():
+            return ("books.book_id, books.title, books.author, books.genre, books.status, "
+                    "books.total_copies, books.available_copies")
+        return ("books.book_id, books.title, books.author, books.genre, books.status, "
+                "1, CASE WHEN books.status = 'Available' THEN 1 ELSE 0 END")
+
+    def _loan_columns(self):
+        # The Loan fields (see _book_columns)
+        copy_id = "copy_id" if self._has_copies() else "book_id"
+        return f"issue_id, book_id, {copy_id}, member_id, issue_date, due_date, return_date"
+
+    def _log_changes(self, cursor, entity, action, entity_ids):
+        """
+        Records changed rows in the change log under one new version. Call it last in the
+        transaction (check _has_change_log() beforehand): it locks the shared version row.
+        :param action: 'insert', 'update', 'delete', or 'bulk' for imports (entity_ids [0]).
+        """
+        if not entity_ids:
+            return
+        cursor.execute(CHANGE_BUMP)
+        cursor.executemany(CHANGE_INSERT, [(entity, entity_id, action) for entity_id in entity_ids])
+
+    def _execute_logged(self, statements, main, entity, action, entity_id=None):
+        """
+        Like execute_transaction, but also records the change in the change log.
+        :param main: Index of the statement that changes the entity's row. The change is only
+                     logged if it changed a row; with entity_id None the id it inserted is logged.
+        :return: The row count of the main statement (0 if the transaction failed).
+        """
+        track_changes = self._has_change_log()
+
+        def run(cursor):
+            for index, (query, params) in enumerate(statements):
+                cursor.execute(query, params)
+                if index == main:
+                    count = cursor.rowcount
+                    changed_id = cursor.lastrowid if entity_id is None else entity_id
+            if track_changes and count > 0:
+                self._log_changes(cursor, entity, action, [changed_id])
+            return count
+        return self._transact(run) or 0
+
+    # --- User Management ---
+    def verify_user(self, username, password):
+        """Verifies user credentials against the database."""
+        password_hash = hashlib.sha256(password.encode()).hexdigest()
+        query = "SELECT * FROM users WHERE username = %s AND password_hash = %s"
+        return self.execute_query(query, (username, password_hash), fetch='one')
+
+    # --- Book Management ---
+    def add_book(self, title, author, genre, copies=1):
+        """Adds a title with a number of copies. Returns 1 if it was added, 0 otherwise."""
+        if copies < 1:
+            self.report_error("Error", "A book needs at least one copy.")
+            return 0
+        if not self._has_copies():
+            if copies > 1:
+                self.report_error("Error", "This database keeps one copy per book; run migrations.py first.")
+                return 0
+            query = "INSERT INTO books (title, author, genre) VALUES (%s, %s, %s)"
+            return self._execute_logged([(query, (title, author, genre))] + self._stat_changes(total_books=1),
+                                        0, 'book', 'insert')
+        track_stats = self._has_stats()
+        track_changes = self._has_change_log()
+
+        def add(cursor):
+            cursor.execute(
+                "INSERT INTO books (title, author, genre, total_copies, available_copies) VALUES (%s, %s, %s, %s, %s)",
+                (title, author, genre, copies, copies)
+            )
+            book_id = cursor.lastrowid
+            cursor.executemany("INSERT INTO copies (book_id) VALUES (%s)", [(book_id,)] * copies)
+            if track_stats:
+                cursor.execute(STAT_ADJUST, (copies, 'total_books'))
+            if track_changes:
+                self._log_changes(cursor, 'book', 'insert', [book_id])
+            return 1
+        return self._transact(add, "Failed to add book") or 0
+
+    def update_book(self, book_id, title, author, genre, copies=None):
+        """
+        Updates a title, and its number of copies if copies is given. Copies are added,
+        or withdrawn from those on the shelf (never from those on loan).
+        :return: 1 if the book was updated, 0 otherwise.
+        """
+        query = "UPDATE books SET title = %s, author = %s, genre = %s WHERE book_id = %s"
+        if copies is None or not self._has_copies():
+            return self._execute_logged([(query, (title, author, genre, book_id))], 0, 'book', 'update', book_id)
+        if copies < 1:
+            self.report_error("Error", "A book needs at least one copy.")
+            return 0
+        track_stats = self._has_stats()
+        track_changes = self._has_change_log()
+
+        def edit(cursor):
+            cursor.execute(
+                f"SELECT total_copies, available_copies FROM books WHERE book_id = %s{self.backend.lock_clause}",
+                (book_id,)
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return 0
+            total, available = row
+            change = copies - total
+            if available + change < 0:
+                raise ValueError(f"only {available} of the {total} copies are on the shelf to withdraw")
+            cursor.execute(query, (title, author, genre, book_id))
+            if change:
+                if change > 0:
+                    cursor.executemany("INSERT INTO copies (book_id) VALUES (%s)", [(book_id,)] * change)
+                else:
+                    cursor.execute(
+                        "SELECT copy_id FROM copies WHERE book_id = %s AND status = 'Available' "
+                        "ORDER BY copy_id DESC LIMIT %s", (book_id, -change)
+                    )
+                    withdrawn = [row[0] for row in cursor.fetchall()]
+                    cursor.execute(f"DELETE FROM copies WHERE copy_id IN ({self._placeholders(withdrawn)})",
+                                   tuple(withdrawn))
+                cursor.execute(
+                    "UPDATE books SET total_copies = %s, available_copies = %s, status = %s WHERE book_id = %s",
+                    (copies, available + change, 'Available' if available + change else 'Issued', book_id)
+                )
+                if track_stats:
+                    cursor.execute(STAT_ADJUST, (change, 'total_books'))
+            if track_changes:
+                self._log_changes(cursor, 'book', 'update', [book_id])
+            return 1
+        return self._transact(edit, "Failed to update book") or 0
+
+    def delete_book(self, book_id):
+        statements = []
+        if self._has_stats() and self._has_copies():
+            # Take the copies (cascaded, like their open loans) out of the counters
+            statements = [
+                ("UPDATE library_stats SET stat_value = stat_value - "
+                 "(SELECT COALESCE(SUM(total_copies), 0) FROM books WHERE book_id = %s) WHERE stat_key = 'total_books'",
+                 (book_id,)),
+                ("UPDATE library_stats SET stat_value = stat_value - "
+                 "(SELECT COALESCE(SUM(total_copies - available_copies), 0) FROM books WHERE book_id = %s) "
+                 "WHERE stat_key = 'issued_books'", (book_id,)),
+                ("UPDATE library_stats SET stat_value = stat_value - "
+                 "(SELECT COUNT(*) FROM issued_books WHERE book_id = %s AND return_date IS NULL AND due_date < %s) "
+                 "WHERE stat_key = 'overdue_books'", (book_id, date.today())),
+            ]
+        elif self._has_stats():
+            # Take the book (and its cascaded open loan, if any) out of the counters
+            statements = [
+                ("UPDATE library_stats SET stat_value = stat_value - "
+                 "(SELECT COUNT(*) FROM books WHERE book_id = %s) WHERE stat_key = 'total_books'", (book_id,)),
+                ("UPDATE library_stats SET stat_value = stat_value - "
+                 "(SELECT COUNT(*) FROM books WHERE book_id = %s AND status = 'Issued') WHERE stat_key = 'issued_books'",
+                 (book_id,)),
+                ("UPDATE library_stats SET stat_value = stat_value - "
+                 "(SELECT COUNT(*) FROM issued_books WHERE book_id = %s AND return_date IS NULL AND due_date < %s) "
+                 "WHERE stat_key = 'overdue_books'", (book_id, date.today())),
+            ]
+        if self._has_loan_archive():
+            # Explicit, because a partitioned archive can't have foreign keys
+            statements.append(("DELETE FROM loan_archive WHERE book_id = %s", (book_id,)))
+        statements.append(("DELETE FROM books WHERE book_id = %s", (book_id,)))
+        return self._execute_logged(statements, len(statements) - 1, 'book', 'delete', book_id)
+
+    def _book_filter(self, title, author, status):
+        join, conditions, params, rank, rank_params = self._text_search(
+            'books', 'book_id', {'title': title, 'author': author}
+        )
+        if status:
+            conditions.append("books.status = %s")
+            params.append(status)
+        return join, conditions, params, rank, rank_params
+
+    def search_books(self, title="", author="", status=""):
+        """Searches the catalog (a list of Book records); title/author words match as prefixes, best first."""
+        join, conditions, params, rank, rank_params = self._book_filter(title, author, status)
+        query = f"SELECT {self._book_columns()} FROM books{join} WHERE 1=1"
+        for condition in conditions:
+            query += f" AND {condition}"
+        query += f" ORDER BY {rank}, books.title" if rank else " ORDER BY books.title"
+        return self.execute_query(query, tuple(params + rank_params), fetch='all', model=Book)
+
+    def page_books(self, title="", author="", status="", after=None, before=None, limit=PAGE_SIZE):
+        """
+        Returns one page of matching books in (title, book_id) order; see _keyset_page.
+        Searches are alphabetical too, not ranked like search_books: the search cache
+        narrows cached pages in memory and change-feed rows are placed by title, and both
+        rely on the list order not depending on the search text.
+        """
+        join, conditions, params, _, _ = self._book_filter(title, author, status)
+        select = f"SELECT {self._book_columns()} FROM books{join}"
+        return self._keyset_page(select, conditions, params, 'books.title', 'books.book_id', after, before, limit, Book)
+
+    def stream_books(self, title="", author="", status="", chunk_rows=STREAM_CHUNK_ROWS):
+        """
+        Streams every matching book in (title, book_id) order, the order of the book list.
+        :return: A generator of lists of Book records.
+        """
+        # Built before iteration starts, so schema lookups don't need a second connection
+        join, conditions, params, _, _ = self._book_filter(title, author, status)
+        query = f"SELECT {self._book_columns()} FROM books{join}"
+        query += " WHERE " + (" AND ".join(conditions) or "1=1") + " ORDER BY books.title, books.book_id"
+        return self.stream_query(query, tuple(params), chunk_rows, Book)
+
+    # --- Bulk Loading ---
+    def bulk_insert(self, table, columns, rows, batch_size=IMPORT_BATCH_SIZE, commit_every=IMPORT_COMMIT_EVERY,
+                    on_rejected=None, on_progress=None):
+        """
+        Streams rows into a table with batched executemany() calls on one connection.
+        Memory use is bounded by batch_size whatever the number of rows.
+        :param rows: Iterable of (line_no, values) pairs; values are in columns order.
+        :param on_rejected: Called with (line_no, values, error) for rows the database refused.
+        :param on_progress: Called with the number of rows committed so far after each commit.
+        :return: The number of rows committed.
+        """
+        query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+        stat_key = {'books': 'total_books', 'members': 'total_members'}.get(table)
+        track_stats = stat_key is not None and self._has_stats()  # Checked before borrowing a connection
+        entity = {'books': 'book', 'members': 'member'}.get(table)
+        track_changes = entity is not None and self._has_change_log()
+        add_copies = table == 'books' and self._has_copies()
+        try:
+            conn = self.pool.acquire()
+        except (self.backend.Error, PoolTimeoutError) as err:
+            self.report_error("Database Error", f"Failed to connect to database: {err}")
+            return 0
+
+        cursor = None
+        healthy = True
+        committed = 0
+        try:
+            cursor = conn.cursor()
+            rows = iter(rows)
+            pending = 0
+            if add_copies:
+                cursor.execute("SELECT COALESCE(MAX(book_id), 0) FROM books")
+                last_book_id = cursor.fetchone()[0]
+            conn.start_transaction()
+            while True:
+                batch = list(islice(rows, batch_size))
+                if batch:
+                    pending += self._insert_batch(cursor, query, batch, on_rejected)
+                if pending and (pending >= commit_every or not batch):
+                    if add_copies:
+                        # Each imported book is a title with one copy (the counters' default)
+                        cursor.execute(
+                            "INSERT INTO copies (book_id) SELECT book_id FROM books WHERE book_id > %s "
+                            "AND NOT EXISTS (SELECT 1 FROM copies WHERE copies.book_id = books.book_id)",
+                            (last_book_id,)
+                        )
+                        cursor.execute("SELECT COALESCE(MAX(book_id), 0) FROM books")
+                        last_book_id = cursor.fetchone()[0]
+                    if track_stats:
+                        cursor.execute(STAT_ADJUST, (pending, stat_key))
+                    if track_changes:
+                        # One entry per commit: terminals reload the list rather than fetch each row
+                        self._log_changes(cursor, entity, 'bulk', [0])
+                    conn.commit()
+                    committed += pending
+                    pending = 0
+                    if on_progress:
+                        on_progress(committed)
+                    if batch:
+                        conn.start_transaction()
+                if not batch:
+                    break
+            conn.commit()
+        except self.backend.Error as err:
+            healthy = self._rollback(conn)
+            self.report_error("Import Error", f"Import stopped after {committed} rows: {err}")
+        finally:
+            if cursor is not None:
+                cursor.close()
+            self.pool.release(conn, discard=not healthy)
+        return committed
+
+    def _insert_batch(self, cursor, query, batch, on_rejected):
+        """Inserts one batch; if the database refuses it, retries row by row to isolate the bad rows."""
+        cursor.execute("SAVEPOINT bulk_batch")
+        try:
+            cursor.executemany(query, [values for _, values in batch])
+            cursor.execute("RELEASE SAVEPOINT bulk_batch")
+            return len(batch)
+        except self.backend.Error:
+            cursor.execute("ROLLBACK TO SAVEPOINT bulk_batch")
+
+        inserted = 0
+        for line_no, values in batch:
+            cursor.execute("SAVEPOINT bulk_row")
+            try:
+                cursor.execute(query, values)
+                cursor.execute("RELEASE SAVEPOINT bulk_row")
+                inserted += 1
+            except self.backend.Error as err:
+                cursor.execute("ROLLBACK TO SAVEPOINT bulk_row")
+                if on_rejected:
+                    on_rejected(line_no, values, str(err))
+        cursor.execute("RELEASE SAVEPOINT bulk_batch")
+        return inserted
+
+    # --- Member Management ---
+    def add_member(self, name, email, phone):
+        query = "INSERT INTO members (name, email, phone) VALUES (%s, %s, %s)"
+        return self._execute_logged([(query, (name, email, phone))] + self._stat_changes(total_members=1),
+                                    0, 'member', 'insert')
+
+    def update_member(self, member_id, name, email, phone):
+        query = "UPDATE members SET name = %s, email = %s, phone = %s WHERE member_id = %s"
+        return self._execute_logged([(query, (name, email, phone, member_id))], 0, 'member', 'update', member_id)
+
+    def delete_member(self, member_id):
+        # Check if member has issued books first
+        check_query = "SELECT COUNT(*) as count FROM issued_books WHERE member_id = %s AND return_date IS NULL"
+        result = self.execute_query(check_query, (member_id,), fetch='one')
+        if result and result['count'] > 0:
+            self.report_error("Error", "Cannot delete member. They have outstanding books.")
+            return 0
+        
+        statements = [("DELETE FROM members WHERE member_id = %s", (member_id,))]
+        if self._has_loan_archive():
+            # Their loan history goes too (see delete_book)
+            statements.insert(0, ("DELETE FROM loan_archive WHERE member_id = %s", (member_id,)))
+        if self._has_stats():
+            statements.insert(0, (
+                "UPDATE library_stats SET stat_value = stat_value - "
+                "(SELECT COUNT(*) FROM members WHERE member_id = %s) WHERE stat_key = 'total_members'", (member_id,)
+            ))
+        return self._execute_logged(statements, len(statements) - 1, 'member', 'delete', member_id)
+
+    def search_members(self, name="", email=""):
+        """Searches members (a list of Member records); name/email words match as prefixes, best first."""
+        join, conditions, params, rank, rank_params = self._text_search(
+            'members', 'member_id', {'name': name, 'email': email}
+        )
+        query = f"SELECT members.member_id, members.name, members.email, members.phone FROM members{join} WHERE 1=1"
+        for condition in conditions:
+            query += f" AND {condition}"
+        query += f" ORDER BY {rank}, members.name" if rank else " ORDER BY members.name"
+        return self.execute_query(query, tuple(params + rank_params), fetch='all', model=Member)
+
+    def page_members(self, name="", email="", after=None, before=None, limit=PAGE_SIZE):
+        """
+        Returns one page of matching members in (name, member_id) order, searched or not
+        (alphabetical by design, see page_books); see _keyset_page.
+        """
+        join, conditions, params, _, _ = self._text_search(
+            'members', 'member_id', {'name': name, 'email': email}
+        )
+        select = f"SELECT members.member_id, members.name, members.email, members.phone FROM members{join}"
+        return self._keyset_page(select, conditions, params, 'members.name', 'members.member_id', after, before, limit,
+                                 Member)
+
+    def stream_members(self, name="", email="", chunk_rows=STREAM_CHUNK_ROWS):
+        """
+        Streams every matching member in (name, member_id) order.
+        :return: A generator of lists of Member records.
+        """
+        join, conditions, params, _, _ = self._text_search(
+            'members', 'member_id', {'name': name, 'email': email}
+        )
+        query = f"SELECT members.member_id, members.name, members.email, members.phone FROM members{join}"
+        query += " WHERE " + (" AND ".join(conditions) or "1=1") + " ORDER BY members.name, members.member_id"
+        return self.stream_query(query, tuple(params), chunk_rows, Member)
+
+    # --- Issue/Return Management ---
+    # Checkouts and returns work on a batch of books in one transaction with a
+    # fixed number of set-based statements, however many books are involved.
+    # A copy of each title is claimed by a conditional UPDATE of the title's
+    # available_copies counter, whose row count is checked, so two desks can
+    # never issue more copies than there are; the copy itself is then taken
+    # while the title's row is locked. A unique index on open loans per copy
+    # (migration 13) backs this up in the schema. Before the title/copy split
+    # the book row is the copy, and status is the counter.
+    # issue_book/return_book are the single-book case of the same code path.
+    @staticmethod
+    def _placeholders(values):
+        return ', '.join(['%s'] * len(values))
+
+    def issue_books(self, book_ids, member_id):
+        """
+        Issues a copy of each of several books to one member in a single transaction.
+        :return: A list of {'book_id', 'result', 'copy_id', 'due_date', 'available'} dicts in book_ids
+                 order, where result is 'issued', 'unavailable' or 'not_found' and available is the
+                 number of copies left on the shelf (None if not found); None if the transaction failed.
+        """
+        book_ids = list(dict.fromkeys(book_ids))  # Drop duplicates, keep order
+        if not book_ids:
+            return []
+        # Settings and the member check run before the transaction, so no locks are held meanwhile
+        try:
+            loan_days = int(self.get_setting('loan_duration_days'))
+        except (TypeError, ValueError) as err:
+            self.report_error("Settings Error", f"Invalid loan duration setting: {err}")
+            return None
+        member = self.execute_query("SELECT member_id FROM members WHERE member_id = %s", (member_id,), fetch='one')
+        if not member:
+            self.report_error("Error", f"Member ID {member_id} does not exist.")
+            return None
+        track_stats = self._has_stats()
+        track_changes = self._has_change_log()
+        copies = self._has_copies()
+        issue_date = date.today()
+        due_date = issue_date + timedelta(days=loan_days)
+        in_list = self._placeholders(book_ids)
+        if copies:
+            # status is assigned first, so it sees the count before the claim on every backend
+            claim = ("UPDATE books SET status = CASE WHEN available_copies > 1 THEN 'Available' ELSE 'Issued' END, "
+                     "available_copies = available_copies - 1 WHERE book_id IN ({}) AND available_copies > 0")
+            available_copies = "available_copies"
+        else:
+            claim = "UPDATE books SET status = 'Issued' WHERE book_id IN ({}) AND status = 'Available'"
+            available_copies = "CASE WHEN status = 'Available' THEN 1 ELSE 0 END"
+
+        def checkout(cursor):
+            # 1. Fast path: one conditional UPDATE claims a copy of every book that still has one
+            cursor.execute("SAVEPOINT checkout")
+            cursor.execute(claim.format(in_list), tuple(book_ids))
+            if cursor.rowcount == len(book_ids):
+                issued = book_ids
+            else:
+                # Some books were unavailable or missing: undo the claim, then lock the
+                # requested rows and claim exactly the ones that are available
+                cursor.execute("ROLLBACK TO SAVEPOINT checkout")
+                cursor.execute(
+                    f"SELECT book_id, {available_copies} FROM books WHERE book_id IN ({in_list}){self.backend.lock_clause}",
+                    tuple(book_ids)
+                )
+                shelf = dict(cursor.fetchall())
+                issued = [book_id for book_id in book_ids if shelf.get(book_id, 0) > 0]
+                if issued:
+                    cursor.execute(claim.format(self._placeholders(issued)), tuple(issued))
+                    if cursor.rowcount != len(issued):
+                        # Can't happen while the rows are locked; run the checkout again if it does
+                        raise ConflictError("book status changed during checkout")
+            cursor.execute("RELEASE SAVEPOINT checkout")
+
+            copy_ids = {book_id: book_id for book_id in issued}
+            if issued and copies:
+                # 2. Take a copy of each claimed book off the shelf (the titles' rows are locked now)
+                cursor.execute(
+                    f"SELECT book_id, MIN(copy_id) FROM copies WHERE book_id IN ({self._placeholders(issued)}) "
+                    f"AND status = 'Available' GROUP BY book_id{self.backend.lock_clause}",
+                    tuple(issued)
+                )
+                copy_ids = dict(cursor.fetchall())
+                if len(copy_ids) != len(issued):
+                    raise ValueError("copy counters don't match the copies on the shelf")
+                cursor.execute(
+                    f"UPDATE copies SET status = 'Issued' "
+                    f"WHERE copy_id IN ({self._placeholders(copy_ids)}) AND status = 'Available'",
+                    tuple(copy_ids.values())
+                )
+                if cursor.rowcount != len(issued):
+                    raise ValueError("copy counters don't match the copies on the shelf")
+
+            if issued:
+                # 3. Record the issues
+                if copies:
+                    cursor.executemany(
+                        "INSERT INTO issued_books (book_id, copy_id, member_id, issue_date, due_date) "
+                        "VALUES (%s, %s, %s, %s, %s)",
+                        [(book_id, copy_ids[book_id], member_id, issue_date, due_date) for book_id in issued]
+                    )
+                else:
+                    cursor.executemany(
+                        "INSERT INTO issued_books (book_id, member_id, issue_date, due_date) VALUES (%s, %s, %s, %s)",
+                        [(book_id, member_id, issue_date, due_date) for book_id in issued]
+                    )
+            # 4. Copies left on the shelf, for the callers' lists
+            cursor.execute(f"SELECT book_id, {available_copies} FROM books WHERE book_id IN ({in_list})",
+                           tuple(book_ids))
+            shelf = dict(cursor.fetchall())
+            if issued:
+                # 5. Update the dashboard counters and the change log (last, so the shared
+                # counter rows are locked briefly)
+                if track_stats:
+                    cursor.execute(STAT_ADJUST, (len(issued), 'issued_books'))
+                if track_changes:
+                    self._log_changes(cursor, 'book', 'update', issued)
+            return copy_ids, shelf
+
+        outcome = self._transact(checkout, "Failed to issue books")
+        if outcome is None:
+            return None
+
+        copy_ids, shelf = outcome
+        results = []
+        for book_id in book_ids:
+            if book_id in copy_ids:
+                result = 'issued'
+            elif book_id in shelf:
+                result = 'unavailable'
+            else:
+                result = 'not_found'
+            results.append({'book_id': book_id, 'result': result, 'copy_id': copy_ids.get(book_id),
+                            'due_date': due_date if result == 'issued' else None, 'available': shelf.get(book_id)})
+        return results
+
+    def issue_book(self, book_id, member_id):
+        results = self.issue_books([book_id], member_id)
+        if not results:
+            return 0
+        if results[0]['result'] != 'issued':
+            self.report_error("Error", "Book is not available for issue.")
+            return 0
+        return 1
+
+    def return_books(self, book_ids, member_id=None):
+        """
+        Returns a copy of each of several books in a single transaction and works out their fines.
+        :param member_id: Return that member's copies; otherwise, of a book with several copies out,
+                          the one that was due back first.
+        :return: A list of {'book_id', 'result', 'copy_id', 'days_overdue', 'fine', 'available'} dicts in
+                 book_ids order, where result is 'returned' or 'not_issued' and available is the number of
+                 copies on the shelf (None if the book doesn't exist); None if the transaction failed.
+        """
+        book_ids = list(dict.fromkeys(book_ids))
+        if not book_ids:
+            return []
+        # Settings come from the cache, before a connection is borrowed
+        try:
+            fine_per_day = float(self.get_setting('fine_per_day'))
+        except (TypeError, ValueError) as err:
+            self.report_error("Settings Error", f"Invalid fine setting: {err}")
+            return None
+        track_stats = self._has_stats()
+        track_changes = self._has_change_log()
+        copies = self._has_copies()
+        return_date = date.today()
+        in_list = self._placeholders(book_ids)
+        if copies:
+            available_copies = "available_copies"
+            shelve = ("UPDATE books SET status = 'Available', available_copies = available_copies + 1 "
+                      "WHERE book_id IN ({})")
+        else:
+            available_copies = "CASE WHEN status = 'Available' THEN 1 ELSE 0 END"
+            shelve = "UPDATE books SET status = 'Available' WHERE book_id IN ({})"
+
+        def check_in(cursor):
+            # 1. Find and lock the open issue records, the earliest due first
+            query = (f"SELECT book_id, issue_id, due_date, {'copy_id' if copies else 'book_id'} FROM issued_books "
+                     f"WHERE book_id IN ({in_list}) AND return_date IS NULL")
+            params = tuple(book_ids)
+            if member_id is not None:
+                query += " AND member_id = %s"
+                params += (member_id,)
+            cursor.execute(query + f" ORDER BY due_date, issue_id{self.backend.lock_clause}", params)
+            open_loans = {}
+            for book_id, issue_id, due_date, copy_id in cursor.fetchall():
+                open_loans.setdefault(book_id, (issue_id, due_date, copy_id))
+            if not open_loans:
+                cursor.execute(f"SELECT book_id, {available_copies} FROM books WHERE book_id IN ({in_list})",
+                               tuple(book_ids))
+                return open_loans, dict(cursor.fetchall())
+
+            # 2. Close the issue records; the condition makes a concurrent second return a no-op
+            issue_ids = [issue_id for issue_id, _, _ in open_loans.values()]
+            cursor.execute(
+                f"UPDATE issued_books SET return_date = %s "
+                f"WHERE issue_id IN ({self._placeholders(issue_ids)}) AND return_date IS NULL",
+                (return_date, *issue_ids)
+            )
+            if cursor.rowcount != len(issue_ids):
+                # The loans are locked above, so this shouldn't happen; run the return again if it does
+                raise ConflictError("loan was closed by another desk")
+
+            # 3. Put all the returned copies back on the shelf at once (one per book)
+            if copies:
+                copy_ids = [copy_id for _, _, copy_id in open_loans.values()]
+                cursor.execute(f"UPDATE copies SET status = 'Available' WHERE copy_id IN ({self._placeholders(copy_ids)})",
+                               tuple(copy_ids))
+            cursor.execute(shelve.format(self._placeholders(open_loans)), tuple(open_loans))
+            cursor.execute(f"SELECT book_id, {available_copies} FROM books WHERE book_id IN ({in_list})",
+                           tuple(book_ids))
+            shelf = dict(cursor.fetchall())
+
+            # 4. Update the dashboard counters
+            if track_stats:
+                overdue = sum(1 for _, due_date, _ in open_loans.values() if return_date > due_date)
+                cursor.execute(STAT_ADJUST, (-len(open_loans), 'issued_books'))
+                if overdue:
+                    cursor.execute(STAT_ADJUST, (-overdue, 'overdue_books'))
+            if track_changes:
+                self._log_changes(cursor, 'book', 'update', list(open_loans))
+            return open_loans, shelf
+
+        outcome = self._transact(check_in, "Failed to return books")
+        if outcome is None:
+            return None
+
+        # Calculate the fines
+        open_loans, shelf = outcome
+        results = []
+        for book_id in book_ids:
+            if book_id not in open_loans:
+                results.append({'book_id': book_id, 'result': 'not_issued', 'copy_id': None, 'days_overdue': 0,
+                                'fine': 0, 'available': shelf.get(book_id)})
+                continue
+            _, due_date, copy_id = open_loans[book_id]
+            days_overdue = max((return_date - due_date).days, 0)
+            results.append({'book_id': book_id, 'result': 'returned', 'copy_id': copy_id,
+                            'days_overdue': days_overdue, 'fine': days_overdue * fine_per_day,
+                            'available': shelf.get(book_id)})
+        return results
+
+    def return_book(self, book_id, member_id=None):
+        results = self.return_books([book_id], member_id)
+        if not results:
+            return None
+        if results[0]['result'] != 'returned':
+            self.report_error("Error", "This book is not currently issued.")
+            return None
+        return results[0]['fine']
+
+    def stream_loans(self, open_only=False, chunk_rows=STREAM_CHUNK_ROWS):
+        """
+        Streams the loan records, archived ones included, in issue_id order, or only the open ones.
+        :return: A generator of lists of Loan records.
+        """
+        columns = self._loan_columns()
+        query = f"SELECT {columns} FROM issued_books"
+        if open_only:
+            query += " WHERE return_date IS NULL"
+        elif self._has_loan_archive():  # Checked before iteration starts; see stream_books
+            query += f" UNION ALL SELECT {columns} FROM loan_archive"
+        return self.stream_query(query + " ORDER BY issue_id", None, chunk_rows, Loan)
+
+    # --- Loan Archive ---
+    # Returned loans are moved from issued_books to loan_archive once they are
+    # old (see loan_archive.py), so the open-loan lookups work on a table that
+    # doesn't grow with the library's history. Queries over all loans read both.
+    def member_loans(self, member_id):
+        """A member's loans, archived ones included, newest first (a list of Loan records)."""
+        columns = self._loan_columns()
+        query = f"SELECT {columns} FROM issued_books WHERE member_id = %s"
+        params = (member_id,)
+        if self._has_loan_archive():
+            query += f" UNION ALL SELECT {columns} FROM loan_archive WHERE member_id = %s"
+            params += (member_id,)
+        return self.execute_query(query + " ORDER BY issue_id DESC", params, fetch='all', model=Loan)
+
+    def archive_loan_batch(self, returned_before, batch_size=ARCHIVE_BATCH_SIZE):
+        """
+        Moves up to batch_size loans returned before a day from issued_books to loan_archive,
+        oldest first, in one transaction.
+        :return: The number of loans moved, or None if that failed (the error is reported).
+        """
+        if not self._has_loan_archive():
+            self.report_error("Archive Error", "This database has no loan archive yet; run migrations.py first.")
+            return None
+        columns = "issue_id, book_id, member_id, issue_date, due_date, return_date"
+        if self._has_copies():
+            columns += ", copy_id"
+
+        def move(cursor):
+            # A range scan of idx_issued_open_due: open loans (no return date) are never in range
+            cursor.execute(
+                f"SELECT issue_id FROM issued_books WHERE return_date < %s "
+                f"ORDER BY return_date LIMIT %s{self.backend.lock_clause}", (returned_before, batch_size)
+            )
+            issue_ids = [row[0] for row in cursor.fetchall()]
+            if not issue_ids:
+                return 0
+            selected = f"issue_id IN ({self._placeholders(issue_ids)})"
+            cursor.execute(f"INSERT INTO loan_archive ({columns}) SELECT {columns} FROM issued_books WHERE {selected}",
+                           tuple(issue_ids))
+            cursor.execute(f"DELETE FROM issued_books WHERE {selected}", tuple(issue_ids))
+            return len(issue_ids)
+        return self._transact(move, "Failed to archive loans")
+
+    # --- Fines ---
+    def scan_overdue_loans(self, as_of, on_chunk, chunk_rows=FINE_CHUNK_ROWS):
+        """
+        Reads every open loan that is overdue on as_of with one streamed range scan of
+        idx_issued_open_due, and passes them to on_chunk as lists of up to chunk_rows
+        (issue_id, member_id, due_date) tuples.
+        :return: The number of loans read, or None if the query failed.
+        """
+        query = "SELECT issue_id, member_id, due_date FROM issued_books WHERE return_date IS NULL AND due_date < %s"
+        read = 0
+        try:
+            for rows in self.stream_query(query, (as_of,), chunk_rows):
+                on_chunk(rows)
+                read += len(rows)
+        except (self.backend.Error, PoolTimeoutError) as err:
+            self.report_error("Query Error", f"Failed to read overdue loans: {err}")
+            return None
+        return read
+
+    def fine_report(self, as_of=None, top=FINE_REPORT_TOP):
+        """Outstanding fines on all overdue loans; see fine_report.build_report."""
+        import fine_report
+        return fine_report.build_report(self, as_of, top)
+
+    # --- Statistics ---
+    def _count_stats(self):
+        """Counts the dashboard statistics directly from the tables (four scans)."""
+        stats = {
+            'total_books': 0, 'total_members': 0, 
+            'issued_books': 0, 'overdue_books': 0
+        }
+        # Books are counted as physical copies
+        inventory = "copies" if self._has_copies() else "books"
+        query_books = f"SELECT COUNT(*) as count FROM {inventory}"
+        query_members = "SELECT COUNT(*) as count FROM members"
+        query_issued = f"SELECT COUNT(*) as count FROM {inventory} WHERE status = 'Issued'"
+        # Today's date is passed in rather than using CURDATE() so the query runs on every backend
+        query_overdue = "SELECT COUNT(*) as count FROM issued_books WHERE return_date IS NULL AND due_date < %s"
+        
+        stats['total_books'] = self.execute_query(query_books, fetch='one')['count']
+        stats['total_members'] = self.execute_query(query_members, fetch='one')['count']
+        stats['issued_books'] = self.execute_query(query_issued, fetch='one')['count']
+        stats['overdue_books'] = self.execute_query(query_overdue, (date.today(),), fetch='one')['count']
+        
+        return stats
+
+    def get_dashboard_stats(self):
+        """Reads the materialized dashboard counters in a single query."""
+        if not self._has_stats():
+            return self._count_stats()
+        rows = self.execute_query("SELECT stat_key, stat_value FROM library_stats", fetch='all') or []
+        stats = {row['stat_key']: int(row['stat_value']) for row in rows}
+        # Loans only become overdue when the date changes, so the counter is
+        # exact as long as it has been recomputed today.
+        if stats.get('overdue_as_of', 0) < date.today().toordinal():
+            stats['overdue_books'] = self.refresh_overdue_count()
+        for key in ('overdue_as_of', 'change_version', 'change_log_floor'):
+            stats.pop(key, None)
+        return stats
+
+    def refresh_overdue_count(self):
+        """Recomputes the overdue counter from the open loans. Returns the new count."""
+        today = date.today()
+        self.execute_transaction([
+            ("UPDATE library_stats SET stat_value = (SELECT COUNT(*) FROM issued_books "
+             "WHERE return_date IS NULL AND due_date < %s) WHERE stat_key = 'overdue_books'", (today,)),
+            ("UPDATE library_stats SET stat_value = %s WHERE stat_key = 'overdue_as_of'", (today.toordinal(),)),
+        ])
+        result = self.execute_query("SELECT stat_value FROM library_stats WHERE stat_key = 'overdue_books'", fetch='one')
+        return int(result['stat_value']) if result else 0
+
+    def verify_stats(self, repair=False):
+        """
+        Consistency check: compares the counters against real counts.
+        :param repair: If True, overwrite counters that disagree with the real counts.
+        :return: A dict of {stat: (counter value, actual count)} for every mismatch.
+        """
+        if not self._has_stats():
+            return {}
+        actual = self._count_stats()
+        rows = self.execute_query("SELECT stat_key, stat_value FROM library_stats", fetch='all') or []
+        stored = {row['stat_key']: int(row['stat_value']) for row in rows}
+        mismatches = {key: (stored.get(key), value) for key, value in actual.items() if stored.get(key) != value}
+        if repair and mismatches:
+            self.execute_transaction([
+                ("UPDATE library_stats SET stat_value = %s WHERE stat_key = %s", (value, key))
+                for key, (_, value) in mismatches.items()
+            ])
+        return mismatches
+
+    # --- Change Feed ---
+    # Other terminals poll get_changes() and apply only the rows that changed
+    # (see the change_log migration and _log_changes).
+    def get_changes(self, since=None, limit=CHANGE_POLL_LIMIT):
+        """
+        Returns the rows changed after version since. When nothing changed this is a single
+        primary-key read of the version counter; otherwise one index range scan of the log follows.
+        :param since: The version the caller is up to date with; None to learn the current version.
+        :return: {'version', 'reset', 'changes': [(entity, entity_id, action), ...] oldest first}, where
+                 reset means the caller must reload everything instead (it is further behind than the
+                 compacted log, or more than limit rows changed); None if there is no change log or
+                 the query failed. Errors aren't reported: this is polled, and the next poll retries.
+        """
+        if not self._has_change_log():
+            return None
+        rows = []
+        try:
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute("SELECT stat_key, stat_value FROM library_stats "
+                                   "WHERE stat_key IN ('change_version', 'change_log_floor')")
+                    counters = {key: int(value) for key, value in cursor.fetchall()}
+                    version = counters.get('change_version', 0)
+                    # A version counter that went backwards means the log was rebuilt
+                    reset = since is not None and (since > version or since < counters.get('change_log_floor', 0))
+                    if since is not None and not reset and since < version:
+                        cursor.execute(
+                            "SELECT version, entity, entity_id, action FROM change_log "
+                            "WHERE version > %s ORDER BY version LIMIT %s", (since, limit + 1)
+                        )
+                        rows = cursor.fetchall()
+                finally:
+                    cursor.close()
+        except (self.backend.Error, PoolTimeoutError):
+            return None
+        if len(rows) > limit:
+            return {'version': version, 'reset': True, 'changes': []}
+        if rows:
+            version = max(version, rows[-1][0])  # Changes committed since the counter was read
+        return {'version': version, 'reset': reset,
+                'changes': [(entity, entity_id, action) for _, entity, entity_id, action in rows]}
+
+    def compact_change_log(self, keep=CHANGE_LOG_KEEP):
+        """Deletes all but the latest keep versions of the change log. Returns the number of entries deleted."""
+        if not self._has_change_log():
+            return 0
+
+        def compact(cursor):
+            cursor.execute("SELECT stat_value FROM library_stats WHERE stat_key = 'change_version'")
+            floor = int(cursor.fetchone()[0]) - keep
+            cursor.execute("SELECT stat_value FROM library_stats WHERE stat_key = 'change_log_floor'")
+            if floor <= int(cursor.fetchone()[0]):
+                return 0
+            cursor.execute("DELETE FROM change_log WHERE version <= %s", (floor,))
+            deleted = cursor.rowcount
+            # Pollers further behind than the floor are told to reload
+            cursor.execute("UPDATE library_stats SET stat_value = %s WHERE stat_key = 'change_log_floor'", (floor,))
+            return deleted
+        return self._transact(compact, "Failed to compact the change log") or 0
+
+    def get_books(self, book_ids):
+        """Returns the Book records with these ids (missing ones are left out)."""
+        if not book_ids:
+            return []
+        query = f"SELECT {self._book_columns()} FROM books WHERE book_id IN ({self._placeholders(book_ids)})"
+        return self.execute_query(query, tuple(book_ids), fetch='all', model=Book)
+
+    def get_members(self, member_ids):
+        """Returns the Member records with these ids (missing ones are left out)."""
+        if not member_ids:
+            return []
+        query = (f"SELECT member_id, name, email, phone FROM members "
+                 f"WHERE member_id IN ({self._placeholders(member_ids)})")
+        return self.execute_query(query, tuple(member_ids), fetch='all', model=Member)
+    
+    # --- Settings ---
+    def get_settings(self):
+        """
+        Returns all settings from an in-process cache. The cache is loaded once and
+        re-checked every SETTINGS_CHECK_INTERVAL seconds against the settings_version
+        stamp, so changes made by other terminals are picked up with one cheap lookup.
+        :return: A copy of the cached dict, so callers can't change the cache.
+        """
+        with self._settings_lock:
+            now = time.monotonic()
+            if self._settings is not None and now - self._settings_checked < SETTINGS_CHECK_INTERVAL:
+                return dict(self._settings)
+            self._settings_checked = now
+            if self._settings is not None:
+                version = self.execute_query(
+                    "SELECT setting_value FROM settings WHERE setting_key = 'settings_version'", fetch='one'
+                )
+                # No stamp yet (never bumped) still counts: the first update_setting adds one
+                if (version['setting_value'] if version else None) == self._settings_version:
+                    return dict(self._settings)
+            rows = self.execute_query("SELECT setting_key, setting_value FROM settings", fetch='all')
+            if rows is None:
+                return dict(self._settings or {})
+            self._settings = {row['setting_key']: row['setting_value'] for row in rows}
+            self._settings_version = self._settings.get('settings_version')
+            return dict(self._settings)
+
+    def get_setting(self, key):
+        return self.get_settings().get(key)
+    
+    def update_setting(self, key, value):
+        def work(cursor):
+            cursor.execute("UPDATE settings SET setting_value = %s WHERE setting_key = %s", (value, key))
+            count = cursor.rowcount
+            if not count:
+                return count  # Unknown key (or the same value): nothing for other terminals to reload
+            # Bump the version stamp in the same transaction so other terminals reload.
+            # The column is text, so the number is read and written back as a string;
+            # the stamp is created if it is missing.
+            cursor.execute(
+                f"SELECT setting_value FROM settings WHERE setting_key = 'settings_version'{self.backend.lock_clause}"
+            )
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute("INSERT INTO settings (setting_key, setting_value) VALUES ('settings_version', '1')")
+            else:
+                stamp = int(row[0]) + 1 if str(row[0]).isdigit() else 1
+                cursor.execute("UPDATE settings SET setting_value = %s WHERE setting_key = 'settings_version'",
+                               (str(stamp),))
+            return count
+
+        count = self._transact(work, "Failed to update setting")
+        with self._settings_lock:
+            self._settings = None  # Reload on next access
+        return count or 0
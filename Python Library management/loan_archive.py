@@ -0,0 +1,154 @@
+# loan_archive.py
+
+import argparse
+import sys
+import time
+from datetime import date, timedelta
+
+# --- Loan Archiving ---
+# issued_books keeps every loan ever made, but the circulation queries
+# (return_book, delete_member, the overdue count) only care about open loans.
+# This job moves loans returned more than a given number of days ago to
+# loan_archive in small transactions (DatabaseManager.archive_loan_batch),
+# pausing between them so desks issuing and returning books aren't kept
+# waiting on locks. Re-running it later picks up where it left off.
+#
+# On MySQL the archive can also be partitioned by return year (--partition).
+# Partitioned InnoDB tables can't have foreign keys, so those are dropped;
+# DatabaseManager.delete_book/delete_member delete archived loans themselves.
+
+
+def archive_loans(db, older_than_days=None, batch_size=None, pause=None, progress=None):
+    """
+    Moves every loan returned more than older_than_days ago to the archive, a batch at a time.
+    :param pause: Seconds to wait between batches.
+    :param progress: Optional callable(loans_moved), called after each batch.
+    :return: A summary dict (moved, batches, seconds, rows_per_second, returned_before, complete);
+             complete is False if a batch failed (the error is reported).
+    """
+    from library_db import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, ARCHIVE_BATCH_PAUSE
+
+    older_than_days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    batch_size = batch_size or ARCHIVE_BATCH_SIZE
+    pause = ARCHIVE_BATCH_PAUSE if pause is None else pause
+    returned_before = date.today() - timedelta(days=older_than_days)
+
+    moved = batches = 0
+    complete = True
+    start = time.perf_counter()
+    while True:
+        count = db.archive_loan_batch(returned_before, batch_size)
+        if count is None:
+            complete = False
+            break
+        moved += count
+        batches += 1
+        if progress:
+            progress(moved)
+        if count < batch_size:
+            break
+        time.sleep(pause)
+
+    seconds = time.perf_counter() - start
+    return {
+        'moved': moved,
+        'batches': batches,
+        'seconds': round(seconds, 2),
+        'rows_per_second': round(moved / seconds) if seconds else moved,
+        'returned_before': returned_before,
+        'complete': complete,
+    }
+
+
+# --- Partitioning (MySQL) ---
+def _year_partitions(cursor):
+    # Years that have their own partition, or None if the table isn't partitioned
+    cursor.execute(
+        "SELECT partition_description FROM information_schema.partitions "
+        "WHERE table_schema = DATABASE() AND table_name = 'loan_archive' AND partition_name IS NOT NULL"
+    )
+    bounds = [row[0].decode() if isinstance(row[0], bytes) else row[0] for row in cursor.fetchall()]
+    if not bounds:
+        return None
+    return sorted(int(bound) - 1 for bound in bounds if bound != 'MAXVALUE')
+
+
+def _partition_list(years):
+    partitions = [f"PARTITION p{year} VALUES LESS THAN ({year + 1})" for year in years]
+    return ', '.join(partitions + ["PARTITION p_future VALUES LESS THAN MAXVALUE"])
+
+
+def partition_by_year(db, through_year, partition=True):
+    """
+    Gives every return year up to through_year its own archive partition; later years share
+    p_future. Only MySQL partitions tables.
+    :param partition: If False, only a table that is already partitioned gets new years.
+    :return: The years added, or None if the archive isn't (and wasn't to be) partitioned.
+    """
+    if db.backend.name != 'mysql':
+        if partition:
+            raise ValueError("Only the MySQL backend supports partitioning")
+        return None
+    with db.pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            years = _year_partitions(cursor)
+            if years is None:
+                if not partition:
+                    return None
+                # From the earliest return already archived or still to be archived
+                first = through_year
+                for table in ('loan_archive', 'issued_books'):
+                    cursor.execute(f"SELECT MIN(YEAR(return_date)) FROM `{table}`")
+                    first = min(first, cursor.fetchone()[0] or through_year)
+                added = list(range(first, through_year + 1))
+                cursor.execute("ALTER TABLE `loan_archive` DROP FOREIGN KEY `fk_loan_archive_book`, "
+                               "DROP FOREIGN KEY `fk_loan_archive_member`")
+                cursor.execute(f"ALTER TABLE `loan_archive` PARTITION BY RANGE (YEAR(return_date)) "
+                               f"({_partition_list(added)})")
+                return added
+            added = list(range(years[-1] + 1 if years else through_year, through_year + 1))
+            if added:
+                # Splits the catch-all partition; only rows of the new years move
+                cursor.execute(f"ALTER TABLE `loan_archive` REORGANIZE PARTITION p_future INTO "
+                               f"({_partition_list(added)})")
+            return added
+        finally:
+            cursor.close()
+
+
+if __name__ == '__main__':
+    from library_db import (
+        DatabaseManager, DB_BACKEND, DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, SQLITE_PATH,
+        ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, ARCHIVE_BATCH_PAUSE
+    )
+    from db_backends import get_backend
+
+    parser = argparse.ArgumentParser(description="Move old returned loans from issued_books to loan_archive.")
+    parser.add_argument('--older-than-days', type=int, default=ARCHIVE_AFTER_DAYS,
+                        help="archive loans returned more than this many days ago")
+    parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE, help="loans moved per transaction")
+    parser.add_argument('--pause', type=float, default=ARCHIVE_BATCH_PAUSE, help="seconds between batches")
+    parser.add_argument('--partition', action='store_true', help="MySQL: partition the archive by return year")
+    parser.add_argument('--backend', choices=['mysql', 'sqlite'], default=DB_BACKEND)
+    parser.add_argument('--sqlite-path', default=SQLITE_PATH)
+    args = parser.parse_args()
+
+    db = DatabaseManager(get_backend(args.backend, DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, args.sqlite_path))
+    db.error_handler = lambda title, message: print(f"{title}: {message}", file=sys.stderr)
+    try:
+        # A partitioned archive gets a partition for each year before its loans arrive
+        through_year = (date.today() - timedelta(days=args.older_than_days)).year
+        added = partition_by_year(db, through_year, partition=args.partition)
+        if added:
+            print(f"Added archive partitions for {', '.join(map(str, added))}.")
+        summary = archive_loans(db, args.older_than_days, args.batch_size, args.pause,
+                                progress=lambda moved: print(f"\r  {moved} loans moved", end='', flush=True))
+    except Exception as err:
+        sys.exit(f"\nArchiving failed: {err}")
+    finally:
+        db.disconnect()
+    print(f"\nArchived {summary['moved']} loans returned before {summary['returned_before']} "
+          f"in {summary['batches']} batches, {summary['seconds']}s ({summary['rows_per_second']} rows/s).")
+    if not summary['complete']:
+        sys.exit(1)
@@ -0,0 +1,390 @@
+# migrations.py
+
+import time
+from datetime import date, datetime
+
+# --- Schema Migrations ---
+# Each migration evolves an existing database in place. Steps must be
+# idempotent: MySQL commits DDL implicitly, so a step interrupted half-way is
+# simply re-run on the next attempt. Applied versions are recorded in the
+# `schema_version` table.
+
+VERSION_TABLE = (
+    "CREATE TABLE IF NOT EXISTS `schema_version` ("
+    "  `version` INT PRIMARY KEY,"
+    "  `description` VARCHAR(255) NOT NULL,"
+    "  `applied_at` DATETIME NOT NULL,"
+    "  `duration_ms` INT NOT NULL"
+    ") ENGINE=InnoDB"
+)
+
+
+# --- Helpers ---
+def index_exists(cursor, backend, table, index):
+    if backend.name == 'mysql':
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s",
+            (table, index)
+        )
+    else:
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND name = %s", (index,))
+    return cursor.fetchone()[0] > 0
+
+def create_index(cursor, backend, table, index, columns, unique=False):
+    """Creates an index unless one with that name already exists."""
+    if not index_exists(cursor, backend, table, index):
+        kind = "UNIQUE INDEX" if unique else "INDEX"
+        cursor.execute(f"CREATE {kind} `{index}` ON `{table}` ({', '.join(columns)})")
+
+def column_type(cursor, backend, table, column):
+    """Returns the declared type of a column, e.g. "varchar(20)", or None if there is no such column."""
+    if backend.name == 'mysql':
+        cursor.execute(
+            "SELECT column_type FROM information_schema.columns "
+            "WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s",
+            (table, column)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return row[0].decode() if isinstance(row[0], bytes) else row[0]
+    cursor.execute(f"PRAGMA table_info(`{table}`)")
+    for row in cursor.fetchall():
+        if row[1] == column:
+            return row[2].lower()
+    return None
+
+def add_column(cursor, backend, table, column, definition):
+    """Adds a column unless the table already has it."""
+    if column_type(cursor, backend, table, column) is None:
+        cursor.execute(f"ALTER TABLE `{table}` ADD COLUMN `{column}` {definition}")
+
+
+# --- Migration Steps ---
+def _compact_book_status(cursor, backend):
+    # An ENUM is stored as a single byte but still reads and compares as the
+    # original strings, so no query has to change. SQLite has no ENUM type
+    # and stores the short strings as they are.
+    if backend.name != 'mysql':
+        return
+    if not column_type(cursor, backend, 'books', 'status').startswith('enum'):
+        cursor.execute(
+            "ALTER TABLE `books` MODIFY `status` ENUM('Available', 'Issued') NOT NULL DEFAULT 'Available'"
+        )
+
+def _index_open_loans_by_book(cursor, backend):
+    # return_book: WHERE book_id = ? AND return_date IS NULL
+    create_index(cursor, backend, 'issued_books', 'idx_issued_book_open', ['book_id', 'return_date'])
+
+def _index_open_loans_by_member(cursor, backend):
+    # delete_member: WHERE member_id = ? AND return_date IS NULL
+    create_index(cursor, backend, 'issued_books', 'idx_issued_member_open', ['member_id', 'return_date'])
+
+def _index_overdue_loans(cursor, backend):
+    # Overdue count: WHERE return_date IS NULL AND due_date < ? (covered by the index)
+    create_index(cursor, backend, 'issued_books', 'idx_issued_open_due', ['return_date', 'due_date'])
+
+def _index_book_listing(cursor, backend):
+    # search_books orders by title, optionally filtered on status
+    create_index(cursor, backend, 'books', 'idx_books_status_title', ['status', 'title'])
+    create_index(cursor, backend, 'books', 'idx_books_title', ['title'])
+
+def _index_member_listing(cursor, backend):
+    # search_members orders by name
+    create_index(cursor, backend, 'members', 'idx_members_name', ['name'])
+
+def _fulltext_search(cursor, backend):
+    # Word-prefix search for search_books/search_members. MySQL keeps its
+    # FULLTEXT indexes up to date by itself; on SQLite, external-content FTS5
+    # tables are kept in sync with the base tables by triggers.
+    if backend.name == 'mysql':
+        for table, column in (('books', 'title'), ('books', 'author'), ('members', 'name'), ('members', 'email')):
+            if not index_exists(cursor, backend, table, f'ft_{table}_{column}'):
+                cursor.execute(f"ALTER TABLE `{table}` ADD FULLTEXT INDEX `ft_{table}_{column}` (`{column}`)")
+        # Short (below innodb_ft_min_token_size) search terms fall back to a
+        # prefix match on the column itself
+        create_index(cursor, backend, 'books', 'idx_books_author', ['author'])
+        create_index(cursor, backend, 'members', 'idx_members_email_prefix', ['email'])
+        return
+
+    for table, key, columns in (('books', 'book_id', ['title', 'author']), ('members', 'member_id', ['name', 'email'])):
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = %s", (f'{table}_fts',)
+        )
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE `{table}_fts` USING fts5({', '.join(columns)}, "
+                f"content='{table}', content_rowid='{key}', prefix='2 3')"
+            )
+        cols = ', '.join(columns)
+        new_values = ', '.join(f'new.{c}' for c in columns)
+        old_values = ', '.join(f'old.{c}' for c in columns)
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS `{table}_fts_insert` AFTER INSERT ON `{table}` BEGIN "
+            f"INSERT INTO {table}_fts (rowid, {cols}) VALUES (new.{key}, {new_values}); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS `{table}_fts_delete` AFTER DELETE ON `{table}` BEGIN "
+            f"INSERT INTO {table}_fts ({table}_fts, rowid, {cols}) VALUES ('delete', old.{key}, {old_values}); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS `{table}_fts_update` AFTER UPDATE OF {cols} ON `{table}` BEGIN "
+            f"INSERT INTO {table}_fts ({table}_fts, rowid, {cols}) VALUES ('delete', old.{key}, {old_values}); "
+            f"INSERT INTO {table}_fts (rowid, {cols}) VALUES (new.{key}, {new_values}); END"
+        )
+        cursor.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+
+def _library_stats(cursor, backend):
+    # Materialized dashboard counters, kept up to date by DatabaseManager in
+    # the same transaction as every change. Re-running the step recounts them.
+    cursor.execute(backend.translate_ddl(
+        "CREATE TABLE IF NOT EXISTS `library_stats` ("
+        "  `stat_key` VARCHAR(50) PRIMARY KEY,"
+        "  `stat_value` BIGINT NOT NULL"
+        ") ENGINE=InnoDB"
+    ))
+    today = date.today()
+    cursor.execute("DELETE FROM library_stats")
+    cursor.execute("INSERT INTO library_stats SELECT 'total_books', COUNT(*) FROM books")
+    cursor.execute("INSERT INTO library_stats SELECT 'total_members', COUNT(*) FROM members")
+    cursor.execute("INSERT INTO library_stats SELECT 'issued_books', COUNT(*) FROM books WHERE status = 'Issued'")
+    cursor.execute(
+        "INSERT INTO library_stats SELECT 'overdue_books', COUNT(*) FROM issued_books "
+        "WHERE return_date IS NULL AND due_date < %s", (today,)
+    )
+    # Day (as an ordinal) the overdue count was last recomputed
+    cursor.execute("INSERT INTO library_stats VALUES ('overdue_as_of', %s)", (today.toordinal(),))
+
+def _settings_version(cursor, backend):
+    # Version stamp bumped by update_setting so terminals can cheaply tell
+    # whether their cached settings are stale
+    cursor.execute("SELECT COUNT(*) FROM settings WHERE setting_key = 'settings_version'")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute("INSERT INTO settings (setting_key, setting_value) VALUES ('settings_version', '1')")
+
+def _one_open_loan_per_book(cursor, backend):
+    # Schema-level guard against issuing the same copy twice: at most one loan
+    # per book may have no return date. SQLite supports this directly as a
+    # partial index; MySQL indexes a generated column that is NULL (and so
+    # exempt from the unique check) once the loan is returned.
+    if backend.name == 'mysql':
+        if column_type(cursor, backend, 'issued_books', 'open_book_id') is None:
+            cursor.execute(
+                "ALTER TABLE `issued_books` ADD COLUMN `open_book_id` INT "
+                "AS (IF(`return_date` IS NULL, `book_id`, NULL)) VIRTUAL"
+            )
+        create_index(cursor, backend, 'issued_books', 'uq_issued_open_loan', ['open_book_id'], unique=True)
+    elif not index_exists(cursor, backend, 'issued_books', 'uq_issued_open_loan'):
+        cursor.execute("CREATE UNIQUE INDEX `uq_issued_open_loan` ON `issued_books` (book_id) WHERE return_date IS NULL")
+
+def _change_log(cursor, backend):
+    # Feed of changed rows, so terminals can bring their open lists up to date
+    # without reloading them. DatabaseManager writes the entries in the same
+    # transaction as each change, numbered by the 'change_version' counter.
+    # Entries up to 'change_log_floor' have been compacted away.
+    cursor.execute(backend.translate_ddl(
+        "CREATE TABLE IF NOT EXISTS `change_log` ("
+        "  `change_id` INT AUTO_INCREMENT PRIMARY KEY,"
+        "  `version` BIGINT NOT NULL,"
+        "  `entity` VARCHAR(10) NOT NULL,"
+        "  `entity_id` INT NOT NULL,"
+        "  `action` VARCHAR(10) NOT NULL"
+        ") ENGINE=InnoDB"
+    ))
+    create_index(cursor, backend, 'change_log', 'idx_change_log_version', ['version'])
+    for key in ('change_version', 'change_log_floor'):
+        cursor.execute("SELECT COUNT(*) FROM library_stats WHERE stat_key = %s", (key,))
+        if cursor.fetchone()[0] == 0:
+            cursor.execute("INSERT INTO library_stats (stat_key, stat_value) VALUES (%s, 0)", (key,))
+
+def _loan_archive(cursor, backend):
+    # Returned loans are moved here by loan_archive.py, so issued_books only
+    # holds open and recent loans. The columns and foreign keys match
+    # issued_books; issue_ids stay unique across both tables (AUTO_INCREMENT
+    # never reuses them). The primary key includes return_date so that the
+    # table can be partitioned by year later (loan_archive.py --partition).
+    cursor.execute(backend.translate_ddl(
+        "CREATE TABLE IF NOT EXISTS `loan_archive` ("
+        "  `issue_id` INT NOT NULL,"
+        "  `book_id` INT NOT NULL,"
+        "  `member_id` INT NOT NULL,"
+        "  `issue_date` DATE NOT NULL,"
+        "  `due_date` DATE NOT NULL,"
+        "  `return_date` DATE NOT NULL,"
+        "  PRIMARY KEY (`issue_id`, `return_date`),"
+        "  CONSTRAINT `fk_loan_archive_book` FOREIGN KEY (`book_id`) REFERENCES `books`(`book_id`) ON DELETE CASCADE,"
+        "  CONSTRAINT `fk_loan_archive_member` FOREIGN KEY (`member_id`) "
+        "REFERENCES `members`(`member_id`) ON DELETE CASCADE"
+        ") ENGINE=InnoDB"
+    ))
+    # MySQL creates these along with the foreign keys; SQLite needs them for
+    # the cascades and for member history
+    create_index(cursor, backend, 'loan_archive', 'fk_loan_archive_book', ['book_id'])
+    create_index(cursor, backend, 'loan_archive', 'fk_loan_archive_member', ['member_id'])
+
+def create_missing_copies(cursor):
+    """
+    Gives every book without copies a single copy in the book's status, points loans
+    without a copy at their book's copy and recounts the per-title copy counters.
+    Before the title/copy split each books row was one physical item, so this is exact for
+    data loaded the old way (e.g. by generate_dataset.py). Every step is safe to repeat, so
+    an interrupted run is completed by the next one.
+    """
+    # New copies are numbered by AUTO_INCREMENT: once copies have been added
+    # the usual way, book_ids may already be taken as copy_ids
+    cursor.execute(
+        "INSERT INTO copies (book_id, status) SELECT book_id, status FROM books "
+        "WHERE NOT EXISTS (SELECT 1 FROM copies WHERE copies.book_id = books.book_id) ORDER BY book_id"
+    )
+    for table in ('issued_books', 'loan_archive'):
+        cursor.execute(
+            f"UPDATE `{table}` SET copy_id = (SELECT MIN(copy_id) FROM copies WHERE copies.book_id = `{table}`.book_id) "
+            f"WHERE copy_id IS NULL"
+        )
+    _recount_copies(cursor)
+
+def _recount_copies(cursor):
+    cursor.execute(
+        "UPDATE books SET "
+        "total_copies = (SELECT COUNT(*) FROM copies WHERE copies.book_id = books.book_id), "
+        "available_copies = (SELECT COUNT(*) FROM copies WHERE copies.book_id = books.book_id "
+        "AND copies.status = 'Available'), "
+        "status = CASE WHEN EXISTS (SELECT 1 FROM copies WHERE copies.book_id = books.book_id "
+        "AND copies.status = 'Available') THEN 'Available' ELSE 'Issued' END"
+    )
+
+def _fold_duplicate_titles(cursor):
+    # Rows with the same title, author and genre become copies of the lowest book_id
+    cursor.execute(
+        "SELECT books.book_id, keepers.book_id FROM books JOIN ("
+        "  SELECT MIN(book_id) AS book_id, title, author, COALESCE(genre, '') AS genre FROM books"
+        "  GROUP BY title, author, COALESCE(genre, '') HAVING COUNT(*) > 1"
+        ") keepers ON books.title = keepers.title AND books.author = keepers.author "
+        "AND COALESCE(books.genre, '') = keepers.genre AND books.book_id <> keepers.book_id"
+    )
+    duplicates = [(keeper, book_id) for book_id, keeper in cursor.fetchall()]
+    if not duplicates:
+        return 0
+    for table in ('copies', 'issued_books', 'loan_archive'):
+        cursor.executemany(f"UPDATE `{table}` SET book_id = %s WHERE book_id = %s", duplicates)
+    cursor.executemany("DELETE FROM books WHERE book_id = %s", [(book_id,) for _, book_id in duplicates])
+    _recount_copies(cursor)
+    # Open book lists show the folded rows until they reload
+    cursor.execute("UPDATE library_stats SET stat_value = stat_value + 1 WHERE stat_key = 'change_version'")
+    cursor.execute("INSERT INTO change_log (version, entity, entity_id, action) "
+                   "SELECT stat_value, 'book', 0, 'bulk' FROM library_stats WHERE stat_key = 'change_version'")
+    return len(duplicates)
+
+def _title_copy_split(cursor, backend):
+    # A books row becomes a title, and each physical item a row in copies.
+    # Loans record the copy they are for. books keeps the number of copies
+    # and of available ones, so availability never needs a scan of copies,
+    # and its status is 'Available' while any copy is, which keeps the
+    # status filter (and its index) meaning "can be issued".
+    add_column(cursor, backend, 'books', 'total_copies', "INT NOT NULL DEFAULT 1")
+    add_column(cursor, backend, 'books', 'available_copies', "INT NOT NULL DEFAULT 1")
+    cursor.execute(backend.translate_ddl(
+        "CREATE TABLE IF NOT EXISTS `copies` ("
+        "  `copy_id` INT AUTO_INCREMENT PRIMARY KEY,"
+        "  `book_id` INT NOT NULL,"
+        "  `status` VARCHAR(20) NOT NULL DEFAULT 'Available',"
+        "  FOREIGN KEY (`book_id`) REFERENCES `books`(`book_id`) ON DELETE CASCADE"
+        ") ENGINE=InnoDB"
+    ))
+    # issue_books: an available copy of a title
+    create_index(cursor, backend, 'copies', 'idx_copies_book_status', ['book_id', 'status'])
+    if backend.name == 'mysql' and not column_type(cursor, backend, 'copies', 'status').startswith('enum'):
+        cursor.execute("ALTER TABLE `copies` MODIFY `status` ENUM('Available', 'Issued') NOT NULL DEFAULT 'Available'")
+    for table in ('issued_books', 'loan_archive'):
+        add_column(cursor, backend, table, 'copy_id', "INT")
+
+    create_missing_copies(cursor)
+
+    # One open loan per copy now, instead of per book (migration 10)
+    if backend.name == 'mysql':
+        if index_exists(cursor, backend, 'issued_books', 'uq_issued_open_loan'):
+            cursor.execute("ALTER TABLE `issued_books` DROP INDEX `uq_issued_open_loan`")
+        if column_type(cursor, backend, 'issued_books', 'open_book_id') is not None:
+            cursor.execute("ALTER TABLE `issued_books` DROP COLUMN `open_book_id`")
+        if column_type(cursor, backend, 'issued_books', 'open_copy_id') is None:
+            cursor.execute(
+                "ALTER TABLE `issued_books` ADD COLUMN `open_copy_id` INT "
+                "AS (IF(`return_date` IS NULL, `copy_id`, NULL)) VIRTUAL"
+            )
+        create_index(cursor, backend, 'issued_books', 'uq_issued_open_copy', ['open_copy_id'], unique=True)
+    else:
+        if index_exists(cursor, backend, 'issued_books', 'uq_issued_open_loan'):
+            cursor.execute("DROP INDEX `uq_issued_open_loan`")
+        if not index_exists(cursor, backend, 'issued_books', 'uq_issued_open_copy'):
+            cursor.execute("CREATE UNIQUE INDEX `uq_issued_open_copy` ON `issued_books` (copy_id) "
+                           "WHERE return_date IS NULL")
+
+    # Last: a title may only have several open loans once the index above allows it
+    folded = _fold_duplicate_titles(cursor)
+    if folded:
+        print(f"folded {folded} duplicate books into copies: ", end='', flush=True)
+
+
+MIGRATIONS = [
+    (1, "Store book status as a compact ENUM", _compact_book_status),
+    (2, "Index open loans by book", _index_open_loans_by_book),
+    (3, "Index open loans by member", _index_open_loans_by_member),
+    (4, "Index open loans by due date", _index_overdue_loans),
+    (5, "Index book listing by status and title", _index_book_listing),
+    (6, "Index member listing by name", _index_member_listing),
+    (7, "Full-text indexes for book and member search", _fulltext_search),
+    (8, "Materialized dashboard counters", _library_stats),
+    (9, "Settings version stamp", _settings_version),
+    (10, "At most one open loan per book", _one_open_loan_per_book),
+    (11, "Change log for keeping terminals in sync", _change_log),
+    (12, "Archive table for returned loans", _loan_archive),
+    (13, "Split titles from copies, folding duplicate books", _title_copy_split),
+]
+
+
+# --- Runner ---
+def current_version(cursor):
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+    return cursor.fetchone()[0]
+
+def migrate(cursor, backend, target=None):
+    """
+    Applies all pending migrations up to target (default: latest), timing each step.
+    :return: A list of (version, seconds) for the migrations that were applied.
+    """
+    cursor.execute(backend.translate_ddl(VERSION_TABLE))
+    version = current_version(cursor)
+    applied = []
+    for step_version, description, step in MIGRATIONS:
+        if step_version <= version or (target is not None and step_version > target):
+            continue
+        print(f"Applying migration {step_version} ({description}): ", end='', flush=True)
+        start = time.perf_counter()
+        step(cursor, backend)
+        elapsed = time.perf_counter() - start
+        cursor.execute(
+            "INSERT INTO schema_version (version, description, applied_at, duration_ms) VALUES (%s, %s, %s, %s)",
+            (step_version, description, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), int(elapsed * 1000))
+        )
+        print(f"OK ({elapsed:.2f}s)")
+        applied.append((step_version, elapsed))
+    if not applied:
+        print(f"Schema is up to date (version {version}).")
+    return applied
+
+
+if __name__ == '__main__':
+    from db_backends import get_backend
+    from db_setup_advanced import DB_BACKEND, DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, SQLITE_PATH
+
+    backend = get_backend(DB_BACKEND, DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, SQLITE_PATH)
+    db = backend.connect()
+    cursor = db.cursor()
+    try:
+        migrate(cursor, backend)
+    except backend.Error as err:
+        print(f"\nMigration failed: {err}")
+    finally:
+        cursor.close()
+        db.close()
@@ -0,0 +1,304 @@
+# query_stats.py
+
+import json
+import re
+import threading
+import time
+from datetime import datetime
+
+# --- Query Instrumentation ---
+# Pooled connections are wrapped so that every statement is timed, from
+# execute() until its result has been fetched. Statements are grouped by their
+# normalized text (literals and IN lists collapsed), and for each group we keep
+# call counts, a latency histogram and the number of rows returned or
+# affected. Statements slower than a threshold are written to a slow-query log
+# together with their EXPLAIN output. The EXPLAIN waits until the cursor is
+# closed: on MySQL an unbuffered result still being read would make it fail
+# (and the statement being timed with it).
+
+# Upper bounds (ms) of the latency histogram buckets; a final bucket holds the rest
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+EXPLAIN_INTERVAL = 60        # Seconds before the same slow statement is EXPLAINed again
+MAX_LOGGED_PARAMS = 300      # Characters of the parameters written to the slow log
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'REPLACE')
+
+_SPACE = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER = re.compile(r"(?<![\w`])\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN \(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_normalized = {}
+
+
+def normalize(sql):
+    """Reduces a statement to its shape, e.g. "... WHERE book_id IN (...) LIMIT ?"."""
+    shape = _normalized.get(sql)
+    if shape is None:
+        shape = _SPACE.sub(' ', sql).strip()
+        shape = _STRING.sub('?', shape).replace('%s', '?')
+        shape = _NUMBER.sub('?', shape)
+        shape = _IN_LIST.sub('IN (...)', shape)
+        if len(_normalized) > 5000:  # Statements built per request (IN lists) would grow it forever
+            _normalized.clear()
+        _normalized[sql] = shape
+    return shape
+
+
+class Histogram:
+    """Latency histogram with fixed buckets plus count/total/max."""
+
+    __slots__ = ('buckets', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        index = 0
+        while index < len(LATENCY_BUCKETS_MS) and ms > LATENCY_BUCKETS_MS[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given percentile (capped at the maximum seen)."""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                bound = LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'total_ms': round(self.total, 3),
+            'mean_ms': round(self.total / self.count, 3) if self.count else 0.0,
+            'p50_ms': round(self.percentile(0.50), 3),
+            'p95_ms': round(self.percentile(0.95), 3),
+            'p99_ms': round(self.percentile(0.99), 3),
+            'max_ms': round(self.max, 3),
+        }
+
+
+class QueryStats:
+    """Thread-safe per-statement counters shared by all pooled connections."""
+
+    def __init__(self, slow_ms=None, slow_log=None):
+        self.slow_ms = slow_ms     # None disables the slow-query log
+        self.slow_log = slow_log
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._statements = {}  # normalized statement -> {'latency', 'rows', 'errors', 'slow'}
+            self._acquire = Histogram()
+            self._explained = {}   # normalized statement -> time of the last EXPLAIN
+            self._since = time.time()
+
+    def record(self, sql, seconds, rows, error=False):
+        """Records one execution. Returns True if it should go to the slow-query log."""
+        ms = seconds * 1000
+        key = normalize(sql)
+        slow = self.slow_ms is not None and ms >= self.slow_ms
+        with self._lock:
+            entry = self._statements.get(key)
+            if entry is None:
+                entry = self._statements[key] = {'latency': Histogram(), 'rows': 0, 'errors': 0, 'slow': 0}
+            entry['latency'].add(ms)
+            entry['rows'] += max(rows, 0)
+            entry['errors'] += error
+            entry['slow'] += slow
+        return slow
+
+    def record_acquire(self, seconds):
+        """Records the time taken to borrow a connection from the pool."""
+        with self._lock:
+            self._acquire.add(seconds * 1000)
+
+    def should_explain(self, sql):
+        """Limits EXPLAIN captures to one per statement every EXPLAIN_INTERVAL seconds."""
+        if not sql.lstrip().upper().startswith(EXPLAINABLE):
+            return False
+        key = normalize(sql)
+        now = time.monotonic()
+        with self._lock:
+            if now - self._explained.get(key, -EXPLAIN_INTERVAL) < EXPLAIN_INTERVAL:
+                return False
+            self._explained[key] = now
+        return True
+
+    def log_slow(self, sql, params, seconds, rows, plan=None):
+        """Appends a slow statement (and its plan, if captured) to the slow-query log."""
+        if not self.slow_log:
+            return
+        lines = [
+            f"# {datetime.now():%Y-%m-%d %H:%M:%S}  {seconds * 1000:.1f} ms  rows={rows}",
+            _SPACE.sub(' ', sql).strip() + ';',
+        ]
+        if params:
+            lines.append(f"-- params: {repr(params)[:MAX_LOGGED_PARAMS]}")
+        if plan is not None:
+            lines.append("-- plan:")
+            lines.extend(f"--   {row}" for row in plan)
+        with self._log_lock:
+            try:
+                with open(self.slow_log, 'a', encoding='utf-8') as f:
+                    f.write('\n'.join(lines) + '\n\n')
+            except OSError:
+                pass  # Diagnostics must never break the query that triggered them
+
+    def snapshot(self):
+        """Returns the counters as a JSON-friendly dict, statements sorted by total time."""
+        with self._lock:
+            statements = [
+                dict(statement=key, rows=entry['rows'], errors=entry['errors'], slow=entry['slow'],
+                     histogram=list(entry['latency'].buckets), **entry['latency'].summary())
+                for key, entry in self._statements.items()
+            ]
+            acquire = self._acquire.summary()
+            since = self._since
+        statements.sort(key=lambda entry: entry['total_ms'], reverse=True)
+        return {
+            'since': datetime.fromtimestamp(since).isoformat(timespec='seconds'),
+            'uptime_s': round(time.time() - since, 1),
+            'slow_query_ms': self.slow_ms,
+            'histogram_bounds_ms': list(LATENCY_BUCKETS_MS),
+            'acquire': acquire,
+            'statements': statements,
+        }
+
+    def dump(self, path, extra=None):
+        """Writes a snapshot (plus any extra sections, e.g. pool stats) to a JSON file."""
+        snapshot = self.snapshot()
+        snapshot.update(extra or {})
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, indent=2)
+
+
+# --- Connection Wrappers ---
+class InstrumentedConnection:
+    """Wraps a backend connection so that its cursors report to a QueryStats."""
+
+    def __init__(self, conn, stats, explain_prefix):
+        self._conn = conn
+        self.stats = stats
+        self.explain_prefix = explain_prefix
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self)
+
+    def explain(self, sql, params):
+        """Returns the plan of a statement as a list of rows, or None if it can't be captured now."""
+        if getattr(self._conn, 'unread_result', False):
+            return None  # Another cursor is still reading a MySQL result
+        cursor = None
+        try:
+            cursor = self._conn.cursor()
+            cursor.execute(self.explain_prefix + sql, params or ())
+            return [tuple(row) for row in cursor.fetchall()]
+        except Exception:
+            return None
+        finally:
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+
+    def __getattr__(self, name):
+        # start_transaction, commit, rollback, is_connected, close, ...
+        return getattr(self._conn, name)
+
+
+class InstrumentedCursor:
+    """
+    Times each statement from execute() until the next statement or close(), so
+    the time spent fetching an unbuffered result is included. Slow statements
+    are logged once the cursor is closed.
+    """
+
+    def __init__(self, cursor, connection):
+        self._cursor = cursor
+        self._conn = connection
+        self._pending = None  # [sql, params, seconds, rows] of the statement being fetched
+        self._slow = []       # (sql, params, seconds, rows, explain) waiting for close()
+
+    def _finish(self):
+        if self._pending is None:
+            return
+        sql, params, seconds, rows = self._pending
+        self._pending = None
+        stats = self._conn.stats
+        if stats.record(sql, seconds, rows):
+            self._slow.append((sql, params, seconds, rows, stats.should_explain(sql)))
+
+    def _log_slow(self):
+        # Runs after the cursor is closed, when its result can no longer be in the way
+        slow, self._slow = self._slow, []
+        for sql, params, seconds, rows, explain in slow:
+            plan = self._conn.explain(sql, params) if explain else None
+            self._conn.stats.log_slow(sql, params, seconds, rows, plan)
+
+    def execute(self, query, params=()):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            self._cursor.execute(query, params)
+        except Exception:
+            self._conn.stats.record(query, time.perf_counter() - start, 0, error=True)
+            raise
+        elapsed = time.perf_counter() - start
+        # Row count: affected rows for writes, fetched rows (counted below) for queries
+        rows = self._cursor.rowcount if self._cursor.description is None else 0
+        self._pending = [query, params, elapsed, rows]
+
+    def executemany(self, query, seq_of_params):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            self._cursor.executemany(query, seq_of_params)
+        except Exception:
+            self._conn.stats.record(query, time.perf_counter() - start, 0, error=True)
+            raise
+        self._conn.stats.record(query, time.perf_counter() - start, self._cursor.rowcount)
+
+    def _fetch(self, fetch, *args):
+        start = time.perf_counter()
+        result = fetch(*args)
+        if self._pending is not None:
+            self._pending[2] += time.perf_counter() - start
+            if isinstance(result, list):
+                self._pending[3] += len(result)
+            elif result is not None:
+                self._pending[3] += 1
+        return result
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._fetch(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+    def close(self):
+        self._finish()
+        try:
+            self._cursor.close()
+        finally:
+            self._log_slow()
+
+    def __getattr__(self, name):
+        # rowcount, lastrowid, description, ...
+        return getattr(self._cursor, name)
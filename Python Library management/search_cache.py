@@ -0,0 +1,162 @@
+# search_cache.py
+
+import re
+import string
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# --- Search Result Cache ---
+# Search-as-you-type sends a query for almost every keystroke, and most of
+# those queries only narrow the previous one ("harr" -> "harry"). SearchCache
+# keeps the first page of recent searches in an LRU. When a new search narrows
+# a cached result set that was complete (it had fewer rows than a page), the
+# cached rows are filtered in memory instead of going back to the database.
+# The in-memory filter reproduces the database search (see
+# DatabaseManager._text_search and text_search_mode). Where it can't do that
+# exactly (the MySQL collations), only exact repeats are answered from the
+# cache.
+
+SEARCH_CACHE_ENTRIES = 64    # Result sets kept, least recently used dropped first
+SEARCH_CACHE_TTL = 30        # Seconds before a cached result set is considered stale
+
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+# --- In-Memory Matching ---
+def _fts_fold(text):
+    # Approximates the FTS5 unicode61 tokenizer: lower case, diacritics removed
+    decomposed = unicodedata.normalize('NFD', text.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def _field_matcher(mode, text):
+    """Returns predicate(value) for one searched column, or None if mode can't be matched in memory."""
+    terms = re.findall(r'\w+', text)
+    if mode == 'sqlite-like' or (mode == 'sqlite-fts5' and not terms):
+        # LIKE '%text%': SQLite compares ASCII letters case-insensitively, everything else exactly
+        needle = text.translate(_ASCII_LOWER)
+        return lambda value: needle in (value or '').translate(_ASCII_LOWER)
+    if mode == 'sqlite-fts5':
+        if any('_' in term for term in terms):
+            return None  # The tokenizer splits these into phrases
+        prefixes = [_fts_fold(term) for term in terms]
+
+        def match(value):
+            tokens = re.findall(r'[^\W_]+', _fts_fold(value or ''))
+            return all(any(token.startswith(prefix) for token in tokens) for prefix in prefixes)
+        return match
+    return None
+
+
+def make_matcher(mode, text_filters, exact_filters):
+    """
+    Builds predicate(record) that reproduces a database search in memory.
+    :param mode: DatabaseManager.text_search_mode().
+    :param text_filters: {field: search text}; empty texts match everything.
+    :param exact_filters: {field: value} compared for equality; empty values match everything.
+    :return: The predicate, or None if the search can't be reproduced exactly.
+    """
+    checks = []
+    for field, text in text_filters.items():
+        if text:
+            match = _field_matcher(mode, text)
+            if match is None:
+                return None
+            checks.append((field, match))
+    for field, value in exact_filters.items():
+        if value:
+            checks.append((field, value.__eq__))
+    return lambda record: all(match(getattr(record, field)) for field, match in checks)
+
+
+def narrows(mode, old, new):
+    """True if every row matching the search text new also matches old (new extends old)."""
+    if not old:
+        return True
+    if not new.startswith(old):
+        return False
+    # A text without words is a substring match; adding a word turns it into a word-prefix match
+    return mode != 'sqlite-fts5' or bool(re.search(r'\w', old))
+
+
+class SearchCache:
+    """LRU of recent search results for one list, answering narrower searches from complete result sets."""
+
+    def __init__(self, text_fields, exact_fields=(), max_entries=SEARCH_CACHE_ENTRIES, ttl=SEARCH_CACHE_TTL):
+        self.text_fields = tuple(text_fields)
+        self.exact_fields = tuple(exact_fields)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.mode = None  # DatabaseManager.text_search_mode(); exact repeats only until it is known
+        self.hits = self.prefix_hits = self.misses = 0
+        self._entries = OrderedDict()  # filter key -> (stored at, rows, complete)
+        self._lock = threading.Lock()  # Pages are stored from worker threads
+
+    def _key(self, filters):
+        return tuple(filters.get(field, '') for field in self.text_fields + self.exact_fields)
+
+    def store(self, filters, rows, complete):
+        """
+        Caches the first page of a search.
+        :param complete: True if the page holds every matching row (it was shorter than the page size).
+        """
+        with self._lock:
+            self._put(self._key(filters), (time.monotonic(), list(rows), complete))
+
+    def _put(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def lookup(self, filters):
+        """
+        Returns the cached first page for a search, filtering a broader complete result set
+        in memory if necessary, or None if the database has to be asked.
+        """
+        key = self._key(filters)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(entry[1])
+
+            broader = self._smallest_superset(key, now)
+            matcher = None
+            if broader is not None:
+                matcher = make_matcher(self.mode, dict(zip(self.text_fields, key)),
+                                       dict(zip(self.exact_fields, key[len(self.text_fields):])))
+            if matcher is None:
+                self.misses += 1
+                return None
+            self.prefix_hits += 1
+            stored_at, rows, _ = broader
+        rows = [row for row in rows if matcher(row)]
+        with self._lock:
+            self._put(key, (stored_at, rows, True))  # Expires with the result set it was filtered from
+        return list(rows)
+
+    def _smallest_superset(self, key, now):
+        # The smallest fresh complete result set that the search narrows
+        best = None
+        text_count = len(self.text_fields)
+        for cached_key, entry in self._entries.items():
+            stored_at, rows, complete = entry
+            if not complete or now - stored_at >= self.ttl:
+                continue
+            if not all(narrows(self.mode, old, new) for old, new in zip(cached_key[:text_count], key[:text_count])):
+                continue
+            if not all(old in ('', new) for old, new in zip(cached_key[text_count:], key[text_count:])):
+                continue
+            if best is None or len(rows) < len(best[1]):
+                best = entry
+        return best
+
+    def clear(self):
+        """Forgets every cached search, e.g. after the rows have changed."""
+        with self._lock:
+            self._entries.clear()
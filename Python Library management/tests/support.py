@@ -0,0 +1,87 @@
+# support.py
+
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+# The modules under test live one directory up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_backends import get_backend
+from library_db import DatabaseManager
+import db_setup_advanced
+import migrations
+
+# --- Test Helpers ---
+# Every test gets a fresh SQLite file in its own temporary directory; nothing
+# here needs a MySQL server or a display.
+
+
+def migrate_library(backend, target=None, create=False):
+    """Applies the migrations up to target (default: all), first creating the tables if create is set."""
+    conn = backend.connect()
+    cursor = conn.cursor()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            if create:
+                db_setup_advanced.create_tables(cursor, backend)
+            migrations.migrate(cursor, backend, target)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def create_library(backend, target=None):
+    """Creates the tables, applies the migrations up to target (default: all) and adds the default settings."""
+    migrate_library(backend, target, create=True)
+    conn = backend.connect()
+    cursor = conn.cursor()
+    try:
+        conn.start_transaction()
+        cursor.execute("INSERT INTO settings (setting_key, setting_value) VALUES ('fine_per_day', '5')")
+        cursor.execute("INSERT INTO settings (setting_key, setting_value) VALUES ('loan_duration_days', '14')")
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+class LibraryTestCase(unittest.TestCase):
+    """Creates a migrated SQLite library database for each test."""
+
+    schema_target = None  # Migration to stop at; None applies them all
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='library-test-')
+        self.path = os.path.join(self.tmpdir, 'library.db')
+        self.backend = get_backend('sqlite', sqlite_path=self.path)
+        create_library(self.backend, self.schema_target)
+        self.errors = []
+        self.db = self.manager()
+
+    def tearDown(self):
+        for db in getattr(self, '_managers', []):
+            db.disconnect()
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def manager(self):
+        """A DatabaseManager (with its own pool) on the test database, like another desk."""
+        db = DatabaseManager(get_backend('sqlite', sqlite_path=self.path))
+        db.error_handler = lambda title, message: self.errors.append(message)
+        self.__dict__.setdefault('_managers', []).append(db)
+        return db
+
+    def query(self, sql, params=None):
+        return self.db.execute_query(sql, params, fetch='all')
+
+    def add_members(self, count):
+        for i in range(count):
+            self.db.add_member(f"Member {i}", f"member{i}@example.com", None)
+        return [row['member_id'] for row in self.query("SELECT member_id FROM members ORDER BY member_id")]
+
+    def book_id(self, title):
+        return self.query("SELECT book_id FROM books WHERE title = %s", (title,))[0]['book_id']
@@ -0,0 +1,149 @@
+# test_circulation.py
+
+import threading
+import unittest
+from unittest import mock
+
+import support
+import library_db
+from library_db import ConflictError
+
+DESKS = 6  # Terminals racing for the same copy
+
+
+class CirculationTest(support.LibraryTestCase):
+    def race(self, action):
+        """Runs action(db, desk) on DESKS terminals at once and returns their results in desk order."""
+        desks = [self.manager() for _ in range(DESKS)]
+        start = threading.Barrier(DESKS)
+        results = [None] * DESKS
+
+        def run(desk):
+            start.wait()
+            results[desk] = action(desks[desk], desk)
+
+        threads = [threading.Thread(target=run, args=(desk,)) for desk in range(DESKS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+        return results
+
+    def shelf(self, book_id):
+        book = self.query("SELECT status, total_copies, available_copies FROM books WHERE book_id = %s", (book_id,))[0]
+        copies = self.query("SELECT status FROM copies WHERE book_id = %s", (book_id,))
+        loans = self.query("SELECT COUNT(*) AS n FROM issued_books WHERE book_id = %s AND return_date IS NULL",
+                           (book_id,))[0]['n']
+        return book, sorted(copy['status'] for copy in copies), loans
+
+    def test_last_copy_is_issued_once(self):
+        self.db.add_book("Dune", "Frank Herbert", "Science Fiction", copies=2)
+        book_id = self.book_id("Dune")
+        members = self.add_members(DESKS + 1)
+        self.assertEqual(self.db.issue_books([book_id], members[-1])[0]['result'], 'issued')
+
+        results = self.race(lambda db, desk: db.issue_books([book_id], members[desk]))
+
+        self.assertEqual(self.errors, [])
+        outcomes = sorted(result[0]['result'] for result in results)
+        self.assertEqual(outcomes, ['issued'] + ['unavailable'] * (DESKS - 1))
+        book, copies, loans = self.shelf(book_id)
+        self.assertEqual((book['status'], book['total_copies'], book['available_copies']), ('Issued', 2, 0))
+        self.assertEqual(copies, ['Issued', 'Issued'])
+        self.assertEqual(loans, 2)
+        self.assertEqual(self.db.verify_stats(), {})
+
+    def test_last_copy_is_returned_once(self):
+        self.db.add_book("Emma", "Jane Austen", "Classic")
+        book_id = self.book_id("Emma")
+        member = self.add_members(1)[0]
+        self.db.issue_books([book_id], member)
+
+        results = self.race(lambda db, desk: db.return_books([book_id]))
+
+        self.assertEqual(self.errors, [])
+        outcomes = sorted(result[0]['result'] for result in results)
+        self.assertEqual(outcomes, ['not_issued'] * (DESKS - 1) + ['returned'])
+        book, copies, loans = self.shelf(book_id)
+        self.assertEqual((book['status'], book['total_copies'], book['available_copies']), ('Available', 1, 1))
+        self.assertEqual(copies, ['Available'])
+        self.assertEqual(loans, 0)
+        self.assertEqual(self.db.verify_stats(), {})
+
+    def test_issue_and_return_race_keeps_counters_exact(self):
+        self.db.add_book("Ulysses", "James Joyce", "Classic")
+        book_id = self.book_id("Ulysses")
+        members = self.add_members(DESKS)
+
+        def desk_work(db, desk):
+            # Half the desks issue the single copy while the other half return it
+            if desk % 2:
+                return db.return_books([book_id])
+            return db.issue_books([book_id], members[desk])
+
+        self.race(desk_work)
+
+        self.assertEqual(self.errors, [])
+        book, copies, loans = self.shelf(book_id)
+        self.assertEqual(book['available_copies'], 1 - loans)
+        self.assertEqual(copies, ['Issued' if loans else 'Available'])
+        self.assertEqual(self.db.verify_stats(), {})
+
+    def test_mixed_batch_issues_only_the_available_books(self):
+        for title in ("Beloved", "Persuasion"):
+            self.db.add_book(title, "Author", "Fiction")
+        beloved, persuasion = self.book_id("Beloved"), self.book_id("Persuasion")
+        first, second = self.add_members(2)
+        self.db.issue_books([persuasion], first)
+
+        results = self.db.issue_books([beloved, persuasion, 9999], second)
+
+        self.assertEqual([result['result'] for result in results], ['issued', 'unavailable', 'not_found'])
+        self.assertEqual(self.shelf(beloved)[2], 1)
+        self.assertEqual(self.shelf(persuasion)[2], 1)
+
+    def test_return_prefers_the_members_copy(self):
+        self.db.add_book("Middlemarch", "George Eliot", "Classic", copies=2)
+        book_id = self.book_id("Middlemarch")
+        first, second = self.add_members(2)
+        first_copy = self.db.issue_books([book_id], first)[0]['copy_id']
+        second_copy = self.db.issue_books([book_id], second)[0]['copy_id']
+        self.assertNotEqual(first_copy, second_copy)
+
+        result = self.db.return_books([book_id], second)[0]
+
+        self.assertEqual((result['result'], result['copy_id'], result['available']), ('returned', second_copy, 1))
+        self.assertEqual(self.db.return_books([book_id], second)[0]['result'], 'not_issued')
+
+
+class TransactionRetryTest(support.LibraryTestCase):
+    def test_conflicts_are_retried(self):
+        attempts = []
+
+        def work(cursor):
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise ConflictError("row changed")
+            return 'done'
+
+        with mock.patch.object(library_db, 'TXN_RETRY_BACKOFF', 0):
+            self.assertEqual(self.db._transact(work), 'done')
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(self.errors, [])
+
+    def test_gives_up_after_the_last_attempt(self):
+        attempts = []
+
+        def work(cursor):
+            attempts.append(1)
+            raise ConflictError("row changed")
+
+        with mock.patch.object(library_db, 'TXN_RETRY_BACKOFF', 0):
+            self.assertIsNone(self.db._transact(work, "Failed"))
+        self.assertEqual(len(attempts), library_db.TXN_RETRIES)
+        self.assertEqual(len(self.errors), 1)
+        self.assertIn("row changed", self.errors[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
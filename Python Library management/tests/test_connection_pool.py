@@ -0,0 +1,75 @@
+# test_connection_pool.py
+
+import threading
+import unittest
+
+import support  # noqa: F401 (puts the library modules on the path)
+from library_db import ConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+
+    def is_connected(self):
+        return self.alive
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.opened = []
+        self.pool = ConnectionPool(self.open, size=2, timeout=0.2, ping_interval=0)
+
+    def open(self):
+        conn = FakeConnection()
+        self.opened.append(conn)
+        return conn
+
+    def test_reuses_released_connections(self):
+        with self.pool.connection() as first:
+            pass
+        with self.pool.connection() as second:
+            self.assertIs(first, second)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_times_out_when_every_connection_is_busy(self):
+        held = [self.pool.acquire(), self.pool.acquire()]
+        with self.assertRaises(PoolTimeoutError):
+            self.pool.acquire()
+        self.assertEqual(self.pool.stats()['timeouts'], 1)
+        for conn in held:
+            self.pool.release(conn)
+
+    def test_waiting_thread_gets_the_released_connection(self):
+        held = [self.pool.acquire(), self.pool.acquire()]
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(self.pool.acquire()))
+        waiter.start()
+        self.pool.release(held[0])
+        waiter.join(1)
+        self.assertEqual(got, [held[0]])
+
+    def test_replaces_dropped_connections(self):
+        with self.pool.connection() as conn:
+            pass
+        conn.alive = False  # The server dropped it while idle
+        with self.pool.connection() as fresh:
+            self.assertIsNot(fresh, conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(self.pool.stats()['reconnects'], 1)
+
+    def test_discards_a_connection_broken_by_an_error(self):
+        with self.assertRaises(RuntimeError):
+            with self.pool.connection() as conn:
+                conn.alive = False
+                raise RuntimeError("query failed")
+        self.assertTrue(conn.closed)
+        self.assertEqual(self.pool.stats()['idle'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
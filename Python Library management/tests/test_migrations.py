@@ -0,0 +1,104 @@
+# test_migrations.py
+
+import unittest
+from datetime import date, timedelta
+
+import support
+import migrations
+
+# Library as it was before the title/copy split: one books row per physical item
+PRE_SPLIT_BOOKS = [
+    # (book_id, title, author, genre, status)
+    (1, "Dune", "Frank Herbert", "Science Fiction", 'Issued'),
+    (2, "Emma", "Jane Austen", None, 'Available'),
+    (3, "Dune", "Frank Herbert", "Science Fiction", 'Available'),
+    (4, "Dune", "Frank Herbert", "Science Fiction", 'Issued'),
+    (5, "Emma", "Jane Austen", None, 'Issued'),
+    (6, "Dune", "Frank Herbert", "Fantasy", 'Available'),  # Another genre: not a duplicate
+]
+
+
+class TitleCopySplitTest(support.LibraryTestCase):
+    schema_target = 12
+
+    def setUp(self):
+        super().setUp()
+        self.members = self.add_members(3)
+        today = date.today()
+        self.db.execute_transaction(
+            [("INSERT INTO books (book_id, title, author, genre, status) VALUES (%s, %s, %s, %s, %s)", row)
+             for row in PRE_SPLIT_BOOKS]
+            + [("INSERT INTO issued_books (book_id, member_id, issue_date, due_date) VALUES (%s, %s, %s, %s)",
+                (book_id, member, today, today + timedelta(days=14)))
+               for book_id, member in ((1, self.members[0]), (4, self.members[1]), (5, self.members[2]))]
+            + [("INSERT INTO loan_archive (issue_id, book_id, member_id, issue_date, due_date, return_date) "
+                "VALUES (%s, %s, %s, %s, %s, %s)", (100, 3, self.members[0], today, today, today))]
+        )
+        self.db.verify_stats(repair=True)  # The rows above went around the counters
+        support.migrate_library(self.backend)
+        self.db = self.manager()  # Sees the new schema version
+
+    def books(self):
+        return {row['book_id']: (row['title'], row['genre'], row['total_copies'], row['available_copies'], row['status'])
+                for row in self.query("SELECT * FROM books")}
+
+    def test_duplicates_fold_into_copies_of_one_title(self):
+        self.assertEqual(self.books(), {
+            1: ("Dune", "Science Fiction", 3, 1, 'Available'),
+            2: ("Emma", None, 2, 1, 'Available'),
+            6: ("Dune", "Fantasy", 1, 1, 'Available'),
+        })
+        copies = self.query("SELECT book_id, status, COUNT(*) AS n FROM copies GROUP BY book_id, status")
+        self.assertEqual({(row['book_id'], row['status']): row['n'] for row in copies},
+                         {(1, 'Issued'): 2, (1, 'Available'): 1, (2, 'Issued'): 1, (2, 'Available'): 1,
+                          (6, 'Available'): 1})
+
+    def test_loans_point_at_issued_copies_of_the_kept_title(self):
+        loans = self.query("SELECT issued_books.book_id, copies.book_id AS copy_book, copies.status "
+                           "FROM issued_books LEFT JOIN copies ON copies.copy_id = issued_books.copy_id")
+        self.assertEqual(sorted(loan['book_id'] for loan in loans), [1, 1, 2])
+        for loan in loans:
+            self.assertEqual((loan['copy_book'], loan['status']), (loan['book_id'], 'Issued'))
+        self.assertEqual(len({row['copy_id'] for row in self.query("SELECT copy_id FROM issued_books")}), 3)
+        archived = self.query("SELECT book_id, copy_id FROM loan_archive")
+        self.assertEqual(archived[0]['book_id'], 1)
+        self.assertIsNotNone(archived[0]['copy_id'])
+
+    def test_counters_match_after_the_fold(self):
+        self.assertEqual(self.db.verify_stats(), {})
+        self.assertEqual(self.db.get_schema_version(), 13)
+
+    def test_migrated_copies_circulate(self):
+        results = self.db.issue_books([1, 2], self.members[0])
+        self.assertEqual([result['result'] for result in results], ['issued', 'issued'])
+        self.assertEqual([result['available'] for result in results], [0, 0])
+        returned = self.db.return_books([1], self.members[1])[0]
+        self.assertEqual((returned['result'], returned['available']), ('returned', 1))
+        self.assertEqual(self.db.verify_stats(), {})
+
+    def test_backfill_is_repeatable_after_new_copies(self):
+        # Copies added the usual way take copy_ids that could equal book_ids of
+        # books loaded later the old way (e.g. by generate_dataset.py)
+        self.db.add_book("Beloved", "Toni Morrison", "Fiction", copies=4)
+        self.db.execute_transaction([
+            ("INSERT INTO books (book_id, title, author, genre) VALUES (%s, %s, %s, %s)",
+             (50, "Old Import", "Someone", None)),
+        ])
+        before = self.query("SELECT copy_id, book_id, status FROM copies ORDER BY copy_id")
+        for _ in range(2):
+            conn = self.backend.connect()
+            cursor = conn.cursor()
+            conn.start_transaction()
+            migrations.create_missing_copies(cursor)
+            conn.commit()
+            cursor.close()
+            conn.close()
+        after = self.query("SELECT copy_id, book_id, status FROM copies ORDER BY copy_id")
+        self.assertEqual(after[:len(before)], before)
+        self.assertEqual([(row['book_id'], row['status']) for row in after[len(before):]], [(50, 'Available')])
+        self.assertEqual(self.books()[50][2:], (1, 1, 'Available'))
+        self.assertEqual(self.query("SELECT COUNT(*) AS n FROM issued_books WHERE copy_id IS NULL")[0]['n'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
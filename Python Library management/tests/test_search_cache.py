@@ -0,0 +1,78 @@
+# test_search_cache.py
+
+import unittest
+
+import support
+from search_cache import SearchCache
+
+CATALOG = [
+    ("Harry Potter and the Philosopher's Stone", "J. K. Rowling", "Fantasy"),
+    ("Harry Potter and the Chamber of Secrets", "J. K. Rowling", "Fantasy"),
+    ("The Harrowing", "Alison Littlewood", "Horror"),
+    ("Émile, or On Education", "Jean-Jacques Rousseau", "Philosophy"),
+    ("emile_notes", "Anonymous", None),
+    ("Les Misérables", "Victor Hugo", "Classic"),
+    ("Dirty Harry", "Phillip Rock", "Thriller"),
+    ("Harold and the Purple Crayon", "Crockett Johnson", "Children"),
+]
+
+# Searches as typed, each one narrowing the one before
+TYPED = [
+    {'title': "h"}, {'title': "ha"}, {'title': "har"}, {'title': "harr"}, {'title': "harry"},
+    {'title': "harry p"}, {'title': "harry po"}, {'title': "harry po", 'author': "row"},
+    {'title': "harry po", 'status': 'Issued'},
+    {'title': "e"}, {'title': "em"}, {'title': "emi"}, {'title': "emile"}, {'title': "emile_"},
+    {'title': "mis"}, {'title': "misé"}, {'title': "MISÉRABLES"},
+    {'author': "J"}, {'author': "J."}, {'author': "J. K"}, {'author': "jean-j"},
+    {'title': " "}, {'title': " h"},
+]
+
+
+class SearchCacheMatchesDatabaseTest(support.LibraryTestCase):
+    def setUp(self):
+        super().setUp()
+        for title, author, genre in CATALOG:
+            self.db.add_book(title, author, genre)
+        member = self.add_members(1)[0]
+        self.db.issue_books([self.book_id(CATALOG[1][0])], member)
+        self.cache = SearchCache(('title', 'author'), ('status',))
+        self.cache.mode = self.db.text_search_mode()
+
+    def page(self, filters, limit=100):
+        return self.db.page_books(filters.get('title', ''), filters.get('author', ''), filters.get('status', ''),
+                                  limit=limit)
+
+    def test_narrowed_results_match_the_database(self):
+        rows = self.page({})
+        self.cache.store({}, rows, complete=True)
+        answered = 0
+        for filters in TYPED:
+            with self.subTest(filters=filters):
+                cached = self.cache.lookup(filters)
+                if cached is None:
+                    self.cache.store(filters, self.page(filters), complete=True)
+                    continue
+                answered += 1
+                self.assertEqual(cached, self.page(filters))
+                searched = self.db.search_books(filters.get('title', ''), filters.get('author', ''),
+                                                filters.get('status', ''))
+                self.assertEqual({book.book_id for book in cached}, {book.book_id for book in searched})
+        self.assertGreater(answered, len(TYPED) // 2)
+
+    def test_incomplete_pages_are_only_reused_for_repeats(self):
+        filters = {'title': "harry"}
+        self.cache.store({}, self.page({}, limit=2), complete=False)
+        self.assertIsNone(self.cache.lookup(filters))
+        self.cache.store(filters, self.page(filters, limit=2), complete=False)
+        self.assertEqual(self.cache.lookup(filters), self.page(filters, limit=2))
+        self.assertIsNone(self.cache.lookup({'title': "harry potter"}))
+
+
+class LikeSearchCacheTest(SearchCacheMatchesDatabaseTest):
+    """The same searches on a schema without the full-text index (LIKE scans)."""
+
+    schema_target = 6
+
+
+if __name__ == '__main__':
+    unittest.main()